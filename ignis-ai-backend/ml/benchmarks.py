@@ -0,0 +1,382 @@
+"""Offline performance benchmarks for the ml/ pipeline.
+
+Everything runs without network access or the real dataset:
+
+- synthetic TFRecord shards with the 64x64 schema process_data_dual.py reads
+- a local stub of the Open-Meteo forecast/elevation endpoints (OPEN_METEO_URL)
+
+Benchmarks:
+    predict     predict_fire_spread latency (cold and warm caches) and the
+                per-fire cost of predict_fire_spread_batch
+    ingest      extract_features records/s on synthetic shards
+    inference   model scoring cost at batch sizes 1 .. 10000, compiled
+                engine and sklearn
+    pool        predict_pool.py throughput from 1 process up to one per CPU
+
+Results are written as JSON; `compare` flags metrics that got worse than a
+stored baseline by more than a threshold (exit status 1). Timings vary from
+process to process (on small VMs by 20-30%), so several baseline runs can be
+given. A metric is then flagged only when it is worse than the worst of them.
+
+Usage:
+    python benchmarks.py run --out bench.json [--only predict,inference] [--quick]
+    python benchmarks.py compare baseline.json [baseline2.json ...] bench.json [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from features import CHANNELS, N_FEATURES
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+
+
+# --- fixtures ------------------------------------------------------------------
+
+def write_synthetic_shards(directory, n_shards=4, records=200, seed=0, prefix="bench"):
+    """TFRecord shards with every channel as a 4096-float list; returns their paths.
+
+    Fire masks are rectangles that grow or shrink a little between days, so
+    most records pass process_data_dual's area and spread-ratio filters.
+    """
+    import tensorflow as tf
+
+    rng = np.random.default_rng(seed)
+    paths = []
+    os.makedirs(directory, exist_ok=True)
+    for s in range(n_shards):
+        path = os.path.join(directory, f"{prefix}_{s:02d}.tfrecord")
+        with tf.io.TFRecordWriter(path) as writer:
+            for _ in range(records):
+                channels = {key: rng.normal(100, 30, 4096).astype(np.float32)
+                            for key in CHANNELS[:-2]}
+                prev = np.zeros((64, 64), np.float32)
+                y, x = rng.integers(8, 48, 2)
+                h, w = rng.integers(3, 12, 2)
+                prev[y:y + h, x:x + w] = 1
+                grow = rng.integers(-1, 4)
+                nxt = np.zeros_like(prev)
+                nxt[y:y + max(1, h + grow), x:x + max(1, w + grow)] = 1
+                channels["PrevFireMask"], channels["FireMask"] = prev.ravel(), nxt.ravel()
+                feature = {key: tf.train.Feature(float_list=tf.train.FloatList(value=value))
+                           for key, value in channels.items()}
+                writer.write(tf.train.Example(
+                    features=tf.train.Features(feature=feature)).SerializeToString())
+        paths.append(path)
+    return paths
+
+
+class StubOpenMeteo:
+    """Local stand-in for api.open-meteo.com, with optional per-request latency.
+
+    Used as a context manager it points OPEN_METEO_URL at itself.
+    """
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlparse(self.path)
+                lats = [float(v) for v in parse_qs(url.query)["latitude"][0].split(",")]
+                if url.path == "/v1/elevation":
+                    body = {"elevation": [200.0 + abs(lat) for lat in lats]}
+                else:
+                    items = [{"current": {"temperature_2m": 28.0, "relative_humidity_2m": 25,
+                                          "wind_speed_10m": 12.0, "wind_direction_10m": 200}}
+                             for _ in lats]
+                    body = items if len(items) > 1 else items[0]
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._previous = os.environ.get("OPEN_METEO_URL")
+        os.environ["OPEN_METEO_URL"] = self.url
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        if self._previous is None:
+            os.environ.pop("OPEN_METEO_URL", None)
+        else:
+            os.environ["OPEN_METEO_URL"] = self._previous
+
+
+def metric(value, unit, better="lower"):
+    return {"value": float(value), "unit": unit, "better": better}
+
+
+def _percentiles(samples, name, unit="ms", scale=1000.0):
+    samples = np.asarray(samples) * scale
+    return {
+        f"{name}.p50": metric(np.percentile(samples, 50), unit),
+        f"{name}.p95": metric(np.percentile(samples, 95), unit),
+        f"{name}.mean": metric(samples.mean(), unit),
+    }
+
+
+def _best_time(fn, repeats, rounds=5):
+    """Seconds per call, best of `rounds` timed loops (as timeit reports)"""
+    fn()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeats)
+    return best
+
+
+def _fires(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"lat": float(lat), "lng": float(lng), "brightness": float(b)}
+            for lat, lng, b in zip(rng.uniform(32, 42, n), rng.uniform(-124, -114, n),
+                                   rng.uniform(300, 400, n))]
+
+
+# --- benchmarks ----------------------------------------------------------------
+
+def bench_predict(quick=False, stub_latency_ms=0.0, **_):
+    """End-to-end predict_fire_spread latency against the stub API"""
+    results = {}
+    n = 20 if quick else 100
+    with StubOpenMeteo(latency_ms=stub_latency_ms) as stub:
+        start = time.perf_counter()
+        import predict_spread as ps
+        results["predict.import_s"] = metric(time.perf_counter() - start, "s")
+
+        def clear():
+            ps.weather_cache.clear()
+            ps.elevation_cache.clear()
+
+        fires = _fires(n)
+        clear()
+        ps.predict_fire_spread(fires[0])  # warm up the connection pool
+
+        cold = []
+        for fire in fires:
+            clear()
+            start = time.perf_counter()
+            ps.predict_fire_spread(fire)
+            cold.append(time.perf_counter() - start)
+        results.update(_percentiles(cold, "predict.single_cold"))
+
+        for fire in fires:
+            ps.predict_fire_spread(fire)  # prime the caches for every location
+        warm = []
+        for fire in fires:
+            start = time.perf_counter()
+            ps.predict_fire_spread(fire)
+            warm.append(time.perf_counter() - start)
+        results.update(_percentiles(warm, "predict.single_warm"))
+
+        batch = _fires(10 * n, seed=1)
+        clear()
+        stub.requests = 0
+        start = time.perf_counter()
+        ps.predict_fire_spread_batch(batch)
+        elapsed = time.perf_counter() - start
+        results["predict.batch_cold.per_fire"] = metric(elapsed / len(batch) * 1000, "ms")
+        results["predict.batch_cold.http_requests"] = metric(stub.requests, "requests")
+    return results
+
+
+def bench_ingest(quick=False, workers=1, **_):
+    """extract_features throughput on synthetic shards, cold store and rerun"""
+    import process_data_dual as pdd
+
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="ignis-bench-")
+    try:
+        records = 100 if quick else 300
+        shards = write_synthetic_shards(os.path.join(tmp, "data"), n_shards=4, records=records)
+        total = 4 * records
+        store = os.path.join(tmp, "store")
+
+        start = time.perf_counter()
+        pdd.extract_features(shards, max_samples=10 ** 9, store_dir=store, workers=workers)
+        elapsed = time.perf_counter() - start
+        results["ingest.cold.records_per_s"] = metric(total / elapsed, "records/s", "higher")
+
+        start = time.perf_counter()
+        pdd.extract_features(shards, max_samples=10 ** 9, store_dir=store, workers=workers)
+        results["ingest.rerun_s"] = metric(time.perf_counter() - start, "s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+def bench_inference(quick=False, **_):
+    """Scoring cost per batch size for the compiled engine, sklearn and the routed path"""
+    import predict_spread as ps
+    from tree_compiler import probe_rows
+
+    results = {}
+    sizes = [b for b in BATCH_SIZES if not quick or b <= 1000]
+    engine = ps.engine
+    classifier, regressor = ps.classifier, ps.regressor
+    if classifier is None:
+        # Serving loaded the artifacts; load the sklearn models as the reference
+        try:
+            import joblib
+            classifier, regressor = (joblib.load(path) for path in ps.model_files())
+        except (ImportError, OSError) as e:
+            print(f"sklearn reference unavailable: {e}", file=sys.stderr)
+    X_all = probe_rows(engine, n_rows=max(sizes)) if engine is not None else \
+        np.random.default_rng(0).normal(size=(max(sizes), N_FEATURES))
+
+    for size in sizes:
+        X = X_all[:size]
+        repeats = max(3, min(200, 2000 // size))
+        if engine is not None:
+            per_call = _best_time(lambda: engine.predict(X), repeats)
+            results[f"inference.compiled.batch_{size}.ms"] = metric(per_call * 1000, "ms")
+            results[f"inference.compiled.batch_{size}.us_per_row"] = metric(per_call / size * 1e6, "us")
+        if classifier is not None:
+            def score_sklearn():
+                classifier.decision_function(X)
+                regressor.predict(X)
+            per_call = _best_time(score_sklearn, repeats)
+            results[f"inference.sklearn.batch_{size}.ms"] = metric(per_call * 1000, "ms")
+            results[f"inference.sklearn.batch_{size}.us_per_row"] = metric(per_call / size * 1e6, "us")
+        # What serving does (see predict_spread.SKLEARN_MIN_ROWS)
+        per_call = _best_time(lambda: ps.score_features(X), repeats)
+        results[f"inference.served.batch_{size}.ms"] = metric(per_call * 1000, "ms")
+    return results
+
+
+def bench_pool(quick=False, **_):
+    """Multi-process batch throughput per worker count (predict_pool.scaling_report)"""
+    from predict_pool import scaling_report
+
+    results = {}
+    with StubOpenMeteo():
+        rows = scaling_report(_fires(500 if quick else 2000, seed=2), max_workers=os.cpu_count() or 1)
+    for row in rows:
+        n = row["workers"]
+        results[f"pool.workers_{n}.fires_per_s"] = metric(row["fires_per_s"], "fires/s", "higher")
+        results[f"pool.workers_{n}.speedup"] = metric(row["speedup"], "x", "higher")
+    return results
+
+
+BENCHMARKS = {"predict": bench_predict, "ingest": bench_ingest, "inference": bench_inference,
+              "pool": bench_pool}
+
+
+def environment():
+    info = {"python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    try:
+        info["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        pass
+    return info
+
+
+def run(names, quick=False, stub_latency_ms=0.0, workers=1):
+    results = {}
+    for name in names:
+        print(f"Running {name} benchmark...", file=sys.stderr)
+        results.update(BENCHMARKS[name](quick, stub_latency_ms=stub_latency_ms, workers=workers))
+    return {"environment": environment(), "quick": quick, "results": results}
+
+
+def compare(baselines, current, threshold=0.2):
+    """Rows of (name, old, new, relative change, regressed) for metrics in both runs.
+
+    `old` is the least favourable value of the metric across the baselines.
+    """
+    rows = []
+    for name, new in sorted(current["results"].items()):
+        values = [b["results"][name] for b in baselines if name in b["results"]]
+        if not values:
+            continue
+        pick = max if new["better"] == "lower" else min
+        old = {"value": pick(v["value"] for v in values)}
+        if old["value"] == 0:
+            continue
+        change = (new["value"] - old["value"]) / abs(old["value"])
+        worse = change > threshold if new["better"] == "lower" else change < -threshold
+        rows.append((name, old["value"], new["value"], change, worse))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the ml/ pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_p = sub.add_parser("run")
+    run_p.add_argument("--out", default="bench.json")
+    run_p.add_argument("--only", default=",".join(BENCHMARKS),
+                       help="comma-separated subset of: " + ", ".join(BENCHMARKS))
+    run_p.add_argument("--quick", action="store_true", help="fewer iterations, batches up to 1000")
+    run_p.add_argument("--stub-latency-ms", type=float, default=0.0,
+                       help="simulated Open-Meteo response time")
+    run_p.add_argument("--workers", type=int, default=1, help="extract_features workers")
+    cmp_p = sub.add_parser("compare")
+    cmp_p.add_argument("baseline", nargs="+", help="one or more stored runs")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=0.2,
+                       help="relative change counted as a regression (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        names = [n.strip() for n in args.only.split(",") if n.strip()]
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+        report = run(names, args.quick, args.stub_latency_ms, args.workers)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+        for name, m in sorted(report["results"].items()):
+            print(f"{name:45s} {m['value']:12.3f} {m['unit']}")
+        print(f"Wrote {args.out}")
+        return 0
+
+    baselines = []
+    for path in args.baseline:
+        with open(path) as f:
+            baselines.append(json.load(f))
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baselines, current, args.threshold)
+    for name, old, new, change, worse in rows:
+        flag = "REGRESSION" if worse else ""
+        print(f"{name:45s} {old:12.3f} -> {new:12.3f}  {change:+7.1%}  {flag}")
+    regressions = sum(r[4] for r in rows)
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%} in {len(rows)} shared metrics")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""Drought/vegetation climatology from the training TFRecords.
+
+Serving used to guess drought and vegetation from four hand-drawn US
+regions plus noise. This module aggregates the real `pdsi` and `NDVI`
+channels of the training records into a (month, lat, lng) grid over the
+FIRMS query box, so serving can look the values up instead:
+
+    climatology.npz
+        pdsi, ndvi   float16 (12, rows, cols), mean of the patch means;
+                     NaN where nothing was observed nearby
+        count        uint32 (12, rows, cols), records per cell
+        bbox, cell_deg
+
+Row 0 is the southern edge, column 0 the western one. Cells without
+records take the nearest observed cell of the same month within
+FILL_CELLS, so sparse coverage does not leave holes at fire locations.
+
+The Next Day Wildfire Spread records carry no coordinates or dates, so the
+build needs a sidecar index with one line per record:
+
+    shard,record,lat,lng,date
+    next_day_wildfire_spread_train_00.tfrecord,0,38.51,-120.73,2019-08-14
+
+(`month` may replace `date`). Records without an index line are skipped.
+
+Lookups are vectorized and O(1) per point (one gather per array) and
+return the channel units, which is what the models were trained on (the
+drought_mean / vegetation_mean features). fuel_indices maps them to the
+scale predictions report, drought 0-5 (higher is drier) and vegetation
+0-1. Points outside the grid or on empty cells get the deterministic
+regional baseline instead; channel_values maps it the other way.
+
+Usage:
+    python climatology.py build data/*train*.tfrecord --index records.csv [--out climatology.npz]
+    python climatology.py lookup 34.1,-118.2 39.5,-105.0 [--month 8]
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+CONUS_BBOX = (-125.0, 24.0, -66.0, 49.0)  # west, south, east, north (as dem_tiles)
+CELL_DEG = 0.5
+FILL_CELLS = 2
+FORMAT_VERSION = 1
+CHANNEL_KEYS = ("pdsi", "NDVI")
+
+# PDSI runs from about -6 (extreme drought) to +6 (very wet); NDVI is stored x 10000
+PDSI_PER_DROUGHT = -2.0
+DROUGHT_AT_ZERO_PDSI = 2.5
+NDVI_SCALE = 10000.0
+
+
+def fuel_indices(pdsi, ndvi):
+    """Serving-scale (drought 0-5, vegetation 0-1) from channel units"""
+    drought = np.clip(DROUGHT_AT_ZERO_PDSI + np.asarray(pdsi) / PDSI_PER_DROUGHT, 0.0, 5.0)
+    vegetation = np.clip(np.asarray(ndvi) / NDVI_SCALE, 0.0, 1.0)
+    return drought, vegetation
+
+
+def channel_values(drought, vegetation):
+    """Channel units (pdsi, NDVI) from serving-scale indices; inverse of fuel_indices"""
+    pdsi = (np.asarray(drought) - DROUGHT_AT_ZERO_PDSI) * PDSI_PER_DROUGHT
+    ndvi = np.asarray(vegetation) * NDVI_SCALE
+    return pdsi, ndvi
+
+
+def regional_indices(lat, lng, month):
+    """The old regional heuristic without its noise: (drought, vegetation) arrays"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    month = np.broadcast_to(np.asarray(month), lat.shape)
+    west_coast = lng < -115
+    southwest = ~west_coast & (lng < -100) & (lat < 37)
+    southeast = ~west_coast & ~southwest & (lng > -90) & (lat < 36)
+    northeast = ~west_coast & ~southwest & ~southeast & (lng > -80) & (lat > 36)
+    regions = [west_coast, southwest, southeast, northeast]
+
+    dry_season = (month >= 5) & (month <= 10)
+    drought = np.select(regions, [np.where(dry_season, 4.0, 2.0), 3.5, 2.5, 1.5], 2.0)
+    vegetation = np.select(regions, [0.4, 0.3, 0.7, 0.6], 0.5)
+    vegetation = vegetation + np.where((month >= 3) & (month <= 8), 0.2, 0.0)
+    vegetation = np.clip(vegetation * (1 - drought / 7), 0.1, 0.9)
+    return drought, vegetation
+
+
+def grid_shape(bbox, cell_deg):
+    west, south, east, north = bbox
+    return 12, int(np.ceil((north - south) / cell_deg)), int(np.ceil((east - west) / cell_deg))
+
+
+def cell_index(lat, lng, month, bbox, cell_deg, shape):
+    """Flat (month, row, col) index per point, -1 outside the grid"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    west, south, east, north = bbox
+    _, rows, cols = shape
+    inside = (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+    # Points on the north/east edge belong to the last cell
+    r = np.minimum(np.floor((lat - south) / cell_deg), rows - 1)
+    c = np.minimum(np.floor((lng - west) / cell_deg), cols - 1)
+    m = np.broadcast_to(np.asarray(month), lat.shape) - 1
+    return np.where(inside, (m * rows + r) * cols + c, -1).astype(np.int64)
+
+
+class Climatology:
+    """Read-only (month, lat, lng) grid written by build_climatology."""
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            if int(data["version"]) != FORMAT_VERSION:
+                raise ValueError(f"unsupported climatology version: {int(data['version'])}")
+            self.pdsi = data["pdsi"]
+            self.ndvi = data["ndvi"]
+            self.count = data["count"]
+            self.bbox = tuple(float(v) for v in data["bbox"])
+            self.cell_deg = float(data["cell_deg"])
+        self.path = path
+        # float32 copies, so a lookup is two gathers without a float16 conversion
+        self._pdsi = self.pdsi.astype(np.float32)
+        self._ndvi = self.ndvi.astype(np.float32)
+        self._known = ~np.isnan(self.pdsi) & ~np.isnan(self.ndvi)
+
+    def lookup(self, lat, lng, month):
+        """(pdsi, ndvi, known) arrays; `known` is False where the grid has no value"""
+        cell = cell_index(lat, lng, month, self.bbox, self.cell_deg, self._pdsi.shape)
+        safe = np.maximum(cell, 0)
+        known = (cell >= 0) & self._known.ravel()[safe]
+        return self._pdsi.ravel()[safe], self._ndvi.ravel()[safe], known
+
+    def shared_state(self):
+        """(arrays, meta) the lookups need; see from_shared_state and predict_pool.py"""
+        arrays = {"pdsi": self._pdsi, "ndvi": self._ndvi, "known": self._known}
+        return arrays, {"bbox": list(self.bbox), "cell_deg": self.cell_deg, "path": self.path}
+
+    @classmethod
+    def from_shared_state(cls, arrays, meta):
+        """A lookup-only grid around existing arrays, without reading the file"""
+        grid = cls.__new__(cls)
+        grid._pdsi, grid._ndvi, grid._known = arrays["pdsi"], arrays["ndvi"], arrays["known"]
+        grid.bbox, grid.cell_deg, grid.path = tuple(meta["bbox"]), meta["cell_deg"], meta["path"]
+        return grid
+
+
+def open_climatology(path):
+    """Climatology at `path`, or None if it has not been built"""
+    if path and os.path.exists(path):
+        return Climatology(path)
+    return None
+
+
+# --- building -------------------------------------------------------------
+
+def read_index(path):
+    """{(shard basename, record number): (lat, lng, month)} from the sidecar CSV"""
+    index = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                month = int(row["month"]) if row.get("month") else int(row["date"][5:7])
+                index[(os.path.basename(row["shard"]), int(row["record"]))] = (
+                    float(row["lat"]), float(row["lng"]), month)
+            except (KeyError, TypeError, ValueError):
+                continue  # malformed line
+    return index
+
+
+def aggregate_shard(file_path, locations, bbox, cell_deg, batch_size=256):
+    """(sums, counts, stats) for one shard: per-cell pdsi/NDVI sums, shape (2, cells),
+    and record counts. Runs inside a worker process.
+
+    `locations` holds this shard's (record -> (lat, lng, month)) entries. A
+    batch that needed the per-record fallback parser may have dropped
+    records, so its numbering is unreliable and it is skipped.
+    """
+    import tensorflow as tf
+    from process_data_dual import _parse_batch
+
+    shape = grid_shape(bbox, cell_deg)
+    size = int(np.prod(shape))
+    sums = np.zeros((2, size))
+    counts = np.zeros(size, dtype=np.int64)
+    stats = {"records": 0, "located": 0, "skipped": 0}
+
+    start = 0
+    for raw_batch in tf.data.TFRecordDataset([file_path]).batch(batch_size):
+        n = int(raw_batch.shape[0])
+        batch, errors = _parse_batch(raw_batch, CHANNEL_KEYS)
+        numbers = range(start, start + n)
+        start += n
+        stats["records"] += n
+        if errors:
+            stats["skipped"] += n
+            continue
+        found = [(i, locations[k]) for i, k in enumerate(numbers) if k in locations]
+        if not found:
+            continue
+        rows = np.array([i for i, _ in found])
+        lat, lng, month = np.array([loc for _, loc in found]).T
+        cell = cell_index(lat, lng, month.astype(np.int64), bbox, cell_deg, shape)
+        ok = cell >= 0
+        # Patch means, as the drought_mean / vegetation_mean features
+        means = batch[rows[ok]].mean(axis=2)
+        for channel in range(2):
+            sums[channel] += np.bincount(cell[ok], means[:, channel], size)
+        counts += np.bincount(cell[ok], minlength=size)
+        stats["located"] += int(ok.sum())
+    return sums, counts, stats
+
+
+def fill_nearest(values, counts, max_cells=FILL_CELLS):
+    """Copy each empty cell from the nearest observed cell of its month within max_cells"""
+    from scipy.ndimage import distance_transform_edt
+
+    filled = values.copy()
+    for m in range(values.shape[1]):
+        empty = counts[m] == 0
+        if empty.all() or not empty.any():
+            continue
+        dist, (r, c) = distance_transform_edt(empty, return_indices=True)
+        near = empty & (dist <= max_cells)
+        filled[:, m][:, near] = values[:, m][:, r[near], c[near]]
+    return filled
+
+
+def build_climatology(file_paths, index_path, out, bbox=CONUS_BBOX, cell_deg=CELL_DEG,
+                      workers=None, batch_size=256):
+    """Aggregate the shards' pdsi/NDVI into the climatology file at `out`"""
+    index = read_index(index_path)
+    by_shard = {}
+    for (shard, record), location in index.items():
+        by_shard.setdefault(shard, {})[record] = location
+    shape = grid_shape(bbox, cell_deg)
+    args = [(path, by_shard.get(os.path.basename(path), {}), bbox, cell_deg, batch_size)
+            for path in file_paths]
+
+    workers = workers or int(os.environ.get("IGNIS_INGEST_WORKERS", 0)) or os.cpu_count() or 1
+    workers = max(1, min(workers, len(args)))
+    print(f"Aggregating {len(file_paths)} shards with {workers} worker(s) "
+          f"({len(index)} indexed records)...")
+    start = time.time()
+    if workers <= 1:
+        results = [aggregate_shard(*a) for a in args]
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from process_data_dual import _shard_worker_init
+
+        ctx = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_shard_worker_init) as pool:
+            results = list(pool.map(aggregate_shard, *zip(*args)))
+
+    sums = sum(r[0] for r in results)
+    counts = sum(r[1] for r in results).reshape(shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = (sums / counts.ravel()).reshape((2,) + shape)
+    means = fill_nearest(means, counts)
+
+    np.savez_compressed(
+        out, version=FORMAT_VERSION, bbox=np.array(bbox), cell_deg=cell_deg,
+        pdsi=means[0].astype(np.float16), ndvi=means[1].astype(np.float16),
+        count=counts.astype(np.uint32))
+    located = sum(r[2]["located"] for r in results)
+    skipped = sum(r[2]["skipped"] for r in results)
+    records = sum(r[2]["records"] for r in results)
+    print(f"{records} records, {located} placed on the grid, {skipped} in unparseable batches")
+    print(f"{int((counts > 0).sum())} of {counts.size} month-cells observed, "
+          f"{int((~np.isnan(means[0])).sum())} with values after filling; "
+          f"wrote {out} in {time.time() - start:.1f}s")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drought/vegetation climatology grid")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="aggregate TFRecord shards into the grid")
+    build.add_argument("shards", nargs="+", help="TFRecord files")
+    build.add_argument("--index", required=True, help="CSV of shard,record,lat,lng,date per record")
+    build.add_argument("--out", default="climatology.npz")
+    build.add_argument("--bbox", default=",".join(str(v) for v in CONUS_BBOX),
+                       help="west,south,east,north of the grid (use --bbox=...)")
+    build.add_argument("--cell-deg", type=float, default=CELL_DEG)
+    build.add_argument("--workers", type=int, default=None)
+
+    lookup = sub.add_parser("lookup", help="look up lat,lng points")
+    lookup.add_argument("points", nargs="+", help="lat,lng pairs")
+    lookup.add_argument("--month", type=int, default=time.localtime().tm_mon)
+    lookup.add_argument("--path", default="climatology.npz")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        bbox = tuple(float(v) for v in args.bbox.split(","))
+        build_climatology(args.shards, args.index, args.out, bbox, args.cell_deg, args.workers)
+    else:
+        points = np.array([[float(v) for v in p.split(",")] for p in args.points])
+        grid = open_climatology(args.path)
+        start = time.perf_counter()
+        pdsi, ndvi = channel_values(*regional_indices(points[:, 0], points[:, 1], args.month))
+        known = np.zeros(len(points), dtype=bool)
+        if grid is not None:
+            p, n, known = grid.lookup(points[:, 0], points[:, 1], args.month)
+            pdsi, ndvi = np.where(known, p, pdsi), np.where(known, n, ndvi)
+        drought, vegetation = fuel_indices(pdsi, ndvi)
+        elapsed = time.perf_counter() - start
+        for (lat, lng), p, n, d, v, k in zip(points, pdsi, ndvi, drought, vegetation, known):
+            source = "climatology" if k else "regional"
+            print(f"{lat:.5f},{lng:.5f}: pdsi {p:.2f}, NDVI {n:.0f} "
+                  f"(drought {d:.2f}, vegetation {v:.2f}; {source})")
+        print(f"{len(points)} lookups in {elapsed * 1e6:.0f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""Offline elevation lookups from memory-mapped DEM tiles.
+
+The store covers the FIRMS query box used by routes/fireData.js
+(-125, 24, -66, 49) with 1 x 1 degree tiles. Each tile is a .npy int16
+grid of (ppd + 1) x (ppd + 1) samples (ppd = pixels per degree), row 0 at
+the tile's north edge and column 0 at its west edge; the extra row/column
+duplicates the neighbour's edge so bilinear interpolation never needs a
+second tile. index.json records the grid layout and the tiles present.
+
+Tiles are opened with np.load(mmap_mode="r"), so a lookup only touches the
+few pages it reads and processes share the page cache. Lookups are
+vectorized over arrays of lat/lng; points outside the store or on nodata
+cells come back as NaN so callers can fall back to the network.
+
+Build the store from any raster:
+    python dem_tiles.py build conus_dem.tif --out dem            # needs rasterio
+    python dem_tiles.py build dem.npy --source-bounds=-125,24,-66,49 --out dem
+Look up points:
+    python dem_tiles.py lookup 34.1,-118.2 39.5,-105.0 --dir dem
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+CONUS_BBOX = (-125.0, 24.0, -66.0, 49.0)  # west, south, east, north
+NODATA = np.iinfo(np.int16).min
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+
+
+def tile_name(south, west):
+    """Tile named after its south-west corner, e.g. N34W119"""
+    ns = "N" if south >= 0 else "S"
+    ew = "E" if west >= 0 else "W"
+    return f"{ns}{abs(south):02d}{ew}{abs(west):03d}"
+
+
+class DemStore:
+    """Read-only view over a tile directory written by build_store."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            index = json.load(f)
+        if index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported DEM store version: {index.get('version')}")
+        self.bbox = tuple(index["bbox"])
+        self.ppd = int(index["pixels_per_degree"])
+        self.tiles = index["tiles"]  # name -> file
+        self._open = {}
+
+        west, south, east, north = self.bbox
+        self._cols = int(east - west)
+        self._rows = int(north - south)
+        # Tile id (row-major from the south-west) -> memmap, filled lazily
+        self._present = np.zeros(self._rows * self._cols, dtype=bool)
+        for r in range(self._rows):
+            for c in range(self._cols):
+                self._present[r * self._cols + c] = (
+                    tile_name(int(south) + r, int(west) + c) in self.tiles)
+
+    def _tile(self, tile_id):
+        arr = self._open.get(tile_id)
+        if arr is None:
+            r, c = divmod(int(tile_id), self._cols)
+            name = tile_name(int(self.bbox[1]) + r, int(self.bbox[0]) + c)
+            arr = np.load(os.path.join(self.directory, self.tiles[name]), mmap_mode="r")
+            self._open[tile_id] = arr
+        return arr
+
+    def lookup(self, lat, lng):
+        """Bilinear elevation in metres for arrays of lat/lng; NaN where unavailable"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        out = np.full(lat.shape, np.nan)
+
+        west, south, east, north = self.bbox
+        inside = (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+        # Points on the north/east edge belong to the last tile
+        tr = np.minimum(np.floor(lat - south), self._rows - 1)
+        tc = np.minimum(np.floor(lng - west), self._cols - 1)
+        tile_ids = np.where(inside, tr * self._cols + tc, -1).astype(np.int64)
+        inside &= self._present[np.clip(tile_ids, 0, None)]
+
+        # Fractional pixel position inside the tile (row grows southwards)
+        y = (south + tr + 1 - lat) * self.ppd
+        x = (lng - (west + tc)) * self.ppd
+        y0 = np.clip(np.floor(y), 0, self.ppd - 1).astype(np.intp)
+        x0 = np.clip(np.floor(x), 0, self.ppd - 1).astype(np.intp)
+        fy = y - y0
+        fx = x - x0
+
+        # Group the points by tile so each tile is touched once
+        points = np.nonzero(inside)[0]
+        points = points[np.argsort(tile_ids[points], kind="stable")]
+        tile_ids_sorted = tile_ids[points]
+        bounds = np.flatnonzero(np.diff(tile_ids_sorted)) + 1
+        for sel in np.split(points, bounds):
+            if sel.size == 0:
+                continue
+            grid = self._tile(tile_ids[sel[0]])
+            r, c = y0[sel], x0[sel]
+            corners = np.stack([grid[r, c], grid[r, c + 1],
+                                grid[r + 1, c], grid[r + 1, c + 1]]).astype(np.float64)
+            corners[corners == NODATA] = np.nan
+            wy, wx = fy[sel], fx[sel]
+            top = corners[0] * (1 - wx) + corners[1] * wx
+            bottom = corners[2] * (1 - wx) + corners[3] * wx
+            out[sel] = top * (1 - wy) + bottom * wy
+        return out
+
+    def elevation(self, lat, lng):
+        """Scalar lookup; None if the point is not covered"""
+        value = self.lookup([lat], [lng])[0]
+        return None if np.isnan(value) else float(value)
+
+
+def open_store(directory):
+    """DemStore for `directory`, or None if no store has been built there"""
+    if directory and os.path.exists(os.path.join(directory, INDEX_FILE)):
+        return DemStore(directory)
+    return None
+
+
+# --- building -------------------------------------------------------------
+
+class _ArraySource:
+    """A north-up numpy grid (optionally memory-mapped) with known bounds."""
+
+    def __init__(self, array, bounds):
+        self.array = array
+        self.west, self.south, self.east, self.north = bounds
+        self.res_y = (self.north - self.south) / array.shape[0]
+        self.res_x = (self.east - self.west) / array.shape[1]
+
+    def sample(self, lats, lngs):
+        # Pixel centres sit half a cell in from the edges
+        y = (self.north - lats) / self.res_y - 0.5
+        x = (lngs - self.west) / self.res_x - 0.5
+        rows, cols = self.array.shape
+        y = np.clip(y, 0, rows - 1)
+        x = np.clip(x, 0, cols - 1)
+        y0 = np.minimum(np.floor(y).astype(np.intp), rows - 2)
+        x0 = np.minimum(np.floor(x).astype(np.intp), cols - 2)
+        fy, fx = y - y0, x - x0
+        # Read only the window this tile needs
+        r0, r1 = y0.min(), y0.max() + 2
+        c0, c1 = x0.min(), x0.max() + 2
+        window = np.asarray(self.array[r0:r1, c0:c1], dtype=np.float64)
+        yy, xx = y0 - r0, x0 - c0
+        top = window[yy, xx] * (1 - fx) + window[yy, xx + 1] * fx
+        bottom = window[yy + 1, xx] * (1 - fx) + window[yy + 1, xx + 1] * fx
+        values = top * (1 - fy) + bottom * fy
+        outside = ((lats < self.south) | (lats > self.north) |
+                   (lngs < self.west) | (lngs > self.east))
+        values[outside] = np.nan
+        return values
+
+    def covers(self, south, west, north, east):
+        return not (east <= self.west or west >= self.east or
+                    north <= self.south or south >= self.north)
+
+
+class _RasterioSource:
+    """Any GDAL-readable raster in geographic coordinates (EPSG:4326)."""
+
+    def __init__(self, path):
+        try:
+            import rasterio
+        except ImportError:
+            sys.exit("Building from a GeoTIFF needs rasterio (pip install rasterio), "
+                     "or pass a .npy grid with --source-bounds")
+        self._rasterio = rasterio
+        self.dataset = rasterio.open(path)
+        self.nodata = self.dataset.nodata
+
+    def covers(self, south, west, north, east):
+        b = self.dataset.bounds
+        return not (east <= b.left or west >= b.right or north <= b.bottom or south >= b.top)
+
+    def sample(self, lats, lngs):
+        from rasterio.windows import from_bounds
+        pad = 2 * max(abs(self.dataset.res[0]), abs(self.dataset.res[1]))
+        window = from_bounds(lngs.min() - pad, lats.min() - pad, lngs.max() + pad,
+                             lats.max() + pad, transform=self.dataset.transform)
+        window = window.round_offsets().round_lengths()
+        data = self.dataset.read(1, window=window, boundless=True,
+                                 fill_value=self.nodata if self.nodata is not None else 0)
+        data = data.astype(np.float64)
+        if self.nodata is not None:
+            data[data == self.nodata] = np.nan
+        transform = self.dataset.window_transform(window)
+        west, north = transform.c, transform.f
+        bounds = (west, north + transform.e * data.shape[0],
+                  west + transform.a * data.shape[1], north)
+        return _ArraySource(data, bounds).sample(lats, lngs)
+
+
+def build_store(source, out_dir, bbox=CONUS_BBOX, ppd=120):
+    """Resample `source` onto the tile grid and write tiles plus index.json"""
+    os.makedirs(out_dir, exist_ok=True)
+    west, south, east, north = (int(math.floor(bbox[0])), int(math.floor(bbox[1])),
+                                int(math.ceil(bbox[2])), int(math.ceil(bbox[3])))
+    offsets = np.arange(ppd + 1) / ppd
+    tiles = {}
+    start = time.time()
+    for tile_south in range(south, north):
+        for tile_west in range(west, east):
+            if not source.covers(tile_south, tile_west, tile_south + 1, tile_west + 1):
+                continue
+            lats = (tile_south + 1 - offsets)[:, None] * np.ones((1, ppd + 1))
+            lngs = (tile_west + offsets)[None, :] * np.ones((ppd + 1, 1))
+            values = source.sample(lats.ravel(), lngs.ravel()).reshape(ppd + 1, ppd + 1)
+            grid = np.where(np.isnan(values), NODATA,
+                            np.clip(np.round(values), NODATA + 1, np.iinfo(np.int16).max))
+            name = tile_name(tile_south, tile_west)
+            np.save(os.path.join(out_dir, f"{name}.npy"), grid.astype(np.int16))
+            tiles[name] = f"{name}.npy"
+        print(f"  row {tile_south}N done ({len(tiles)} tiles, {time.time() - start:.0f}s)")
+
+    index = {"version": FORMAT_VERSION, "bbox": [west, south, east, north],
+             "pixels_per_degree": ppd, "dtype": "int16", "nodata": int(NODATA),
+             "tiles": tiles}
+    tmp = os.path.join(out_dir, INDEX_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, os.path.join(out_dir, INDEX_FILE))
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline DEM tile store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="convert a raster into the tile format")
+    build.add_argument("source", help="GeoTIFF (needs rasterio) or north-up .npy grid")
+    build.add_argument("--source-bounds",
+                       help="west,south,east,north of a .npy source (use --source-bounds=...)")
+    build.add_argument("--out", default="dem")
+    build.add_argument("--bbox", default=",".join(str(v) for v in CONUS_BBOX),
+                       help="west,south,east,north to tile (use --bbox=...)")
+    build.add_argument("--ppd", type=int, default=120,
+                       help="samples per degree (120 = 30 arc-seconds, ~1 km)")
+
+    lookup = sub.add_parser("lookup", help="look up lat,lng points")
+    lookup.add_argument("points", nargs="+", help="lat,lng pairs")
+    lookup.add_argument("--dir", default="dem")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        if args.source.endswith(".npy"):
+            if not args.source_bounds:
+                parser.error("--source-bounds is required for .npy sources")
+            bounds = tuple(float(v) for v in args.source_bounds.split(","))
+            source = _ArraySource(np.load(args.source, mmap_mode="r"), bounds)
+        else:
+            source = _RasterioSource(args.source)
+        bbox = tuple(float(v) for v in args.bbox.split(","))
+        index = build_store(source, args.out, bbox=bbox, ppd=args.ppd)
+        print(f"Wrote {len(index['tiles'])} tiles to {args.out}")
+    else:
+        store = DemStore(args.dir)
+        points = np.array([[float(v) for v in p.split(",")] for p in args.points])
+        start = time.perf_counter()
+        values = store.lookup(points[:, 0], points[:, 1])
+        elapsed = time.perf_counter() - start
+        for (lat, lng), value in zip(points, values):
+            print(f"{lat:.5f},{lng:.5f}: {value:.1f} m")
+        print(f"{len(points)} lookups in {elapsed * 1e6:.0f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Pooled, concurrent and bulk Open-Meteo client.
+
+One shared requests.Session keeps TLS connections alive between
+predictions, retries transient failures with exponential backoff, and
+issues the weather and elevation lookups for a fire concurrently. For
+batches it uses Open-Meteo's multi-coordinate form (comma-separated
+latitude/longitude lists), so N fires cost N / chunk_size requests per
+endpoint instead of 2N.
+
+The base URL is pluggable (OPEN_METEO_URL, or base_url=...) so the client
+can be pointed at a local stub server in tests and benchmarks.
+"""
+import contextvars
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from timing import span
+
+DEFAULT_BASE_URL = "https://api.open-meteo.com"
+WEATHER_FIELDS = "temperature_2m,relative_humidity_2m,wind_speed_10m,wind_direction_10m"
+# Open-Meteo accepts up to 100 coordinates per elevation request
+MAX_COORDS_PER_REQUEST = 100
+
+
+def _format_coords(values):
+    return ",".join(f"{float(v):.6f}".rstrip("0").rstrip(".") for v in values)
+
+
+def _parse_weather(entry):
+    current = entry.get("current") if isinstance(entry, dict) else None
+    if not current:
+        return None
+    return {
+        'temp_max': current['temperature_2m'],
+        'humidity': current['relative_humidity_2m'],
+        'wind_speed': current['wind_speed_10m'],
+        'wind_direction': current['wind_direction_10m']
+    }
+
+
+class OpenMeteoClient:
+    """Thread-safe client; share one instance per process."""
+
+    def __init__(self, base_url=None, timeout=5, retries=2, backoff=0.3,
+                 pool_size=16, chunk_size=MAX_COORDS_PER_REQUEST):
+        self.base_url = (base_url or os.environ.get("OPEN_METEO_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.chunk_size = max(1, min(int(chunk_size), MAX_COORDS_PER_REQUEST))
+
+        retry = Retry(total=retries, connect=retries, read=retries,
+                      backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({"GET"}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="open-meteo")
+
+    def _get_json(self, path, params):
+        with span("weather_api" if path == "/v1/forecast" else "elevation_api"):
+            response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+
+    def _submit(self, fn, *args):
+        # Carry the caller's context (e.g. its timing trace) into the pool thread
+        return self._executor.submit(contextvars.copy_context().run, fn, *args)
+
+    # --- single location ---------------------------------------------
+
+    def weather(self, lat, lng):
+        """Current weather at one location, or None on failure"""
+        try:
+            data = self._get_json("/v1/forecast", {
+                "latitude": lat, "longitude": lng, "current": WEATHER_FIELDS})
+            return _parse_weather(data)
+        except Exception as e:
+            print(f"Weather API error: {e}", file=sys.stderr)
+            return None
+
+    def elevation(self, lat, lng):
+        """Elevation at one location in metres, or None on failure"""
+        try:
+            data = self._get_json("/v1/elevation", {"latitude": lat, "longitude": lng})
+            if data.get("elevation"):
+                return data["elevation"][0]
+        except Exception as e:
+            print(f"Elevation API error: {e}", file=sys.stderr)
+        return None
+
+    def weather_and_elevation(self, lat, lng):
+        """Both lookups for one location, issued concurrently"""
+        elevation = self._submit(self.elevation, lat, lng)
+        weather = self.weather(lat, lng)
+        return weather, elevation.result()
+
+    # --- many locations ----------------------------------------------
+
+    def _chunks(self, lats, lngs):
+        for start in range(0, len(lats), self.chunk_size):
+            yield start, lats[start:start + self.chunk_size], lngs[start:start + self.chunk_size]
+
+    def _weather_chunk(self, lats, lngs):
+        try:
+            data = self._get_json("/v1/forecast", {
+                "latitude": _format_coords(lats), "longitude": _format_coords(lngs),
+                "current": WEATHER_FIELDS})
+        except Exception as e:
+            print(f"Weather API error ({len(lats)} locations): {e}", file=sys.stderr)
+            return [None] * len(lats)
+        # A single location comes back as an object, several as a list
+        entries = data if isinstance(data, list) else [data]
+        if len(entries) != len(lats):
+            print(f"Weather API returned {len(entries)} results for {len(lats)} locations",
+                  file=sys.stderr)
+            return [None] * len(lats)
+        return [_parse_weather(entry) for entry in entries]
+
+    def _elevation_chunk(self, lats, lngs):
+        try:
+            data = self._get_json("/v1/elevation", {
+                "latitude": _format_coords(lats), "longitude": _format_coords(lngs)})
+            values = data.get("elevation") or []
+        except Exception as e:
+            print(f"Elevation API error ({len(lats)} locations): {e}", file=sys.stderr)
+            return [None] * len(lats)
+        if len(values) != len(lats):
+            return [None] * len(lats)
+        return list(values)
+
+    def _submit_chunks(self, chunk_fn, lats, lngs):
+        return [(start, self._submit(chunk_fn, la, ln))
+                for start, la, ln in self._chunks(lats, lngs)]
+
+    @staticmethod
+    def _collect(futures, n):
+        results = [None] * n
+        for start, future in futures:
+            chunk = future.result()
+            results[start:start + len(chunk)] = chunk
+        return results
+
+    def weather_many(self, lats, lngs):
+        """Current weather for many locations; None where a lookup failed"""
+        lats, lngs = list(lats), list(lngs)
+        return self._collect(self._submit_chunks(self._weather_chunk, lats, lngs), len(lats))
+
+    def elevation_many(self, lats, lngs):
+        """Elevation for many locations; None where a lookup failed"""
+        lats, lngs = list(lats), list(lngs)
+        return self._collect(self._submit_chunks(self._elevation_chunk, lats, lngs), len(lats))
+
+    def weather_and_elevation_many(self, weather_coords, elevation_coords):
+        """Bulk weather and elevation lookups with all chunks in flight together.
+
+        Each argument is a (lats, lngs) pair; the two lists may differ
+        (e.g. only the cache misses of each kind). Returns (weathers, elevations).
+        """
+        w_lats, w_lngs = (list(c) for c in weather_coords)
+        e_lats, e_lngs = (list(c) for c in elevation_coords)
+        w_futures = self._submit_chunks(self._weather_chunk, w_lats, w_lngs)
+        e_futures = self._submit_chunks(self._elevation_chunk, e_lats, e_lngs)
+        return self._collect(w_futures, len(w_lats)), self._collect(e_futures, len(e_lats))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide shared client (created on first use)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenMeteoClient()
+        return _client
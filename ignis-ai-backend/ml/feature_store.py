@@ -0,0 +1,248 @@
+"""Chunked on-disk store for the extracted training features.
+
+Each split (train/test) is a directory:
+
+    feature_store/train/
+        manifest.json
+        chunks/next_day_wildfire_spread_train_00-3fa2c1d09b7e.X.npy
+        chunks/next_day_wildfire_spread_train_00-3fa2c1d09b7e.y_class.npy
+        chunks/next_day_wildfire_spread_train_00-3fa2c1d09b7e.y_regress.npy
+        ...
+        X.npy  y_class.npy  y_regress.npy     consolidated, see materialize()
+
+A chunk holds the features of one source shard and is named after the
+shard and the SHA-256 of its bytes, so a rerun only extracts shards that
+are new or have changed. The manifest also records the feature schema, and
+a schema change invalidates every chunk. Shard checksums are reused while
+the file's size and mtime are unchanged, so unchanged shards are not
+re-hashed either.
+
+Chunks are written by the extraction workers as each shard finishes, so
+memory stays bounded by one shard. The consolidated arrays are streamed
+together chunk by chunk, either the first rows in shard order
+(materialize) or a stratified sample over every chunk (materialize_sample,
+see sampling.py), and the train_* scripts open them with mmap via
+load_split().
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from features import FEATURE_NAMES, N_FEATURES
+
+STORE_DIR = os.environ.get("IGNIS_FEATURE_STORE", "feature_store")
+MANIFEST_VERSION = 1
+ARRAYS = ("X", "y_class", "y_regress")
+# Empty arrays with the dtypes extraction produces
+EMPTY = {
+    "X": np.empty((0, N_FEATURES), dtype=np.float64),
+    "y_class": np.empty(0, dtype=np.int64),
+    "y_regress": np.empty(0, dtype=np.float32),
+}
+
+
+def schema_id():
+    """Identifies the feature layout the chunks were computed with"""
+    return hashlib.sha256(json.dumps(FEATURE_NAMES).encode("utf-8")).hexdigest()[:16]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_prefix(chunk_dir, shard, checksum):
+    stem = os.path.splitext(os.path.basename(shard))[0]
+    return os.path.join(chunk_dir, f"{stem}-{checksum[:12]}")
+
+
+def _save_atomic(path, array):
+    tmp = f"{path}.tmp{os.getpid()}.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def write_chunk(chunk_dir, shard, checksum, X, y_class, y_regress):
+    """Write one shard's arrays; safe to call from a worker process"""
+    os.makedirs(chunk_dir, exist_ok=True)
+    prefix = chunk_prefix(chunk_dir, shard, checksum)
+    for name, array in zip(ARRAYS, (X, y_class, y_regress)):
+        _save_atomic(f"{prefix}.{name}.npy", array)
+    return len(X)
+
+
+class FeatureStore:
+    """One split of the store: its manifest, chunks and consolidated arrays."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.chunk_dir = os.path.join(directory, "chunks")
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        empty = {"version": MANIFEST_VERSION, "schema": schema_id(), "chunks": {}, "materialized": None}
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("schema") != schema_id():
+            return empty  # different layout; every chunk is recomputed
+        return manifest
+
+    def _write_manifest(self):
+        tmp = f"{self.manifest_path}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    # --- chunks -------------------------------------------------------
+
+    def checksum(self, shard):
+        """SHA-256 of a shard, reusing the recorded one while size and mtime match"""
+        st = os.stat(shard)
+        entry = self.manifest["chunks"].get(os.path.basename(shard))
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        checksum = file_sha256(shard)
+        if entry and entry["sha256"] == checksum:
+            # Touched but unchanged; remember the new mtime so it is not hashed again
+            entry["size"], entry["mtime_ns"] = st.st_size, st.st_mtime_ns
+            self._write_manifest()
+        return checksum
+
+    def cached(self, shard, checksum):
+        """Manifest entry for the shard if its chunk is current, else None"""
+        entry = self.manifest["chunks"].get(os.path.basename(shard))
+        if entry is None or entry["sha256"] != checksum:
+            return None
+        prefix = chunk_prefix(self.chunk_dir, shard, checksum)
+        if not all(os.path.exists(f"{prefix}.{name}.npy") for name in ARRAYS):
+            return None
+        return entry
+
+    def record(self, shard, checksum, stats):
+        """Register a freshly written chunk and persist the manifest"""
+        name = os.path.basename(shard)
+        old = self.manifest["chunks"].get(name)
+        st = os.stat(shard)
+        self.manifest["chunks"][name] = {
+            "sha256": checksum, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "rows": int(stats["rows"]), "records": int(stats["records"]),
+            "skipped": int(stats["skipped"]), "errors": int(stats["errors"]),
+            # Per-filter skips (see process_data_dual.SKIP_REASONS), when reported
+            **{k: int(v) for k, v in stats.items() if k in ("small_fire", "ratio_high", "ratio_low")},
+            "extracted_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        self._write_manifest()
+        if old and old["sha256"] != checksum:
+            self._remove_chunk(shard, old["sha256"])
+
+    def _remove_chunk(self, shard, checksum):
+        prefix = chunk_prefix(self.chunk_dir, shard, checksum)
+        for name in ARRAYS:
+            try:
+                os.remove(f"{prefix}.{name}.npy")
+            except OSError:
+                pass
+
+    def open_chunk(self, shard):
+        """Memory-mapped (X, y_class, y_regress) for one shard"""
+        entry = self.manifest["chunks"][os.path.basename(shard)]
+        prefix = chunk_prefix(self.chunk_dir, shard, entry["sha256"])
+        return tuple(np.load(f"{prefix}.{name}.npy", mmap_mode="r") for name in ARRAYS)
+
+    # --- consolidated arrays ----------------------------------------------
+
+    def materialize(self, shards, max_samples=None):
+        """Write the first `max_samples` rows of `shards` (in order) as X.npy etc.
+
+        Rows are streamed chunk by chunk into memory-mapped outputs, so this
+        never holds more than one chunk in memory. Skipped when the manifest
+        says the same chunks and limit were already materialized.
+        """
+        names = [os.path.basename(s) for s in shards]
+        signature = {"chunks": [[n, self.manifest["chunks"][n]["sha256"]] for n in names],
+                     "max_samples": max_samples}
+        total = sum(self.manifest["chunks"][n]["rows"] for n in names)
+        rows = total if max_samples is None else min(total, max_samples)
+        if total > rows:
+            print(f"{self.directory}: using the first {rows} of {total} samples (max_samples={max_samples})")
+        if (self.manifest.get("materialized") == signature and
+                all(os.path.exists(self.array_path(name)) for name in ARRAYS)):
+            return rows
+
+        if rows == 0:
+            for name in ARRAYS:
+                _save_atomic(self.array_path(name), EMPTY[name])
+            self.manifest["materialized"] = signature
+            self.manifest.pop("sample", None)
+            self._write_manifest()
+            return rows
+
+        outputs = {}
+        for name in ARRAYS:
+            shape = (rows,) + EMPTY[name].shape[1:]
+            outputs[name] = np.lib.format.open_memmap(
+                self.array_path(name) + ".tmp.npy", mode="w+", dtype=EMPTY[name].dtype, shape=shape)
+        offset = 0
+        for shard in shards:
+            if offset >= rows:
+                break
+            for name, chunk in zip(ARRAYS, self.open_chunk(shard)):
+                take = min(len(chunk), rows - offset)
+                outputs[name][offset:offset + take] = chunk[:take]
+            offset += take
+        for name, out in outputs.items():
+            out.flush()
+            os.replace(self.array_path(name) + ".tmp.npy", self.array_path(name))
+
+        self.manifest["materialized"] = signature
+        self.manifest.pop("sample", None)
+        self._write_manifest()
+        return rows
+
+    def materialize_sample(self, shards, reservoir):
+        """Write a StratifiedReservoir sample of all `shards` as X.npy etc.; returns its report.
+
+        Each chunk is memory-mapped and offered to the reservoir once, so
+        memory is bounded by the reservoir, not the corpus. Skipped when the
+        same chunks were already sampled with the same settings.
+        """
+        names = [os.path.basename(s) for s in shards]
+        signature = {"chunks": [[n, self.manifest["chunks"][n]["sha256"]] for n in names],
+                     "max_samples": reservoir.capacity, "sampling": reservoir.config()}
+        if (self.manifest.get("materialized") == signature and self.manifest.get("sample") and
+                all(os.path.exists(self.array_path(name)) for name in ARRAYS)):
+            return self.manifest["sample"]
+
+        for name, shard in zip(names, shards):
+            reservoir.add(name, *self.open_chunk(shard))
+        X, y_class, y_regress, report = reservoir.sample()
+        for name, array in zip(ARRAYS, (X, y_class, y_regress)):
+            _save_atomic(self.array_path(name), array.astype(EMPTY[name].dtype, copy=False))
+
+        self.manifest["materialized"] = signature
+        self.manifest["sample"] = report
+        self._write_manifest()
+        return report
+
+    def array_path(self, name):
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def load(self):
+        """Consolidated (X, y_class, y_regress), memory-mapped read-only"""
+        return tuple(np.load(self.array_path(name), mmap_mode="r") for name in ARRAYS)
+
+
+def load_split(split, root=None):
+    """Open a materialized split lazily, e.g. X, y_class, y_regress = load_split("train")"""
+    return FeatureStore(os.path.join(root or STORE_DIR, split)).load()
@@ -0,0 +1,114 @@
+"""The 23-feature vector, computed in one place for training and serving.
+
+Training (process_data_dual.py) reduces (N, 10, 64, 64) grids from the
+TFRecords; serving (predict_spread.py) has one value per environmental
+variable for each fire. Both go through assemble_features(), so the column
+order and the derived terms (wind components, interactions, shape ratio)
+cannot drift apart.
+"""
+import numpy as np
+
+# Channel order of a record batch, as stored in the TFRecords
+CHANNELS = [
+    'elevation', 'th', 'vs', 'tmmn', 'tmmx', 'sph', 'pdsi', 'NDVI',
+    'PrevFireMask', 'FireMask'
+]
+ENV_CHANNELS = 8  # elevation .. NDVI
+PREV_FIRE, FIRE = 8, 9
+GRID_SIZE = 64
+
+# Column order of the model input
+FEATURE_NAMES = [
+    "elevation_mean", "elevation_max",
+    "wind_dir_mean", "wind_dir_max",
+    "wind_speed_mean", "wind_speed_max",
+    "temp_min_mean", "temp_min_max",
+    "temp_max_mean", "temp_max_max",
+    "humidity_mean", "humidity_max",
+    "drought_mean", "drought_max",
+    "vegetation_mean", "vegetation_max",
+    "fire_sum", "fire_mean",
+    "wind_east", "wind_north",
+    "wind_elevation", "drought_vegetation",
+    "fire_shape_ratio"
+]
+N_FEATURES = len(FEATURE_NAMES)
+
+
+def assemble_features(means, maxes, fire_sum, fire_mean, shape_ratio):
+    """Build the (N, 23) matrix from per-variable statistics.
+
+    `means` and `maxes` are (N, 8) in CHANNELS order; the derived terms are
+    computed in the dtype of `means`, then every column is widened to float64.
+    """
+    elevation, wind_dir, wind_speed = means[:, 0], means[:, 1], means[:, 2]
+    drought, vegetation = means[:, 6], means[:, 7]
+    wind_rad = np.radians(wind_dir)
+
+    X = np.empty((len(means), N_FEATURES), dtype=np.float64)
+    X[:, 0:16:2] = means
+    X[:, 1:16:2] = maxes
+    X[:, 16] = fire_sum
+    X[:, 17] = fire_mean
+    X[:, 18] = wind_speed * np.cos(wind_rad)  # E/W
+    X[:, 19] = wind_speed * np.sin(wind_rad)  # N/S
+    X[:, 20] = elevation * wind_speed
+    X[:, 21] = drought * vegetation
+    X[:, 22] = shape_ratio
+    return X
+
+
+def bbox_shape_ratio(width, height):
+    """Width/height of a bounding box measured in cells (last - first index)"""
+    return np.asarray(width, dtype=np.float64) / (np.asarray(height, dtype=np.float64) + 1e-6)
+
+
+def shape_ratio(mask):
+    """Bounding-box width/height of the burning cells in each (64, 64) mask.
+
+    Uses the first and last occupied row/column instead of np.where, so the
+    whole batch is reduced at once. Masks with no fire get 1.0.
+    """
+    burning = mask > 0
+    rows = burning.any(axis=2)
+    cols = burning.any(axis=1)
+    last = mask.shape[1] - 1
+    height = (last - np.argmax(rows[:, ::-1], axis=1)) - np.argmax(rows, axis=1)
+    width = (last - np.argmax(cols[:, ::-1], axis=1)) - np.argmax(cols, axis=1)
+    ratio = bbox_shape_ratio(width, height)
+    return np.where(mask.sum(axis=(1, 2)) > 0, ratio, 1.0)
+
+
+def grid_features(batch):
+    """Features for a batch of records shaped (N, 10, 64, 64) or (N, 10, 4096)"""
+    batch = np.asarray(batch, dtype=np.float32)
+    flat = batch.reshape(len(batch), len(CHANNELS), GRID_SIZE * GRID_SIZE)
+    env = flat[:, :ENV_CHANNELS]
+    prev_fire = flat[:, PREV_FIRE]
+    return assemble_features(
+        env.mean(axis=2), env.max(axis=2),
+        prev_fire.sum(axis=1), prev_fire.mean(axis=1),
+        shape_ratio(prev_fire.reshape(-1, GRID_SIZE, GRID_SIZE)))
+
+
+def spread_targets(batch):
+    """(current_area, future_area) fire pixel sums for each record"""
+    batch = np.asarray(batch, dtype=np.float32)
+    flat = batch.reshape(len(batch), len(CHANNELS), GRID_SIZE * GRID_SIZE)
+    return flat[:, PREV_FIRE].sum(axis=1), flat[:, FIRE].sum(axis=1)
+
+
+def point_features(elevation, wind_dir, wind_speed, temp_min, temp_max,
+                   humidity, drought, vegetation, brightness, shape=None):
+    """Features for point observations (one value per variable per fire).
+
+    A point is treated as a uniform grid, so mean == max. Brightness stands
+    in for the fire mask: fire_sum is the brightness and fire_mean
+    brightness / 100. `shape` is the burning area's shape ratio when known
+    (see incidents.py); a lone point has no perimeter and gets 1.
+    """
+    means = np.column_stack([np.asarray(v, dtype=np.float64) for v in (
+        elevation, wind_dir, wind_speed, temp_min, temp_max, humidity, drought, vegetation)])
+    brightness = np.asarray(brightness, dtype=np.float64)
+    shape = np.ones(len(means)) if shape is None else np.asarray(shape, dtype=np.float64)
+    return assemble_features(means, means, brightness, brightness / 100.0, shape)
@@ -0,0 +1,127 @@
+"""Location-keyed cache for the Open-Meteo lookups in predict_spread.py.
+
+Coordinates are snapped to a grid (`precision` degrees per cell), so fires
+a few hundred metres apart share one entry. Each cache keeps a bounded
+in-memory LRU and can optionally write through to a SQLite file that
+survives restarts. Entries expire after `ttl` seconds; ttl=None keeps them
+forever (elevation never changes).
+
+Configuration (environment variables read by predict_spread.py):
+    IGNIS_CACHE_DB              SQLite file shared by all caches (unset = memory only)
+    IGNIS_CACHE_SIZE            max in-memory entries per cache (default 10000)
+    IGNIS_WEATHER_GRID_DEG      weather grid cell size in degrees (default 0.01, ~1 km)
+    IGNIS_WEATHER_TTL           weather entry lifetime in seconds (default 900)
+    IGNIS_ELEVATION_GRID_DEG    elevation grid cell size in degrees (default 0.001, ~100 m)
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class GeoCache:
+    """Bounded LRU + optional SQLite store keyed on quantized (lat, lng)."""
+
+    def __init__(self, name, precision=0.01, ttl=None, max_entries=10000, db_path=None):
+        if precision <= 0:
+            raise ValueError("precision must be positive")
+        self.name = name
+        self.precision = float(precision)
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geo_cache ("
+                " cache TEXT NOT NULL, ix INTEGER NOT NULL, iy INTEGER NOT NULL,"
+                " precision REAL NOT NULL, stored_at REAL NOT NULL, value TEXT NOT NULL,"
+                " PRIMARY KEY (cache, precision, ix, iy))"
+            )
+            self._db.commit()
+
+    def key(self, lat, lng):
+        """Grid cell containing (lat, lng)"""
+        return (int(round(float(lat) / self.precision)),
+                int(round(float(lng) / self.precision)))
+
+    def _fresh(self, stored_at, now):
+        return self.ttl is None or now - stored_at < self.ttl
+
+    def get(self, lat, lng, default=None):
+        """Cached value for the cell, or `default` if absent or expired"""
+        key = self.key(lat, lng)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT stored_at, value FROM geo_cache"
+                    " WHERE cache = ? AND precision = ? AND ix = ? AND iy = ?",
+                    (self.name, self.precision, key[0], key[1])).fetchone()
+                if row is not None and self._fresh(row[0], now):
+                    value = json.loads(row[1])
+                    self._remember(key, row[0], value)
+                    self.stats["disk_hits"] += 1
+                    return value
+
+            self.stats["misses"] += 1
+            return default
+
+    def set(self, lat, lng, value):
+        """Store a JSON-serializable value for the cell"""
+        key = self.key(lat, lng)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geo_cache (cache, precision, ix, iy, stored_at, value)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.name, self.precision, key[0], key[1], now, json.dumps(value)))
+                self._db.commit()
+
+    def _remember(self, key, stored_at, value):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_fetch(self, lat, lng, fetch):
+        """Return the cached value, or call fetch(lat, lng) and cache a non-None result"""
+        value = self.get(lat, lng)
+        if value is None:
+            value = fetch(lat, lng)
+            if value is not None:
+                self.set(lat, lng, value)
+        return value
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM geo_cache WHERE cache = ?", (self.name,))
+                self._db.commit()
@@ -0,0 +1,273 @@
+"""Group FIRMS detections into fire incidents.
+
+VIIRS reports a large fire as dozens of adjacent 375 m pixels, often again
+on the next overpass. Predicting per detection repeats the model and the
+weather lookups for one fire, so detections are clustered first:
+
+    two detections are linked when they are within eps_km of each other
+    and at most window_hours apart; incidents are the connected groups.
+
+Neighbours are found with a grid index: points are projected to km at
+one reference latitude, bucketed into cells of at least eps_km, sorted by
+cell, and each point is compared only with points in its own and the
+adjacent cells; the final distance test scales longitude at each pair's
+own latitude. Candidate pairs are
+generated as arrays, and the groups come from scipy's connected_components
+on the sparse link graph. 100k detections cluster in a fraction of a second.
+
+Input is what parseCSV in routes/fireData.js produces (latitude,
+longitude, brightness, timestamp; lat/lng also accepted), or a FIRMS area
+CSV.
+
+Usage:
+    python incidents.py detections.json [--eps-km 0.75] [--window-hours 24] [--predict]
+    python incidents.py firms_area.csv --predict
+"""
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+from features import bbox_shape_ratio
+
+KM_PER_DEG_LAT = 111.32
+# Two VIIRS I-band pixels: adjacent and diagonal detections of one fire link up
+EPS_KM = 0.75
+WINDOW_HOURS = 24.0
+# The training masks (and so the shape ratio) are on a 1 km grid
+SHAPE_CELL_KM = 1.0
+
+
+class Detections:
+    """Columnar detections: lat, lng, brightness (float64) and time (datetime64[s], NaT if unknown)."""
+
+    def __init__(self, lat, lng, brightness, time=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.brightness = np.asarray(brightness, dtype=np.float64)
+        if time is None:
+            time = np.full(len(self.lat), np.datetime64("NaT"), dtype="datetime64[s]")
+        self.time = np.asarray(time, dtype="datetime64[s]")
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_records(cls, records):
+        """From parseCSV-style dicts (latitude/longitude or lat/lng, brightness, timestamp)"""
+        lat = [r.get("latitude", r.get("lat")) for r in records]
+        lng = [r.get("longitude", r.get("lng")) for r in records]
+        brightness = [r.get("brightness", np.nan) for r in records]
+        time = [_parse_time(r.get("timestamp")) for r in records]
+        return cls(lat, lng, brightness, time)
+
+    @classmethod
+    def from_firms_csv(cls, path):
+        """From a FIRMS area CSV (latitude, longitude, bright_ti4, acq_date, acq_time, ...)"""
+        lat, lng, brightness, time = [], [], [], []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    lat.append(float(row["latitude"]))
+                    lng.append(float(row["longitude"]))
+                    brightness.append(float(row.get("bright_ti4") or row.get("brightness")))
+                except (KeyError, TypeError, ValueError):
+                    continue  # malformed row, as parseCSV drops them
+                hhmm = row.get("acq_time", "").zfill(4)
+                time.append(_parse_time(f"{row.get('acq_date')}T{hhmm[:2]}:{hhmm[2:]}:00"))
+        return cls(lat, lng, brightness, time)
+
+
+def _parse_time(value):
+    if value is None or value == "":
+        return np.datetime64("NaT")
+    if isinstance(value, (int, float)):
+        return np.datetime64(int(value), "ms")  # JS epoch milliseconds
+    # JSON-serialized JS Dates look like 2024-07-01T12:34:00.000Z
+    try:
+        return np.datetime64(str(value)[:19])
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _project(lat, lng, ref_lat):
+    """Equirectangular km with longitude scaled at `ref_lat`, a single shear-free grid"""
+    x = lng * KM_PER_DEG_LAT * np.cos(np.radians(ref_lat))
+    y = lat * KM_PER_DEG_LAT
+    return x, y
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Equirectangular distance at the pair's mean latitude; accurate at incident scale"""
+    dx = (lng1 - lng2) * KM_PER_DEG_LAT * np.cos(np.radians((lat1 + lat2) / 2))
+    dy = (lat1 - lat2) * KM_PER_DEG_LAT
+    return np.hypot(dx, dy)
+
+
+def neighbour_pairs(lat, lng, eps_km):
+    """Index pairs (i, j), i != j, of points within eps_km, via a grid index"""
+    ref_lat = float(lat.mean())
+    x, y = _project(lat, lng, ref_lat)
+    # Away from ref_lat the grid's longitude scale is off by up to this
+    # factor; cells that much wider keep every close pair in adjacent cells
+    stretch = max(1.0, np.cos(np.radians(ref_lat)) / np.cos(np.radians(np.abs(lat).max())))
+    cell_km = eps_km * stretch
+    cx = np.floor(x / cell_km).astype(np.int64)
+    cy = np.floor(y / cell_km).astype(np.int64)
+    cx -= cx.min()
+    cy -= cy.min()
+    width = int(cx.max()) + 3
+    key = (cy + 1) * width + (cx + 1)
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+
+    firsts, seconds = [], []
+    # Half of the 3x3 neighbourhood (self, E, NW, N, NE) covers every pair once
+    for dy, dx in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        target = sorted_key + dy * width + dx
+        start = np.searchsorted(sorted_key, target, side="left")
+        stop = np.searchsorted(sorted_key, target, side="right")
+        counts = stop - start
+        if dy == 0 and dx == 0:
+            # Within a cell, only pair each point with the ones after it
+            start = np.arange(len(sorted_key)) + 1
+            counts = np.maximum(stop - start, 0)
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        i = np.repeat(np.arange(len(sorted_key)), counts)
+        # Position within each point's candidate run, then offset by its start
+        run_offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = np.repeat(start, counts) + run_offset
+        firsts.append(order[i])
+        seconds.append(order[j])
+    if not firsts:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    i, j = np.concatenate(firsts), np.concatenate(seconds)
+    close = distance_km(lat[i], lng[i], lat[j], lng[j]) <= eps_km
+    return i[close], j[close]
+
+
+def cluster(detections, eps_km=EPS_KM, window_hours=WINDOW_HOURS):
+    """Incident label (0..n_incidents-1) for every detection"""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    n = len(detections)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    i, j = neighbour_pairs(detections.lat, detections.lng, eps_km)
+    if window_hours is not None:
+        t = detections.time
+        known = ~np.isnat(t[i]) & ~np.isnat(t[j])
+        gap = np.abs((t[i] - t[j]).astype(np.int64))
+        # Unknown times do not split an incident
+        keep = ~known | (gap <= window_hours * 3600)
+        i, j = i[keep], j[keep]
+    graph = coo_matrix((np.ones(len(i), dtype=np.int8), (i, j)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    # Number incidents by their first detection, so output order is stable
+    _, first = np.unique(labels, return_index=True)
+    return np.argsort(np.argsort(first))[labels]
+
+
+def aggregate(detections, labels):
+    """Per-incident summaries, in label order"""
+    n = int(labels.max()) + 1 if len(labels) else 0
+    count = np.bincount(labels, minlength=n)
+
+    def reduce(values, ufunc, init):
+        out = np.full(n, init, dtype=values.dtype)
+        ufunc.at(out, labels, values)
+        return out
+
+    lat_mean = np.bincount(labels, detections.lat, n) / count
+    lng_mean = np.bincount(labels, detections.lng, n) / count
+    bright = np.nan_to_num(detections.brightness, nan=0.0)
+    bright_max = reduce(bright, np.maximum, -np.inf)
+    bright_mean = np.bincount(labels, bright, n) / count
+
+    # Extent in km around each incident's own centre, and the shape ratio of
+    # its burning cells on the 1 km grid the training masks use
+    x = (detections.lng - lng_mean[labels]) * KM_PER_DEG_LAT * np.cos(np.radians(lat_mean[labels]))
+    y = (detections.lat - lat_mean[labels]) * KM_PER_DEG_LAT
+    x_min, x_max = reduce(x, np.minimum, np.inf), reduce(x, np.maximum, -np.inf)
+    y_min, y_max = reduce(y, np.minimum, np.inf), reduce(y, np.maximum, -np.inf)
+    col, row = np.floor(x / SHAPE_CELL_KM), np.floor(-y / SHAPE_CELL_KM)
+    width_cells = reduce(col, np.maximum, -np.inf) - reduce(col, np.minimum, np.inf)
+    height_cells = reduce(row, np.maximum, -np.inf) - reduce(row, np.minimum, np.inf)
+    shape = bbox_shape_ratio(width_cells, height_cells)
+
+    t = detections.time.astype(np.int64)
+    known = ~np.isnat(detections.time)
+    t_first = np.full(n, np.iinfo(np.int64).max)
+    t_last = np.full(n, np.iinfo(np.int64).min)
+    np.minimum.at(t_first, labels[known], t[known])
+    np.maximum.at(t_last, labels[known], t[known])
+
+    has_time = t_last >= t_first
+    seen = [np.where(has_time, t, 0).astype("datetime64[s]").astype(str) for t in (t_first, t_last)]
+    km_per_deg_lng = KM_PER_DEG_LAT * np.cos(np.radians(lat_mean))
+    bbox = np.column_stack([lng_mean + x_min / km_per_deg_lng, lat_mean + y_min / KM_PER_DEG_LAT,
+                            lng_mean + x_max / km_per_deg_lng, lat_mean + y_max / KM_PER_DEG_LAT])
+    extent = np.column_stack([x_max - x_min, y_max - y_min])
+
+    columns = zip(count.tolist(), lat_mean.tolist(), lng_mean.tolist(), bright_max.tolist(),
+                  bright_mean.tolist(), bbox.tolist(), extent.tolist(), shape.tolist(),
+                  has_time.tolist(), seen[0].tolist(), seen[1].tolist())
+    return [{
+        "incident_id": k,
+        "detections": c,
+        "lat": la,
+        "lng": ln,
+        "max_brightness": b_max,
+        "mean_brightness": b_mean,
+        "bbox": box,
+        "extent_km": ext,
+        "shape_ratio": ratio,
+        "first_seen": first + "Z" if timed else None,
+        "last_seen": last + "Z" if timed else None,
+    } for k, (c, la, ln, b_max, b_mean, box, ext, ratio, timed, first, last) in enumerate(columns)]
+
+
+def find_incidents(detections, eps_km=EPS_KM, window_hours=WINDOW_HOURS):
+    """(incidents, labels): summaries plus each detection's incident id"""
+    if not isinstance(detections, Detections):
+        detections = Detections.from_records(detections)
+    labels = cluster(detections, eps_km, window_hours)
+    return aggregate(detections, labels), labels
+
+
+def incident_fires(incidents):
+    """One predict_fire_spread input per incident"""
+    return [{"lat": inc["lat"], "lng": inc["lng"], "brightness": inc["max_brightness"],
+             "shape_ratio": inc["shape_ratio"], "incident": inc} for inc in incidents]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster FIRMS detections into incidents")
+    parser.add_argument("path", help="JSON list of detections or a FIRMS area CSV")
+    parser.add_argument("--eps-km", type=float, default=EPS_KM)
+    parser.add_argument("--window-hours", type=float, default=WINDOW_HOURS)
+    parser.add_argument("--predict", action="store_true", help="run one spread prediction per incident")
+    args = parser.parse_args(argv)
+
+    if args.path.endswith(".csv"):
+        detections = Detections.from_firms_csv(args.path)
+    else:
+        with open(args.path) as f:
+            detections = Detections.from_records(json.load(f))
+    incidents, _ = find_incidents(detections, args.eps_km, args.window_hours)
+    print(f"{len(detections)} detections -> {len(incidents)} incidents", file=sys.stderr)
+    if args.predict:
+        from predict_spread import predict_fire_spread_batch
+        print(json.dumps(predict_fire_spread_batch(incident_fires(incidents))))
+    else:
+        print(json.dumps(incidents))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
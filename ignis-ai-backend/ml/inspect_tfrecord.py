@@ -1,6 +1,64 @@
-import tensorflow as tf
+"""Inspect the Next Day Wildfire Spread TFRecords.
+
+With a file argument, prints the keys and feature types of its first
+record. With --profile, scans every shard of a directory in parallel and
+writes a JSON report:
+
+    shards      records, unparseable records and checksum per shard
+    channels    for each of the 10 channels: value count, min/max/mean/std,
+                NaN rate, missing-key and short-array rates per record, and
+                a fixed-range histogram (HIST_RANGES; out-of-range values
+                are counted below/above)
+    fire_area   distributions of the previous and next day fire area (the
+                mask sums that process_data_dual.py filters on), and how
+                many records each of its filters would drop
+
+Shards are reduced batch by batch, so memory does not grow with the shard
+size, and per-shard results are merged at the end. Each shard's profile is
+cached under its SHA-256 (re-hashed only when its size or mtime changes),
+so a rescan only reads new or changed shards.
+
+Usage:
+    python inspect_tfrecord.py data/next_day_wildfire_spread_train_00.tfrecord
+    python inspect_tfrecord.py --profile data [--out profile.json] [--workers 4]
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from features import CHANNELS, FIRE, GRID_SIZE, PREV_FIRE
+
+PROFILE_VERSION = 1
+CACHE_DIR = os.environ.get("IGNIS_PROFILE_CACHE", "profile_cache")
+BINS = 50
+# Histogram range per channel, in the units stored in the records
+HIST_RANGES = {
+    "elevation": (-100.0, 4500.0),   # m
+    "th": (0.0, 360.0),              # wind direction, degrees
+    "vs": (0.0, 20.0),               # wind speed, m/s
+    "tmmn": (230.0, 320.0),          # K
+    "tmmx": (230.0, 330.0),          # K
+    "sph": (0.0, 0.025),             # specific humidity, kg/kg
+    "pdsi": (-15.0, 15.0),
+    "NDVI": (-10000.0, 10000.0),     # x 10000
+    "PrevFireMask": (-1.0, 2.0),     # one bin each for -1 (unknown), 0 and 1
+    "FireMask": (-1.0, 2.0),
+}
+MASK_BINS = 3
+# Fire area (mask sum, pixels of 1 km) bin edges
+AREA_EDGES = (0, 1, 10, 50, 100, 250, 500, 1000, 2000, GRID_SIZE * GRID_SIZE + 1)
+
 
 def inspect_tfrecord(file_path):
+    import tensorflow as tf
+
     raw_dataset = tf.data.TFRecordDataset([file_path])
     for raw_record in raw_dataset.take(1):
         example = tf.train.Example()
@@ -20,5 +78,301 @@ def inspect_tfrecord(file_path):
             else:
                 print(f"{key}: unknown type")
 
-# Call the function with your file path
-inspect_tfrecord('data/next_day_wildfire_spread_train_00.tfrecord')
+
+# --- per-shard statistics ---------------------------------------------------------
+
+def _empty_channel(key):
+    return {"values": 0, "nan": 0, "missing": 0, "short": 0, "sum": 0.0, "sumsq": 0.0,
+            "min": None, "max": None, "below": 0, "above": 0,
+            "histogram": [0] * (MASK_BINS if key in ("PrevFireMask", "FireMask") else BINS)}
+
+
+def empty_profile():
+    return {
+        "records": 0, "unparseable": 0,
+        "channels": {key: _empty_channel(key) for key in CHANNELS},
+        "fire_area": {"prev": [0] * (len(AREA_EDGES) - 1), "next": [0] * (len(AREA_EDGES) - 1),
+                      "small_fire": 0, "ratio_high": 0, "ratio_low": 0, "kept": 0},
+    }
+
+
+def _parse_with_lengths(raw_batch):
+    """((B, 10, 4096) float array with NaN padding, (B, 10) value counts, unparseable)"""
+    import tensorflow as tf
+
+    spec = {key: tf.io.VarLenFeature(tf.float32) for key in CHANNELS}
+    size = GRID_SIZE * GRID_SIZE
+    try:
+        parsed = tf.io.parse_example(raw_batch, spec)
+        n = int(raw_batch.shape[0])
+        values = np.full((n, len(CHANNELS), size), np.nan, dtype=np.float32)
+        lengths = np.zeros((n, len(CHANNELS)), dtype=np.int64)
+        for c, key in enumerate(CHANNELS):
+            sp = parsed[key]
+            index = sp.indices.numpy()
+            keep = index[:, 1] < size  # longer arrays are cut, as the training parser does
+            values[index[keep, 0], c, index[keep, 1]] = sp.values.numpy()[keep]
+            lengths[:, c] = np.bincount(index[:, 0], minlength=n)
+        return values, lengths, 0
+    except tf.errors.InvalidArgumentError:
+        rows, counts, bad = [], [], 0
+        for raw in raw_batch.numpy():
+            try:
+                example = tf.train.Example()
+                example.ParseFromString(raw)
+            except Exception:
+                bad += 1
+                continue
+            row = np.full((len(CHANNELS), size), np.nan, dtype=np.float32)
+            count = np.zeros(len(CHANNELS), dtype=np.int64)
+            for c, key in enumerate(CHANNELS):
+                feature = example.features.feature.get(key)
+                if feature is None or feature.WhichOneof("kind") != "float_list":
+                    continue  # missing, or not floats: counted as missing
+                data = np.asarray(feature.float_list.value, dtype=np.float32)[:size]
+                row[c, :len(data)] = data
+                count[c] = len(feature.float_list.value)
+            rows.append(row)
+            counts.append(count)
+        if not rows:
+            return np.empty((0, len(CHANNELS), size), np.float32), np.empty((0, len(CHANNELS)), np.int64), bad
+        return np.stack(rows), np.stack(counts), bad
+
+
+def _update_channel(stats, key, values, lengths):
+    size = GRID_SIZE * GRID_SIZE
+    stats["missing"] += int((lengths == 0).sum())
+    stats["short"] += int(((lengths > 0) & (lengths < size)).sum())
+    present = values[lengths > 0]
+    if present.size == 0:
+        return
+    # Padding of short arrays is NaN too; only count NaNs stored in the records
+    stored = present[:, :min(size, int(lengths.max()))]
+    in_record = np.arange(stored.shape[1])[None, :] < np.minimum(lengths[lengths > 0], size)[:, None]
+    finite = stored[in_record]
+    nan = np.isnan(finite)
+    stats["nan"] += int(nan.sum())
+    finite = finite[~nan].astype(np.float64)
+    if finite.size == 0:
+        return
+    stats["values"] += int(finite.size)
+    stats["sum"] += float(finite.sum())
+    stats["sumsq"] += float(np.dot(finite, finite))
+    lo, hi = float(finite.min()), float(finite.max())
+    stats["min"] = lo if stats["min"] is None else min(stats["min"], lo)
+    stats["max"] = hi if stats["max"] is None else max(stats["max"], hi)
+    low, high = HIST_RANGES[key]
+    bins = len(stats["histogram"])
+    stats["below"] += int((finite < low).sum())
+    stats["above"] += int((finite >= high).sum())
+    inside = finite[(finite >= low) & (finite < high)]
+    index = ((inside - low) * (bins / (high - low))).astype(np.int64)
+    stats["histogram"] = (np.asarray(stats["histogram"]) +
+                          np.bincount(np.minimum(index, bins - 1), minlength=bins)).tolist()
+
+
+def _update_fire_area(stats, values):
+    # Mask sums, as features.spread_targets computes them (unknown -1 pixels subtract)
+    current = np.nan_to_num(values[:, PREV_FIRE]).sum(axis=1)
+    future = np.nan_to_num(values[:, FIRE]).sum(axis=1)
+    for name, area in (("prev", current), ("next", future)):
+        counts = np.histogram(np.clip(area, AREA_EDGES[0], AREA_EDGES[-1] - 1), bins=AREA_EDGES)[0]
+        stats[name] = (np.asarray(stats[name]) + counts).tolist()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = future / current
+    small = current < 10.0
+    stats["small_fire"] += int(small.sum())
+    stats["ratio_high"] += int((~small & (ratio > 10.0)).sum())
+    stats["ratio_low"] += int((~small & (ratio < 0.1)).sum())
+    stats["kept"] += int((~small & (ratio <= 10.0) & (ratio >= 0.1)).sum())
+
+
+def profile_shard(file_path, batch_size=256):
+    """Statistics for one shard; runs inside a worker process"""
+    import tensorflow as tf
+
+    start = time.time()
+    profile = empty_profile()
+    for raw_batch in tf.data.TFRecordDataset([file_path]).batch(batch_size):
+        values, lengths, bad = _parse_with_lengths(raw_batch)
+        profile["records"] += len(values) + bad
+        profile["unparseable"] += bad
+        for c, key in enumerate(CHANNELS):
+            _update_channel(profile["channels"][key], key, values[:, c], lengths[:, c])
+        _update_fire_area(profile["fire_area"], values)
+    profile["seconds"] = time.time() - start
+    return profile
+
+
+def merge_profiles(profiles):
+    total = empty_profile()
+    for p in profiles:
+        total["records"] += p["records"]
+        total["unparseable"] += p["unparseable"]
+        for key, stats in p["channels"].items():
+            out = total["channels"][key]
+            for field in ("values", "nan", "missing", "short", "sum", "sumsq", "below", "above"):
+                out[field] += stats[field]
+            for field, pick in (("min", min), ("max", max)):
+                if stats[field] is not None:
+                    out[field] = stats[field] if out[field] is None else pick(out[field], stats[field])
+            out["histogram"] = [a + b for a, b in zip(out["histogram"], stats["histogram"])]
+        for field, value in p["fire_area"].items():
+            area = total["fire_area"]
+            area[field] = [a + b for a, b in zip(area[field], value)] if isinstance(value, list) \
+                else area[field] + value
+    return total
+
+
+def summarize(profile):
+    """Rates, means and labelled histograms from merged counters"""
+    records = max(profile["records"] - profile["unparseable"], 1)
+    channels = {}
+    for key, s in profile["channels"].items():
+        n = s["values"]
+        mean = s["sum"] / n if n else None
+        std = float(np.sqrt(max(s["sumsq"] / n - mean ** 2, 0.0))) if n else None
+        stored = n + s["nan"]
+        low, high = HIST_RANGES[key]
+        channels[key] = {
+            "values": n, "min": s["min"], "max": s["max"], "mean": mean, "std": std,
+            "nan_rate": s["nan"] / stored if stored else 0.0,
+            "missing_rate": s["missing"] / records,
+            "short_rate": s["short"] / records,
+            "histogram": {"range": [low, high], "counts": s["histogram"],
+                          "below": s["below"], "above": s["above"]},
+        }
+    area = profile["fire_area"]
+    return {
+        "records": profile["records"],
+        "unparseable": profile["unparseable"],
+        "channels": channels,
+        "fire_area": {
+            "edges": list(AREA_EDGES),
+            "prev": area["prev"], "next": area["next"],
+            "filters": {k: area[k] for k in ("small_fire", "ratio_high", "ratio_low", "kept")},
+        },
+    }
+
+
+# --- cache and driver -----------------------------------------------------------
+
+class ProfileCache:
+    """Per-shard profiles keyed by SHA-256, with checksums reused while size and mtime match."""
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.json")
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def checksum(self, path):
+        from feature_store import file_sha256
+
+        st = os.stat(path)
+        entry = self.index.get(os.path.abspath(path))
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        checksum = file_sha256(path)
+        self.index[os.path.abspath(path)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                             "sha256": checksum}
+        return checksum
+
+    def _path(self, checksum):
+        return os.path.join(self.directory, f"{checksum[:16]}.v{PROFILE_VERSION}.json")
+
+    def get(self, checksum):
+        try:
+            with open(self._path(checksum)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, checksum, profile):
+        tmp = f"{self._path(checksum)}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(profile, f)
+        os.replace(tmp, self._path(checksum))
+
+    def save_index(self):
+        tmp = f"{self.index_path}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+
+def profile_directory(data_dir, workers=None, cache_dir=CACHE_DIR, pattern="*.tfrecord"):
+    """Profile report for every shard in `data_dir`, reading only uncached shards"""
+    paths = sorted(glob.glob(os.path.join(data_dir, pattern)))
+    cache = ProfileCache(cache_dir)
+    checksums = [cache.checksum(path) for path in paths]
+    cache.save_index()
+    profiles = [cache.get(c) for c in checksums]
+    pending = [i for i, p in enumerate(profiles) if p is None]
+
+    workers = workers or int(os.environ.get("IGNIS_INGEST_WORKERS", 0)) or os.cpu_count() or 1
+    workers = max(1, min(workers, len(pending) or 1))
+    print(f"{len(paths) - len(pending)} of {len(paths)} shards cached; "
+          f"profiling {len(pending)} with {workers} worker(s)...", file=sys.stderr)
+    start = time.time()
+
+    def finish(i, profile):
+        profiles[i] = profile
+        cache.put(checksums[i], profile)
+        print(f"  {os.path.basename(paths[i])}: {profile['records']} records, "
+              f"{profile['seconds']:.1f}s", file=sys.stderr)
+
+    if workers <= 1:
+        for i in pending:
+            finish(i, profile_shard(paths[i]))
+    elif pending:
+        from process_data_dual import _shard_worker_init
+
+        ctx = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_shard_worker_init) as pool:
+            futures = {pool.submit(profile_shard, paths[i]): i for i in pending}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+
+    report = summarize(merge_profiles(profiles))
+    report["version"] = PROFILE_VERSION
+    report["directory"] = data_dir
+    report["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    report["shards"] = {
+        os.path.basename(path): {"sha256": c, "records": p["records"], "unparseable": p["unparseable"],
+                                 "fire_filters": {k: p["fire_area"][k] for k in
+                                                  ("small_fire", "ratio_high", "ratio_low", "kept")}}
+        for path, c, p in zip(paths, checksums, profiles)
+    }
+    print(f"{report['records']} records in {len(paths)} shards, "
+          f"profiled in {time.time() - start:.1f}s", file=sys.stderr)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or profile wildfire TFRecords")
+    parser.add_argument("path", nargs="?", default=None,
+                        help="a .tfrecord to list keys of, or the directory to --profile")
+    parser.add_argument("--profile", action="store_true", help="profile every shard in the directory")
+    parser.add_argument("--out", default="profile.json")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        report = profile_directory(args.path or "data", args.workers, args.cache_dir)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Wrote {args.out}")
+    else:
+        inspect_tfrecord(args.path or "data/next_day_wildfire_spread_train_00.tfrecord")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
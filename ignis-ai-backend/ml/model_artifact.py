@@ -0,0 +1,241 @@
+"""Compact, memory-mapped model artifacts.
+
+An artifact is the compiled form of a trained model (see tree_compiler.py)
+written as two files next to the .joblib:
+
+    wildfire_spread_classifier_advanced.bin   raw little-endian arrays
+    wildfire_spread_classifier_advanced.json  manifest
+
+The manifest records the format version, the feature order the model was
+trained on, each array's offset/dtype/shape inside the .bin, the SHA-256 of
+the .bin and of the source .joblib, and free-form training metadata.
+Loading maps the .bin with np.memmap, so there is no unpickling, sklearn
+does not need to be imported, and processes serving the same artifact share
+its pages through the OS page cache.
+
+Usage:
+    python model_artifact.py export      # write artifacts for the current .joblib files
+    python model_artifact.py bench       # compare load time against joblib.load
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from features import FEATURE_NAMES
+from tree_compiler import CompiledEnsemble, SpreadEngine, check_parity, compile_ensemble
+
+FORMAT_VERSION = 1
+
+_ARRAYS = ("feature", "threshold", "leaf_value")
+_ALIGN = 64
+
+
+class SchemaMismatchError(ValueError):
+    """The artifact was trained on a different feature layout than the caller expects."""
+
+
+def artifact_paths(base):
+    """(.bin, .json) paths for a model path with or without its .joblib suffix"""
+    if base.endswith(".joblib"):
+        base = base[:-len(".joblib")]
+    return base + ".bin", base + ".json"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write(path, data, mode="wb"):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save_artifact(compiled, base, feature_names=FEATURE_NAMES, metadata=None, source=None):
+    """Write a CompiledEnsemble as .bin + .json; returns the manifest.
+
+    The .bin is written before the manifest and both are swapped in with
+    os.replace, so a reader never sees a manifest pointing at a partial file.
+    """
+    if len(feature_names) != compiled.n_features:
+        raise ValueError(f"{len(feature_names)} feature names for a "
+                         f"{compiled.n_features}-feature model")
+    bin_path, json_path = artifact_paths(base)
+
+    blob = bytearray()
+    arrays = {}
+    for name in _ARRAYS:
+        arr = np.ascontiguousarray(getattr(compiled, name))
+        arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+        blob.extend(b"\0" * (-len(blob) % _ALIGN))
+        arrays[name] = {"offset": len(blob), "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        blob.extend(arr.tobytes())
+    _atomic_write(bin_path, bytes(blob))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "kind": compiled.kind,
+        "feature_names": list(feature_names),
+        "n_features": compiled.n_features,
+        "n_trees": compiled.n_trees,
+        "depth": compiled.depth,
+        "learning_rate": compiled.learning_rate,
+        "init_raw": compiled.init_raw,
+        "classes": None if compiled.classes is None else compiled.classes.tolist(),
+        "input_dtype": compiled.input_dtype,
+        "decision": compiled.decision,
+        "arrays": arrays,
+        "model_sha256": hashlib.sha256(blob).hexdigest(),
+        "source": None if source is None else {
+            "path": os.path.basename(source), "sha256": file_sha256(source)},
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "training": metadata or {},
+    }
+    _atomic_write(json_path, json.dumps(manifest, indent=1, default=str).encode("utf-8"))
+    return manifest
+
+
+def read_manifest(base):
+    with open(artifact_paths(base)[1]) as f:
+        return json.load(f)
+
+
+def load_artifact(base, expected_features=FEATURE_NAMES, verify_hash=False):
+    """Memory-map an artifact into a CompiledEnsemble.
+
+    Raises SchemaMismatchError straight away if the manifest's feature order
+    differs from `expected_features`, and ValueError if the format is unknown
+    or the .bin does not match the manifest.
+    """
+    bin_path, _ = artifact_paths(base)
+    manifest = read_manifest(base)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{bin_path}: unsupported artifact format {manifest.get('format_version')}")
+    if expected_features is not None and manifest["feature_names"] != list(expected_features):
+        theirs, ours = manifest["feature_names"], list(expected_features)
+        diff = [f"{i}: {a!r} != {b!r}" for i, (a, b) in enumerate(zip(theirs, ours)) if a != b]
+        raise SchemaMismatchError(f"{bin_path}: feature schema mismatch "
+                                  f"({len(theirs)} vs {len(ours)} features; {', '.join(diff[:3])})")
+
+    size = os.path.getsize(bin_path)
+    arrays = {}
+    for name in _ARRAYS:
+        spec = manifest["arrays"][name]
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        end = spec["offset"] + dtype.itemsize * int(np.prod(shape))
+        if end > size:
+            raise ValueError(f"{bin_path}: truncated ({size} bytes, manifest needs {end})")
+        arrays[name] = np.memmap(bin_path, dtype=dtype, mode="r", offset=spec["offset"], shape=shape)
+    if verify_hash and file_sha256(bin_path) != manifest["model_sha256"]:
+        raise ValueError(f"{bin_path}: contents do not match the manifest hash")
+
+    classes = manifest["classes"]
+    return CompiledEnsemble(
+        arrays["feature"], arrays["threshold"], arrays["leaf_value"],
+        learning_rate=manifest["learning_rate"],
+        init_raw=manifest["init_raw"],
+        n_features=manifest["n_features"],
+        kind=manifest["kind"],
+        classes=None if classes is None else np.array(classes),
+        # Absent in artifacts written before hist models were supported
+        input_dtype=manifest.get("input_dtype", "float32"),
+        decision=manifest.get("decision", "ge"),
+    )
+
+
+def is_current(base, source):
+    """True if an artifact exists and was exported from this exact source .joblib"""
+    try:
+        manifest = read_manifest(base)
+    except (OSError, ValueError):
+        return False
+    src = manifest.get("source") or {}
+    return os.path.exists(source) and src.get("sha256") == file_sha256(source)
+
+
+def _threshold_probe(compiled, n_rows=512, seed=0):
+    """Rows sitting on and around the ensemble's split thresholds"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, compiled.n_features))
+    for f in range(compiled.n_features):
+        cuts = compiled.threshold[(compiled.feature == f) & np.isfinite(compiled.threshold)]
+        if cuts.size:
+            picks = rng.choice(cuts, size=n_rows)
+            X[:, f] = picks + rng.choice([-1.0, 0.0, 1.0], size=n_rows) * (np.abs(picks) * 1e-6 + 1e-6)
+    return X
+
+
+def export_model(model, base, metadata=None, source=None, parity_rows=None):
+    """Compile a fitted model, check it against sklearn and write the artifact"""
+    compiled = compile_ensemble(model)
+    # Parity is checked here once, so loading never needs sklearn
+    if parity_rows is None:
+        parity_rows = _threshold_probe(compiled)
+    X = np.asarray(parity_rows, dtype=np.float64)
+    if compiled.kind == "classifier":
+        ok = (np.array_equal(compiled.predict(X), model.predict(X)) and
+              np.array_equal(compiled.predict_proba(X)[:, 1], model.predict_proba(X)[:, 1]))
+    else:
+        ok = np.array_equal(compiled.predict(X), model.predict(X))
+    if not ok:
+        raise AssertionError(f"compiled {compiled.kind} does not match sklearn; artifact not written")
+    metadata = dict(metadata or {})
+    metadata.setdefault("parity_checked_rows", len(X))
+    return save_artifact(compiled, base, metadata=metadata, source=source)
+
+
+if __name__ == "__main__":
+    import joblib
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    sources = [os.path.join(script_dir, "wildfire_spread_classifier_advanced.joblib"),
+               os.path.join(script_dir, "wildfire_spread_regressor_advanced.joblib")]
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+
+    if command == "export":
+        models = [joblib.load(path) for path in sources]
+        engine = SpreadEngine.from_models(*models)
+        check_parity(engine, *models)
+        for model, path in zip(models, sources):
+            manifest = export_model(model, path, source=path,
+                                    metadata={"exported_from": os.path.basename(path)})
+            print(f"Wrote {artifact_paths(path)[0]} ({manifest['n_trees']} trees, "
+                  f"sha256 {manifest['model_sha256'][:12]})")
+
+    elif command == "bench":
+        repeats = 20
+        start = time.perf_counter()
+        for _ in range(repeats):
+            models = [joblib.load(path) for path in sources]
+        joblib_time = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            compiled = [load_artifact(path) for path in sources]
+        artifact_time = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            SpreadEngine(*[load_artifact(path) for path in sources])
+        engine_time = (time.perf_counter() - start) / repeats
+
+        print(f"joblib.load (both models):      {joblib_time * 1000:8.2f} ms")
+        print(f"load_artifact (both models):    {artifact_time * 1000:8.2f} ms")
+        print(f"load_artifact + SpreadEngine:   {engine_time * 1000:8.2f} ms")
+        print(f"speedup: {joblib_time / artifact_time:.1f}x "
+              "(excludes the sklearn import the artifact path avoids)")
+
+    else:
+        sys.exit(f"unknown command {command!r}; use export or bench")
@@ -0,0 +1,234 @@
+"""Versioned model directories with an atomically switched "current" pointer.
+
+    models/
+        CURRENT        name of the version being served, e.g. "v0003"
+        v0001/
+            wildfire_spread_classifier_advanced.joblib  (+ .bin/.json artifact)
+            wildfire_spread_regressor_advanced.joblib   (+ .bin/.json artifact)
+            version.json    parent version, and for each model how it was
+                            trained (full or incremental), its metrics and
+                            the feature-store chunks it has seen
+        v0002/ ...
+
+Each training run publishes a new version: its model is written to a
+temporary directory, the other model is hard-linked (or copied) from the
+current version, and the directory is renamed into place complete. Only
+then is CURRENT replaced with os.replace. A version is never modified
+after it is published, so a reader that resolves CURRENT sees one whole
+pair of models, old or new; predict_worker.py watches CURRENT and swaps
+the new pair in without a restart.
+
+Without a models/CURRENT the .joblib files next to this script are served
+(and become the other half of the first published version).
+
+Usage:
+    python model_registry.py list
+    python model_registry.py use v0002        # roll back / forward
+    python model_registry.py prune --keep 5
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishing is not serialized between processes
+    fcntl = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.environ.get("IGNIS_MODELS_DIR", os.path.join(script_dir, "models"))
+# Served when no version has been published yet
+LEGACY_DIR = script_dir
+MODEL_FILES = {
+    "classifier": "wildfire_spread_classifier_advanced.joblib",
+    "regressor": "wildfire_spread_regressor_advanced.joblib",
+}
+POINTER = "CURRENT"
+VERSION_FILE = "version.json"
+
+
+def _artifact_files(task):
+    stem = MODEL_FILES[task][:-len(".joblib")]
+    return [MODEL_FILES[task], stem + ".bin", stem + ".json"]
+
+
+def pointer_path(root=None):
+    return os.path.join(root or MODELS_DIR, POINTER)
+
+
+def current_version(root=None):
+    """Name of the version CURRENT points at, or None before the first publish"""
+    try:
+        with open(pointer_path(root)) as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return name or None
+
+
+def version_dir(version=None, root=None):
+    """Directory of `version` (default: current); the legacy directory if there is none"""
+    version = version or current_version(root)
+    return LEGACY_DIR if version is None else os.path.join(root or MODELS_DIR, version)
+
+
+def model_path(task, version=None, root=None):
+    """.joblib path of one model ("classifier" or "regressor") in a version"""
+    return os.path.join(version_dir(version, root), MODEL_FILES[task])
+
+
+def versions(root=None):
+    """Published version names, oldest first"""
+    root = root or MODELS_DIR
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return []
+    return sorted(n for n in names if n.startswith("v") and n[1:].isdigit()
+                  and os.path.isdir(os.path.join(root, n)))
+
+
+def read_version(version=None, root=None):
+    """version.json of a version ({} for the legacy models)"""
+    version = version or current_version(root)
+    if version is None:
+        return {}
+    with open(os.path.join(version_dir(version, root), VERSION_FILE)) as f:
+        return json.load(f)
+
+
+def set_current(version, root=None):
+    """Point CURRENT at a published version (atomic for readers)"""
+    root = root or MODELS_DIR
+    if not os.path.isfile(os.path.join(root, version, VERSION_FILE)):
+        raise ValueError(f"{version!r} is not a published version in {root}")
+    tmp = f"{pointer_path(root)}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer_path(root))
+
+
+@contextmanager
+def _publish_lock(root):
+    with open(os.path.join(root, ".lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def publish(task, model, metadata, trained_on, parity_rows=None, root=None):
+    """Write `model` as a new version alongside the current other model and make it current.
+
+    `metadata` is stored in the artifact manifest and version.json;
+    `trained_on` lists the [shard, sha256] feature-store chunks the model has
+    seen (incremental runs train on the chunks missing from it). Returns the
+    new version's name.
+    """
+    import joblib
+    from model_artifact import export_model
+
+    root = root or MODELS_DIR
+    os.makedirs(root, exist_ok=True)
+    tmp = os.path.join(root, f".{task}-{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        path = os.path.join(tmp, MODEL_FILES[task])
+        joblib.dump(model, path)
+        export_model(model, path, source=path, parity_rows=parity_rows, metadata=metadata)
+
+        with _publish_lock(root):
+            # The other model comes from whatever is current now, so runs for
+            # the two tasks can train concurrently without losing either
+            parent = current_version(root)
+            info = read_version(parent, root)
+            other = "regressor" if task == "classifier" else "classifier"
+            for name in _artifact_files(other):
+                src = os.path.join(version_dir(parent, root), name)
+                if os.path.exists(src):
+                    _link_or_copy(src, os.path.join(tmp, name))
+            models = dict(info.get("models") or {other: {"mode": "legacy"}})
+            models[task] = {**metadata, "trained_on": trained_on}
+
+            existing = versions(root)
+            version = f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+            with open(os.path.join(tmp, VERSION_FILE), "w") as f:
+                json.dump({"version": version, "parent": parent, "updated": task,
+                           "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                           "models": models}, f, indent=1, default=str)
+            os.rename(tmp, os.path.join(root, version))
+            set_current(version, root)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return version
+
+
+def prune(keep=5, root=None):
+    """Delete all but the newest `keep` versions, never the current one"""
+    root = root or MODELS_DIR
+    current = current_version(root)
+    removed = []
+    with _publish_lock(root):
+        for name in versions(root)[:-keep] if keep > 0 else versions(root):
+            if name != current:
+                # Processes still serving a removed version keep their mapped files
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+                removed.append(name)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage published model versions")
+    parser.add_argument("--root", default=MODELS_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="published versions; * marks the current one")
+    use = sub.add_parser("use", help="make a published version current")
+    use.add_argument("version")
+    cleanup = sub.add_parser("prune", help="delete old versions")
+    cleanup.add_argument("--keep", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        current = current_version(args.root)
+        if not versions(args.root):
+            print(f"No published versions in {args.root}; serving the models in {LEGACY_DIR}")
+        for name in versions(args.root):
+            info = read_version(name, args.root)
+            parts = []
+            for task in MODEL_FILES:
+                entry = info["models"].get(task, {})
+                parts.append(f"{task}: {entry.get('mode', '?')}, {entry.get('boosting_stages', '?')} stages")
+            print(f"{'*' if name == current else ' '} {name}  {info['created_at']}  "
+                  f"parent {info['parent'] or '-'}  ({'; '.join(parts)})")
+    elif args.command == "use":
+        try:
+            set_current(args.version, args.root)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"Serving {args.version}")
+    else:
+        removed = prune(args.keep, args.root)
+        print(f"Removed {len(removed)} version(s){': ' + ', '.join(removed) if removed else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
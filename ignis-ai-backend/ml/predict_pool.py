@@ -0,0 +1,414 @@
+"""Multi-process prediction pool.
+
+Scoring, geometry and GeoJSON building in predict_spread.py hold the GIL,
+so threads (predict_worker.py) keep one core busy. PredictionPool runs
+predict_fire_spread_batch in N worker processes instead:
+
+    shared memory   the compiled engine's arrays (tree_compiler's
+                    shared_state) and the climatology grid are copied into
+                    one SharedMemory block when the pool starts; workers
+                    map views of it, so N workers hold one copy. DEM tiles
+                    are memory-mapped files already and shared through the
+                    page cache.
+    fan-out         fires are cut into chunks, each worker has up to two
+                    chunks queued on its pipe, and results come back in
+                    input order (imap streams them as they complete).
+    health          health() pings every worker and reports its pid,
+                    round-trip time, work done and memory; a worker that
+                    died or stopped answering is replaced. A worker that
+                    dies mid-batch is replaced and its chunk retried once.
+
+Workers start with spawn (the serving process runs threads, which fork does
+not copy safely) and set IGNIS_POOL_WORKER=1 so importing predict_spread
+skips loading the models. When the parent serves through sklearn
+(IGNIS_INFERENCE=sklearn) there is nothing to share and every worker loads
+its own models. Weather/elevation caches stay per process unless
+IGNIS_CACHE_DB points them at a shared SQLite file.
+
+Usage:
+    python predict_pool.py fires.json --workers 4 [--format compact] > results.json
+    python predict_pool.py --bench [--workers 4] [--fires 2000]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+import result_format
+
+WORKERS = int(os.environ.get("IGNIS_POOL_WORKERS", os.cpu_count() or 1))
+CHUNK_SIZE = 64
+# Chunks queued per worker: one running and one waiting, so a worker never idles on IPC
+QUEUE_DEPTH = 2
+PING_TIMEOUT = 5.0
+_ALIGN = 64
+
+
+class SharedArrays:
+    """Named arrays packed into one shared-memory block.
+
+    `layout` (name -> offset, dtype, shape) and the block name are all a
+    process needs to attach; attach() returns read-only views.
+    """
+
+    def __init__(self, arrays):
+        self.layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            self.layout[name] = (offset, array.dtype.str, array.shape)
+            offset += -(-array.nbytes // _ALIGN) * _ALIGN
+        self.nbytes = offset
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.name = self._shm.name
+        for name, view in _views(self._shm.buf, self.layout).items():
+            view[...] = arrays[name]
+            view.flags.writeable = False
+
+    @staticmethod
+    def attach(name, layout):
+        """(SharedMemory, views); keep the SharedMemory referenced while the views are used"""
+        shm = shared_memory.SharedMemory(name=name)
+        views = _views(shm.buf, layout)
+        for view in views.values():
+            view.flags.writeable = False
+        return shm, views
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _views(buf, layout):
+    return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf, offset=offset)
+            for name, (offset, dtype, shape) in layout.items()}
+
+
+def _export(predictor):
+    """(SharedArrays or None, meta) for the predictor's engine and climatology grid"""
+    arrays, meta = {}, {}
+    if predictor.engine is not None:
+        engine_arrays, meta["engine"] = predictor.engine.shared_state()
+        arrays.update({f"engine/{k}": v for k, v in engine_arrays.items()})
+    if predictor.fuel_grid is not None:
+        grid_arrays, meta["climatology"] = predictor.fuel_grid.shared_state()
+        arrays.update({f"climatology/{k}": v for k, v in grid_arrays.items()})
+    if "engine" not in meta:
+        return None, meta  # sklearn models cannot be shared; workers load their own
+    return SharedArrays(arrays), meta
+
+
+# --- worker process --------------------------------------------------------
+
+def _worker_main(conn, shm_name, layout, meta):
+    if shm_name is not None:
+        os.environ["IGNIS_POOL_WORKER"] = "1"
+    import predict_spread
+
+    shm = None
+    if shm_name is not None:
+        from climatology import Climatology
+        from tree_compiler import SpreadEngine
+
+        shm, views = SharedArrays.attach(shm_name, layout)
+
+        def part(prefix):
+            return {k[len(prefix):]: v for k, v in views.items() if k.startswith(prefix)}
+
+        predict_spread.set_models(None, None, SpreadEngine.from_shared_state(part("engine/"), meta["engine"]))
+        if "climatology" in meta:
+            predict_spread.fuel_grid = Climatology.from_shared_state(part("climatology/"), meta["climatology"])
+
+    started = time.time()
+    stats = {"chunks": 0, "fires": 0, "errors": 0, "busy_s": 0.0}
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            op, job, payload = conn.recv()
+        except (EOFError, OSError):
+            break  # parent went away
+        if op == "stop":
+            break
+        if op == "ping":
+            conn.send((job, True, dict(stats, pid=os.getpid(), uptime_s=time.time() - started,
+                                       max_rss_mb=_max_rss_mb(),
+                                       shared=shm is not None)))
+            continue
+        fires, output, decimals, encoded = payload
+        start = time.perf_counter()
+        try:
+            results = predict_spread.predict_fire_spread_batch(fires, output=output, decimals=decimals)
+            if encoded:
+                results = [result_format.dumps(r) for r in results]
+            reply = (job, True, results)
+        except Exception as e:
+            stats["errors"] += 1
+            reply = (job, False, _picklable(e))
+        stats["busy_s"] += time.perf_counter() - start
+        stats["chunks"] += 1
+        stats["fires"] += len(fires)
+        conn.send(reply)
+    if shm is not None:
+        shm.close()
+
+
+def _picklable(error):
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# --- pool --------------------------------------------------------------------
+
+class _Worker:
+    def __init__(self, ctx, index, shm_name, layout, meta):
+        self.index = index
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, shm_name, layout, meta),
+                                   name=f"predict-pool-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self.pending = []  # job ids in the order they were sent
+        self.pid = None
+
+    def wait_ready(self, timeout):
+        if not self.conn.poll(timeout):
+            raise RuntimeError(f"pool worker {self.index} did not start within {timeout:.0f}s")
+        _, self.pid = self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(("stop", None, None))
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class PredictionPool:
+    """predict_fire_spread_batch fanned out over `workers` processes, results in input order.
+
+    Not thread-safe: one batch (map / imap) or health() call at a time.
+    """
+
+    def __init__(self, workers=WORKERS, chunk_size=CHUNK_SIZE, predictor=None, start_timeout=120.0):
+        if predictor is None:
+            import predict_spread as predictor
+        self.chunk_size = max(1, int(chunk_size))
+        self.start_timeout = start_timeout
+        self._shared, self._meta = _export(predictor)
+        self._layout = self._shared.layout if self._shared is not None else None
+        self._shm_name = self._shared.name if self._shared is not None else None
+        self._ctx = multiprocessing.get_context("spawn")
+        self._next_job = 0
+        self.restarts = 0
+        self._workers = [self._spawn(i) for i in range(max(1, int(workers)))]
+        for worker in self._workers:
+            worker.wait_ready(start_timeout)
+
+    @property
+    def size(self):
+        return len(self._workers)
+
+    @property
+    def shared_bytes(self):
+        return self._shared.nbytes if self._shared is not None else 0
+
+    def _spawn(self, index):
+        return _Worker(self._ctx, index, self._shm_name, self._layout, self._meta)
+
+    def _replace(self, worker):
+        worker.stop()
+        fresh = self._spawn(worker.index)
+        fresh.wait_ready(self.start_timeout)
+        self._workers[worker.index] = fresh
+        self.restarts += 1
+        return fresh
+
+    def _send(self, worker, op, payload):
+        job = self._next_job
+        self._next_job += 1
+        worker.conn.send((op, job, payload))
+        worker.pending.append(job)
+        return job
+
+    def imap(self, fires, output="geojson", decimals=None, encoded=False):
+        """Yield one result per fire, in input order, as chunks complete.
+
+        With encoded=True the workers also serialize the results, and each
+        item is the result's JSON text (result_format.dumps).
+        """
+        fires = list(fires)
+        chunks = [fires[i:i + self.chunk_size] for i in range(0, len(fires), self.chunk_size)]
+        todo = list(range(len(chunks)))[::-1]  # popped from the end, lowest first
+        owner = {}      # job id -> chunk index
+        retried = set()
+        done = {}
+        next_out = 0
+        try:
+            while next_out < len(chunks):
+                for worker in self._workers:
+                    while todo and len(worker.pending) < QUEUE_DEPTH:
+                        c = todo.pop()
+                        owner[self._send(worker, "predict", (chunks[c], output, decimals, encoded))] = c
+                by_conn = {w.conn: w for w in self._workers if w.pending}
+                by_sentinel = {w.process.sentinel: w for w in self._workers if w.pending}
+                for ready in wait(list(by_conn) + list(by_sentinel)):
+                    worker = by_conn.get(ready) or by_sentinel.get(ready)
+                    if worker is None or worker.conn not in by_conn:
+                        continue  # already handled through its pipe in this round
+                    try:
+                        job, ok, value = worker.conn.recv()
+                    except (EOFError, OSError):
+                        lost = [owner.pop(j) for j in worker.pending]
+                        if any(c in retried for c in lost):
+                            raise RuntimeError(f"pool worker {worker.index} died twice on the same chunk")
+                        retried.update(lost)
+                        todo.extend(sorted(lost, reverse=True))
+                        todo.sort(reverse=True)
+                        self._replace(worker)
+                        del by_conn[worker.conn]
+                        continue
+                    worker.pending.remove(job)
+                    c = owner.pop(job)
+                    if not ok:
+                        raise value
+                    done[c] = value
+                while next_out in done:
+                    yield from done.pop(next_out)
+                    next_out += 1
+        finally:
+            # An error or an abandoned iterator leaves replies in flight; collect
+            # them so the next batch starts clean
+            self._drain()
+
+    def _drain(self):
+        for worker in list(self._workers):
+            while worker.pending:
+                try:
+                    job, _, _ = worker.conn.recv()
+                    worker.pending.remove(job)
+                except (EOFError, OSError):
+                    self._replace(worker)
+                    break
+
+    def map(self, fires, output="geojson", decimals=None, encoded=False):
+        """Results for all fires as a list, in input order"""
+        return list(self.imap(fires, output, decimals, encoded))
+
+    def health(self, timeout=PING_TIMEOUT, replace=True):
+        """One status dict per worker; dead or unresponsive workers are replaced when `replace`"""
+        report = []
+        for worker in list(self._workers):
+            status = {"worker": worker.index, "pid": worker.pid, "alive": worker.process.is_alive()}
+            start = time.perf_counter()
+            try:
+                job = self._send(worker, "ping", None)
+                if not worker.conn.poll(timeout):
+                    raise TimeoutError(f"no answer within {timeout:.1f}s")
+                reply_job, _, stats = worker.conn.recv()
+                worker.pending.remove(reply_job)
+                if reply_job != job:
+                    raise RuntimeError("out-of-order reply")
+                status.update(ok=True, ping_ms=(time.perf_counter() - start) * 1000, **stats)
+            except (OSError, EOFError, TimeoutError, RuntimeError) as e:
+                status.update(ok=False, error=str(e) or type(e).__name__)
+                if replace:
+                    status["replaced_by"] = self._replace(worker).pid
+            report.append(status)
+        return report
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- throughput report -------------------------------------------------------
+
+def scaling_report(fires, max_workers=WORKERS, chunk_size=CHUNK_SIZE, output="geojson"):
+    """Fires per second with 1 .. max_workers processes (doubling), warm caches.
+
+    Each pool runs the batch once to warm its workers' caches and
+    connections, then the timed pass. Returns one row per worker count.
+    """
+    counts = sorted({1, max_workers} | {2 ** k for k in range(max_workers.bit_length())
+                                         if 2 ** k <= max_workers})
+    rows = []
+    for n in counts:
+        with PredictionPool(workers=n, chunk_size=chunk_size) as pool:
+            pool.map(fires, output)
+            start = time.perf_counter()
+            pool.map(fires, output)
+            elapsed = time.perf_counter() - start
+        rate = len(fires) / elapsed
+        base = rows[0]["fires_per_s"] if rows else rate
+        rows.append({"workers": n, "seconds": elapsed, "fires_per_s": rate,
+                     "speedup": rate / base, "efficiency": rate / base / n})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-process fire spread prediction")
+    parser.add_argument("fires", nargs="?", help="JSON array of fires (default: stdin)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--format", choices=result_format.FORMATS, default="geojson")
+    parser.add_argument("--decimals", type=int)
+    parser.add_argument("--bench", action="store_true",
+                        help="report throughput from 1 to --workers processes (offline stub API)")
+    parser.add_argument("--fires", dest="n_fires", type=int, default=2000, help="fires per --bench pass")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        from benchmarks import StubOpenMeteo, _fires
+
+        fires = _fires(args.n_fires)
+        with StubOpenMeteo():
+            rows = scaling_report(fires, args.workers, args.chunk_size, args.format)
+        print(f"{len(fires)} fires, chunks of {args.chunk_size}, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'seconds':>8} {'fires/s':>9} {'speedup':>8} {'efficiency':>10}")
+        for r in rows:
+            print(f"{r['workers']:>7} {r['seconds']:>8.2f} {r['fires_per_s']:>9.0f} "
+                  f"{r['speedup']:>7.2f}x {r['efficiency']:>9.0%}")
+        return 0
+
+    with open(args.fires) if args.fires else sys.stdin as f:
+        fires = json.load(f)
+    with PredictionPool(workers=args.workers, chunk_size=args.chunk_size) as pool:
+        print(f"{pool.size} workers, {pool.shared_bytes / 1e6:.1f} MB shared", file=sys.stderr)
+        lines = pool.imap(fires, args.format, args.decimals, encoded=True)
+        sys.stdout.write("[" + ",".join(lines) + "]\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
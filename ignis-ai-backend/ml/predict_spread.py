@@ -1,122 +1,308 @@
 import numpy as np
-import joblib
+import argparse
+import contextvars
+import itertools
 import math
 import json
 import sys
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import result_format
+import spread_grid
+import spread_sim
+from features import point_features
+from timing import note, span, trace
+from tree_compiler import SpreadEngine, check_parity, expit
+from model_artifact import SchemaMismatchError, artifact_paths, is_current, load_artifact
+from geo_cache import GeoCache
+from env_fetch import get_client
+from dem_tiles import open_store
+from climatology import channel_values, fuel_indices, open_climatology, regional_indices
+from risk_tiles import TILE_DIR, open_tiles
+import model_registry
 
-# Determine script directory (models are in the same folder)
+# Determine script directory (bundled models are in the same folder; published
+# versions in models/, see model_registry.py)
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
-# Load models from the same directory as this script
-classifier = joblib.load(os.path.join(script_dir, "wildfire_spread_classifier_advanced.joblib"))
-regressor = joblib.load(os.path.join(script_dir, "wildfire_spread_regressor_advanced.joblib"))
+# Set IGNIS_INFERENCE=sklearn to score through sklearn instead of the compiled engine
+INFERENCE_BACKEND = os.environ.get("IGNIS_INFERENCE", "compiled")
+# When the sklearn models are loaded anyway (no current artifacts), batches
+# of at least this many rows are scored by them: their per-tree loops beat
+# the engine's level-by-level walk from about 100 rows (benchmarks.py
+# inference). Served from artifacts, and in pool workers, everything stays
+# on the engine. 0 keeps every batch on the engine
+SKLEARN_MIN_ROWS = int(os.environ.get("IGNIS_SKLEARN_MIN_ROWS", 100))
+
+def model_files():
+    """(classifier, regressor) .joblib paths of the version models/CURRENT points at.
+
+    Without a published version these are the files next to this script.
+    The pointer is read once, so the pair always comes from one version.
+    """
+    version = model_registry.current_version()
+    return model_registry.model_path("classifier", version), model_registry.model_path("regressor", version)
+
+def model_paths():
+    """Files whose replacement should trigger a model reload"""
+    files = model_files()
+    paths = [model_registry.pointer_path()] + list(files)
+    for path in files:
+        paths.extend(artifact_paths(path))
+    return paths
+
+def load_models():
+    """Load the models, preferring compact artifacts exported from the current .joblib files.
+
+    Returns (classifier, regressor, engine). Served from artifacts, the sklearn
+    models are never unpickled and classifier/regressor are None. A feature
+    schema mismatch in an artifact is raised rather than silently ignored.
+    """
+    classifier_path, regressor_path = model_files()
+    if INFERENCE_BACKEND == "compiled" and all(
+            is_current(path, path) for path in (classifier_path, regressor_path)):
+        try:
+            engine = SpreadEngine(load_artifact(classifier_path), load_artifact(regressor_path))
+            return None, None, engine
+        except SchemaMismatchError:
+            raise
+        except (OSError, ValueError) as e:
+            print(f"Model artifacts unusable, loading joblib models: {e}", file=sys.stderr)
+
+    import joblib
+    return joblib.load(classifier_path), joblib.load(regressor_path), None
+
+def set_models(new_classifier, new_regressor, new_engine=None):
+    """Install the models returned by load_models.
+
+    sklearn models without a ready engine are compiled here and verified
+    bit-for-bit against sklearn on probe rows; if that ever fails, scoring
+    stays on sklearn for these models.
+    """
+    global classifier, regressor, engine
+    compiled = new_engine
+    if compiled is None and INFERENCE_BACKEND == "compiled":
+        try:
+            compiled = SpreadEngine.from_models(new_classifier, new_regressor)
+            check_parity(compiled, new_classifier, new_regressor)
+        except Exception as e:
+            print(f"Compiled inference disabled: {e}", file=sys.stderr)
+            compiled = None
+    classifier, regressor, engine = new_classifier, new_regressor, compiled
+
+# Pool workers (predict_pool.py) are handed the parent's engine and lookup
+# grids in shared memory instead of loading their own copies
+POOL_WORKER = os.environ.get("IGNIS_POOL_WORKER") == "1"
+classifier = regressor = engine = None
+if not POOL_WORKER:
+    with span("model_load"):
+        set_models(*load_models())
+    note("models", "compiled" if engine is not None else "sklearn")
+
+# IGNIS_TIMING_RESULT=1 adds a "timings" block to every result (see timing.py)
+TIMINGS_IN_RESULT = os.environ.get("IGNIS_TIMING_RESULT", "0") == "1"
+
+# Open-Meteo responses cached on a coordinate grid (see geo_cache.py)
+CACHE_DB = os.environ.get("IGNIS_CACHE_DB") or None
+CACHE_SIZE = int(os.environ.get("IGNIS_CACHE_SIZE", 10000))
+weather_cache = GeoCache(
+    "weather",
+    precision=float(os.environ.get("IGNIS_WEATHER_GRID_DEG", 0.01)),
+    ttl=float(os.environ.get("IGNIS_WEATHER_TTL", 900)),
+    max_entries=CACHE_SIZE,
+    db_path=CACHE_DB,
+)
+elevation_cache = GeoCache(
+    "elevation",
+    precision=float(os.environ.get("IGNIS_ELEVATION_GRID_DEG", 0.001)),
+    ttl=None,  # terrain does not change
+    max_entries=CACHE_SIZE,
+    db_path=CACHE_DB,
+)
+
+DEFAULT_ELEVATION = 500
+
+# Offline elevation tiles (build with dem_tiles.py); the network is only
+# used for points the store does not cover
+DEM_DIR = os.environ.get("IGNIS_DEM_DIR", os.path.join(script_dir, "dem"))
+dem_store = open_store(DEM_DIR)
+
+# Drought/vegetation climatology (build with climatology.py); without it
+# every point gets the regional baseline
+CLIMATOLOGY_PATH = os.environ.get("IGNIS_CLIMATOLOGY", os.path.join(script_dir, "climatology.npz"))
+fuel_grid = None if POOL_WORKER else open_climatology(CLIMATOLOGY_PATH)
+
+# Precomputed spread-risk tiles (build with risk_tiles.py, IGNIS_RISK_TILES);
+# without them, or where a tile is stale or missing, predictions run live
+tile_store = None if POOL_WORKER else open_tiles(TILE_DIR)
+
+def dem_elevation(lats, lngs):
+    """Vectorized elevation from the local DEM; NaN where not covered (or no store)"""
+    if dem_store is None:
+        return np.full(len(lats), np.nan)
+    return dem_store.lookup(lats, lngs)
+
+def fetch_weather_data(lat, lng):
+    """Fetch real weather data for the fire location from Open-Meteo, or None on failure"""
+    return get_client().weather(lat, lng)
+
+def fetch_elevation_data(lat, lng):
+    """Fetch elevation for the fire location from Open-Meteo, or None on failure"""
+    return get_client().elevation(lat, lng)
 
 def get_weather_data(lat, lng):
-    """Fetch real weather data for the fire location"""
-    try:
-        # Using Open-Meteo API (free, no key required)
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lng}&current=temperature_2m,relative_humidity_2m,wind_speed_10m,wind_direction_10m"
-        response = requests.get(url, timeout=5)
-        data = response.json()
-        
-        if 'current' in data:
-            return {
-                'temp_max': data['current']['temperature_2m'],
-                'humidity': data['current']['relative_humidity_2m'],
-                'wind_speed': data['current']['wind_speed_10m'],
-                'wind_direction': data['current']['wind_direction_10m']
-            }
-    except Exception as e:
-        print(f"Weather API error: {e}")
-    
-    # Return None if API call fails
-    return None
+    """Weather for the fire location, served from the cache when a nearby lookup is fresh"""
+    return weather_cache.get_or_fetch(lat, lng, fetch_weather_data)
 
 def get_elevation_data(lat, lng):
-    """Fetch elevation data for the fire location"""
-    try:
-        # Using Open-Meteo Elevation API
-        url = f"https://api.open-meteo.com/v1/elevation?latitude={lat}&longitude={lng}"
-        response = requests.get(url, timeout=5)
-        data = response.json()
-        
-        if 'elevation' in data and len(data['elevation']) > 0:
-            return data['elevation'][0]
-    except Exception as e:
-        print(f"Elevation API error: {e}")
-    
-    # Return default if API call fails
-    return 500
+    """Elevation for the fire location from the local DEM, else cached per grid cell"""
+    local = dem_elevation([lat], [lng])[0]
+    if not np.isnan(local):
+        return float(local)
+    elevation = elevation_cache.get_or_fetch(lat, lng, fetch_elevation_data)
+    # Return default if API call fails (never cached, so it is retried next time)
+    return DEFAULT_ELEVATION if elevation is None else elevation
 
-def get_drought_vegetation(lat, lng):
-    """Generate realistic drought and vegetation values based on location and season"""
-    # Get current month to estimate seasonal factors
-    current_month = datetime.now().month
-    
-    # US regions with different climate patterns
-    west_coast = lng < -115
-    southwest = lng < -100 and lat < 37
-    southeast = lng > -90 and lat < 36
-    northeast = lng > -80 and lat > 36
-    
-    # Base drought index (0-5 scale, higher = more drought)
-    if west_coast:
-        # West coast - dry in summer, wet in winter
-        base_drought = 4.0 if 5 <= current_month <= 10 else 2.0
-    elif southwest:
-        # Southwest - generally dry
-        base_drought = 3.5
-    elif southeast:
-        # Southeast - humid but can have drought
-        base_drought = 2.5
-    elif northeast:
-        # Northeast - less drought prone
-        base_drought = 1.5
-    else:
-        # Central US
-        base_drought = 2.0
-    
-    # Add randomness (±1.0)
-    drought = max(0, min(5, base_drought + (np.random.random() * 2 - 1)))
-    
-    # Vegetation index (0-1 scale, higher = more vegetation)
-    # Inversely related to drought but with regional factors
-    if west_coast:
-        base_veg = 0.4
-    elif southwest:
-        base_veg = 0.3
-    elif southeast:
-        base_veg = 0.7
-    elif northeast:
-        base_veg = 0.6
-    else:
-        base_veg = 0.5
-    
-    # Seasonal adjustment
-    if 3 <= current_month <= 8:  # Spring/Summer
-        base_veg += 0.2
-    
-    # Adjust for drought (inverse relationship)
-    veg_adjusted = base_veg * (1 - (drought / 7))
-    
-    # Add randomness (±0.15)
-    vegetation = max(0.1, min(0.9, veg_adjusted + (np.random.random() * 0.3 - 0.15)))
-    
-    return drought, vegetation
+def get_weather_and_elevation(lat, lng):
+    """Weather and elevation for one location; cache misses are fetched concurrently"""
+    weather = weather_cache.get(lat, lng)
+    local = dem_elevation([lat], [lng])[0]
+    elevation = elevation_cache.get(lat, lng) if np.isnan(local) else float(local)
+    note("weather", "cache" if weather is not None else "api")
+    note("elevation", "dem" if not np.isnan(local) else "cache" if elevation is not None else "api")
+    if weather is None and elevation is None:
+        weather, elevation = get_client().weather_and_elevation(lat, lng)
+        if weather is not None:
+            weather_cache.set(lat, lng, weather)
+        if elevation is not None:
+            elevation_cache.set(lat, lng, elevation)
+    # One side missing: fetch it directly, as get_or_fetch would look it up
+    # (and count the miss) a second time
+    elif weather is None:
+        weather = fetch_weather_data(lat, lng)
+        if weather is not None:
+            weather_cache.set(lat, lng, weather)
+    elif elevation is None:
+        elevation = fetch_elevation_data(lat, lng)
+        if elevation is not None:
+            elevation_cache.set(lat, lng, elevation)
+    return weather, elevation
+
+def _bulk_lookup(cache, coords, values=None):
+    """Split coords into cached values and one representative per uncached grid cell.
 
-def predict_fire_spread(fire_data):
-    """Predict fire spread using both classifier and regressor models."""
+    Entries already filled in `values` are kept and not looked up.
+    """
+    values = [None] * len(coords) if values is None else values
+    missing = {}  # grid cell -> indices into coords
+    for i, (lat, lng) in enumerate(coords):
+        if values[i] is not None:
+            continue
+        value = cache.get(lat, lng)
+        if value is None:
+            missing.setdefault(cache.key(lat, lng), []).append(i)
+        else:
+            values[i] = value
+    return values, missing
+
+def get_weather_and_elevation_many(coords):
+    """Weather and elevation for many (lat, lng) pairs.
+
+    Cache hits are served locally; the misses are deduplicated per grid cell
+    and fetched with Open-Meteo's multi-coordinate requests, weather and
+    elevation in flight together. Returns two lists aligned with `coords`.
+    """
+    weathers, weather_missing = _bulk_lookup(weather_cache, coords)
+    local = dem_elevation([c[0] for c in coords], [c[1] for c in coords])
+    elevations = [None if np.isnan(v) else v for v in local.tolist()]
+    from_dem = sum(v is not None for v in elevations)
+    elevations, elevation_missing = _bulk_lookup(elevation_cache, coords, elevations)
+    weather_misses = sum(len(g) for g in weather_missing.values())
+    elevation_misses = sum(len(g) for g in elevation_missing.values())
+    note("weather", "cache", len(coords) - weather_misses)
+    note("weather", "api", weather_misses)
+    note("elevation", "dem", from_dem)
+    note("elevation", "cache", len(coords) - from_dem - elevation_misses)
+    note("elevation", "api", elevation_misses)
+    if not weather_missing and not elevation_missing:
+        return weathers, elevations
+
+    w_groups = list(weather_missing.values())
+    e_groups = list(elevation_missing.values())
+    w_coords = [coords[group[0]] for group in w_groups]
+    e_coords = [coords[group[0]] for group in e_groups]
+    fetched_w, fetched_e = get_client().weather_and_elevation_many(
+        ([c[0] for c in w_coords], [c[1] for c in w_coords]),
+        ([c[0] for c in e_coords], [c[1] for c in e_coords]))
+
+    for cache, groups, group_coords, fetched, out in (
+            (weather_cache, w_groups, w_coords, fetched_w, weathers),
+            (elevation_cache, e_groups, e_coords, fetched_e, elevations)):
+        for group, (lat, lng), value in zip(groups, group_coords, fetched):
+            if value is None:
+                continue
+            cache.set(lat, lng, value)
+            for i in group:
+                out[i] = value
+    return weathers, elevations
+
+def cache_stats():
+    """Hit/miss counters for the environmental data caches"""
+    return {"weather": weather_cache.summary(), "elevation": elevation_cache.summary()}
+
+def get_fuel_many(lats, lngs, month=None):
+    """Fuel inputs for many points: a dict of "pdsi", "ndvi", "drought" and "vegetation" arrays.
+
+    pdsi and ndvi are in the units the models were trained on; drought
+    (0-5) and vegetation (0-1) are the same values on the scale results
+    report and spread_geometry uses. They come from the climatology grid
+    built from the training records (see climatology.py); points it does
+    not cover get the fixed regional baseline. All are deterministic for a
+    given location and month.
+    """
+    month = month or datetime.now().month
+    drought, vegetation = regional_indices(lats, lngs, month)
+    pdsi, ndvi = channel_values(drought, vegetation)
+    known = np.zeros(len(drought), dtype=bool)
+    if fuel_grid is not None:
+        grid_pdsi, grid_ndvi, known = fuel_grid.lookup(lats, lngs, month)
+        grid_drought, grid_vegetation = fuel_indices(grid_pdsi, grid_ndvi)
+        pdsi, ndvi = np.where(known, grid_pdsi, pdsi), np.where(known, grid_ndvi, ndvi)
+        drought = np.where(known, grid_drought, drought)
+        vegetation = np.where(known, grid_vegetation, vegetation)
+    note("fuel", "climatology", int(known.sum()))
+    note("fuel", "regional", int(len(known) - known.sum()))
+    return {"pdsi": pdsi, "ndvi": ndvi, "drought": drought, "vegetation": vegetation}
+
+def get_fuel(lat, lng):
+    """Fuel inputs (see get_fuel_many) for one location in the current month, as floats"""
+    return {key: float(values[0]) for key, values in get_fuel_many([lat], [lng]).items()}
+
+def get_environment(fire_data):
+    """Collect the weather, terrain and fuel inputs for one fire"""
+    weather, elevation = get_weather_and_elevation(fire_data.get('lat'), fire_data.get('lng'))
+    return build_environment(fire_data, weather, elevation)
+
+def get_environments(fires):
+    """Collect environments for many fires with bulk, cache-aware lookups"""
+    coords = [(fire.get('lat'), fire.get('lng')) for fire in fires]
+    weathers, elevations = get_weather_and_elevation_many(coords)
+    fuel = {key: values.tolist() for key, values in
+            get_fuel_many([c[0] for c in coords], [c[1] for c in coords]).items()}
+    return [build_environment(fire, weather, elevation, {key: fuel[key][i] for key in fuel})
+            for i, (fire, weather, elevation) in enumerate(zip(fires, weathers, elevations))]
+
+def build_environment(fire_data, weather, elevation, fuel=None):
+    """Combine fetched weather/elevation (None if unavailable) with fallbacks and fuel indices.
+
+    `fuel` is a precomputed get_fuel dict; it is looked up when omitted.
+    """
     # Required inputs: latitude and longitude
     lat = fire_data.get('lat')
     lng = fire_data.get('lng')
     brightness = fire_data.get('brightness', 350)
     
-    # Get real weather data if possible
-    weather = get_weather_data(lat, lng)
-    
     # Use real data or reasonable defaults based on location
     if weather:
         temp_max = weather['temp_max']
@@ -136,75 +322,152 @@ def predict_fire_spread(fire_data):
         wind_dir = np.random.randint(0, 360)  # Random direction
         data_source = "estimated"
     
-    # Get elevation
-    elevation = get_elevation_data(lat, lng)
+    # Default elevation if the lookup failed
+    if elevation is None:
+        elevation = DEFAULT_ELEVATION
+        note("elevation_fallback", DEFAULT_ELEVATION)
+    note("data_source", data_source)
     
     # Get drought and vegetation indices
-    drought, vegetation = get_drought_vegetation(lat, lng)
-    
-    # Use brightness to estimate fire intensity
-    fire_intensity = brightness
-    
-    # Build feature vector (must match training order)
-    features = [
-        elevation, elevation,
-        wind_dir, wind_dir,
-        wind_speed, wind_speed,
-        temp_min, temp_min,
-        temp_max, temp_max,
-        humidity, humidity,
-        drought, drought,
-        vegetation, vegetation,
-        fire_intensity, fire_intensity / 100.0,
-        wind_speed * math.cos(math.radians(wind_dir)),
-        wind_speed * math.sin(math.radians(wind_dir)),
-        elevation * wind_speed,
-        drought * vegetation,
-        1.0  # default shape ratio placeholder
-    ]
-    X = np.array(features).reshape(1, -1)
-
-    # Classifier prediction
-    will_spread = bool(classifier.predict(X)[0])
-    spread_prob = float(classifier.predict_proba(X)[0][1])
-
-    # Regressor prediction (clipped)
-    raw_ratio = float(regressor.predict(X)[0])
-    spread_ratio = max(0.1, min(10.0, raw_ratio))
+    fuel = fuel if fuel is not None else get_fuel(lat, lng)
+
+    return {
+        "lat": lat,
+        "lng": lng,
+        "brightness": brightness,
+        "elevation": elevation,
+        "wind_direction": wind_dir,
+        "wind_speed": wind_speed,
+        "temp_min": temp_min,
+        "temperature": temp_max,
+        "humidity": humidity,
+        "drought": fuel["drought"],
+        "vegetation": fuel["vegetation"],
+        "pdsi": fuel["pdsi"],
+        "ndvi": fuel["ndvi"],
+        "shape_ratio": fire_data.get("shape_ratio", 1.0),
+        "incident": fire_data.get("incident"),
+        "data_source": data_source
+    }
+
+def build_feature_matrix(env):
+    """Build the (N, 23) model input from per-fire environment arrays.
+
+    `env` maps the keys produced by get_environment to length-N arrays; the
+    layout is shared with training through features.point_features. Fuel
+    goes in as pdsi/ndvi, the units of the training records, not as the
+    0-5 / 0-1 drought and vegetation scales.
+    """
+    # Brightness stands in for the fire mask to estimate fire intensity
+    return point_features(
+        env["elevation"], env["wind_direction"], env["wind_speed"],
+        env["temp_min"], env["temperature"], env["humidity"],
+        env["pdsi"], env["ndvi"], env["brightness"], env.get("shape_ratio"))
+
+def score_features(X):
+    """Run both models once over a feature matrix.
+
+    Returns (will_spread, spread_probability, spread_ratio) arrays, with the
+    ratio clipped to the range seen in training.
+    """
+    if engine is not None and classifier is not None and 0 < SKLEARN_MIN_ROWS <= len(X):
+        # One decision_function pass gives both the class and the probability
+        with span("classifier"):
+            raw_class = classifier.decision_function(X)
+            will_spread = engine.classifier.predict_class(raw_class).astype(bool)
+            spread_prob = expit(raw_class)
+        with span("regressor"):
+            raw_ratio = regressor.predict(X).astype(np.float64)
+    elif engine is not None:
+        # One joint pass over both models' trees
+        with span("models"):
+            predicted, spread_prob, raw_ratio = engine.predict(X)
+        will_spread = predicted.astype(bool)
+    else:
+        with span("classifier"):
+            will_spread = classifier.predict(X).astype(bool)
+            spread_prob = classifier.predict_proba(X)[:, 1].astype(np.float64)
+        with span("regressor"):
+            raw_ratio = regressor.predict(X).astype(np.float64)
+    spread_ratio = np.clip(raw_ratio, 0.1, 10.0)
+    return will_spread, spread_prob, spread_ratio
+
+# Polygon vertex angles relative to the wind, and how far each one reaches
+POLYGON_VERTICES = 8
+_VERTEX_OFFSETS = np.arange(POLYGON_VERTICES) * 2 * np.pi / POLYGON_VERTICES
+# Distance varies by direction (further in wind direction)
+DIRECTION_FACTORS = 0.5 + 0.5 * np.cos(_VERTEX_OFFSETS)
+
+def vegetation_factor(vegetation):
+    """Spread distance multiplier for vegetation (0-1): 0.7 bare to 1.3 dense"""
+    return 0.7 + (vegetation * 0.6)
+
+def spread_geometry(lat, lng, brightness, wind_speed, wind_dir, vegetation, spread_ratio):
+    """Vectorized polygon and arrow geometry for N fires.
+
+    Returns a dict of arrays: spread_km (N,), point_lat/point_lng (N, 8),
+    and arrow_lat/arrow_lng (N,).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    brightness = np.asarray(brightness, dtype=np.float64)
+    wind_speed = np.asarray(wind_speed, dtype=np.float64)
+    wind_dir = np.asarray(wind_dir, dtype=np.float64)
+    vegetation = np.asarray(vegetation, dtype=np.float64)
 
     # Visualization parameters
-    wind_angle = math.radians((270 - wind_dir) % 360)
-    
+    wind_angle = np.radians((270 - wind_dir) % 360)
+
     # Higher brightness and wind speed increase base distance
-    brightness_factor = min(1.5, brightness / 350)
-    wind_factor = min(1.5, wind_speed / 10)
+    brightness_factor = np.minimum(1.5, brightness / 350)
+    wind_factor = np.minimum(1.5, wind_speed / 10)
     base_km = 1.0 * brightness_factor * wind_factor
     spread_km = base_km * spread_ratio
 
-    # Generate polygon points
-    pts = []
-    for i in range(8):
-        angle = wind_angle + (i * 2 * math.pi / 8)
-        
-        # Distance varies by direction (further in wind direction)
-        direction_factor = 0.5 + 0.5 * math.cos(angle - wind_angle)
-        
-        # Terrain effect: uphill spread is faster
-        terrain_factor = 1.0
-        
-        # Vegetation effect: denser vegetation = faster spread
-        veg_factor = 0.7 + (vegetation * 0.6)
-        
-        # Combined factors
-        d = spread_km * direction_factor * terrain_factor * veg_factor
-        
-        lat_off = d / 111.32
-        lng_off = d / (111.32 * math.cos(math.radians(lat)))
-        pts.append({
-            "lat": lat + lat_off * math.sin(angle),
-            "lng": lng + lng_off * math.cos(angle),
-            "probability": spread_prob * direction_factor
-        })
+    # Terrain effect: uphill spread is faster (not modelled yet)
+    terrain_factor = 1.0
+    # Vegetation effect: denser vegetation = faster spread
+    veg_factor = vegetation_factor(vegetation)
+
+    angles = wind_angle[:, None] + _VERTEX_OFFSETS[None, :]
+    d = (spread_km * terrain_factor * veg_factor)[:, None] * DIRECTION_FACTORS[None, :]
+
+    km_per_deg_lng = 111.32 * np.cos(np.radians(lat))
+    lat_off = d / 111.32
+    lng_off = d / km_per_deg_lng[:, None]
+
+    return {
+        "spread_km": spread_km,
+        "point_lat": lat[:, None] + lat_off * np.sin(angles),
+        "point_lng": lng[:, None] + lng_off * np.cos(angles),
+        "arrow_lat": lat + np.sin(wind_angle) * spread_km / 111.32,
+        "arrow_lng": lng + np.cos(wind_angle) * spread_km / km_per_deg_lng,
+    }
+
+def environmental_data(env):
+    """The environmental inputs used in a prediction, reported for transparency"""
+    return {
+        "elevation": env["elevation"],
+        "wind_direction": env["wind_direction"],
+        "wind_speed": env["wind_speed"],
+        "temperature": env["temperature"],
+        "humidity": env["humidity"],
+        "drought": env["drought"],
+        "vegetation": env["vegetation"],
+        "brightness": env["brightness"],
+        "data_source": env["data_source"]
+    }
+
+def build_result(env, will_spread, spread_prob, spread_ratio, spread_km,
+                 point_lat, point_lng, arrow_lat, arrow_lng, lat=None, lng=None, point_probs=None):
+    """Assemble the response dict and GeoJSON for a single fire"""
+    lat = env["lat"] if lat is None else lat
+    lng = env["lng"] if lng is None else lng
+    wind_dir = env["wind_direction"]
+    fire_intensity = env["brightness"]
+    probs = (spread_prob * DIRECTION_FACTORS).tolist() if point_probs is None else point_probs
+    point_lat = point_lat.tolist()
+    point_lng = point_lng.tolist()
 
     # Compose GeoJSON
     features_geo = []
@@ -215,7 +478,7 @@ def predict_fire_spread(fire_data):
         "geometry": {"type": "Point", "coordinates": [lng, lat]}
     })
     # Spread polygon
-    coords = [[lng, lat]] + [[p['lng'], p['lat']] for p in pts] + [[lng, lat]]
+    coords = [[lng, lat]] + [[p_lng, p_lat] for p_lng, p_lat in zip(point_lng, point_lat)] + [[lng, lat]]
     features_geo.append({
         "type": "Feature",
         "properties": {
@@ -229,37 +492,23 @@ def predict_fire_spread(fire_data):
         "geometry": {"type": "Polygon", "coordinates": [coords]}
     })
     # Direction arrow
-    arrow_end = [
-        lng + math.cos(wind_angle) * spread_km / (111.32 * math.cos(math.radians(lat))),
-        lat + math.sin(wind_angle) * spread_km / 111.32
-    ]
     features_geo.append({
         "type": "Feature",
         "properties": {"type": "direction", "direction": wind_dir, "probability": spread_prob},
-        "geometry": {"type": "LineString", "coordinates": [[lng, lat], arrow_end]}
+        "geometry": {"type": "LineString", "coordinates": [[lng, lat], [arrow_lng, arrow_lat]]}
     })
     # Individual spread points
-    for idx, p in enumerate(pts):
+    for idx in range(len(probs)):
         features_geo.append({
             "type": "Feature",
-            "properties": {"type": "spread_point", "probability": p['probability'], "index": idx},
-            "geometry": {"type": "Point", "coordinates": [p['lng'], p['lat']]}  
+            "properties": {"type": "spread_point", "probability": probs[idx], "index": idx},
+            "geometry": {"type": "Point", "coordinates": [point_lng[idx], point_lat[idx]]}
         })
 
     # Include the environmental data used in the prediction for transparency
-    env_data = {
-        "elevation": elevation,
-        "wind_direction": wind_dir,
-        "wind_speed": wind_speed,
-        "temperature": temp_max,
-        "humidity": humidity,
-        "drought": drought,
-        "vegetation": vegetation,
-        "brightness": brightness,
-        "data_source": data_source
-    }
+    env_data = environmental_data(env)
 
-    return {
+    result = {
         "will_spread": will_spread,
         "spread_probability": spread_prob,
         "spread_ratio": spread_ratio,
@@ -268,8 +517,374 @@ def predict_fire_spread(fire_data):
         "environmental_data": env_data,
         "geojson": {"type": "FeatureCollection", "features": features_geo}
     }
+    if env.get("incident") is not None:
+        result["incident"] = env["incident"]
+    return result
+
+def _as_fire_list(fires):
+    """Accept a list of fire dicts or an (N, 2|3) array of lat, lng[, brightness]"""
+    if isinstance(fires, np.ndarray):
+        arr = np.atleast_2d(fires)
+        if arr.shape[1] not in (2, 3):
+            raise ValueError("fire array must have 2 (lat, lng) or 3 (lat, lng, brightness) columns")
+        keys = ("lat", "lng", "brightness")[:arr.shape[1]]
+        return [dict(zip(keys, row)) for row in arr.tolist()]
+    return list(fires)
+
+def predict_environments(envs, output="geojson", decimals=None):
+    """Score and build results for already-collected environment dicts.
+
+    `output` and `decimals` select the encoding (see result_format.py).
+    """
+    if not envs:
+        return []
+
+    columns = {key: np.array([env[key] for env in envs], dtype=np.float64)
+               for key in ("lat", "lng", "brightness", "elevation", "wind_direction",
+                           "wind_speed", "temp_min", "temperature", "humidity",
+                           "pdsi", "ndvi", "shape_ratio")}
+
+    with span("features"):
+        X = build_feature_matrix(columns)
+    will_spread, spread_prob, spread_ratio = score_features(X)
+    return format_results(envs, will_spread, spread_prob, spread_ratio, output, decimals)
+
+def format_results(envs, will_spread, spread_prob, spread_ratio, output="geojson", decimals=None):
+    """Geometry and encoded results for environments that have already been scored"""
+    columns = {key: np.array([env[key] for env in envs], dtype=np.float64)
+               for key in ("lat", "lng", "brightness", "wind_speed", "wind_direction", "vegetation")}
+    with span("geometry"):
+        geom = spread_geometry(columns["lat"], columns["lng"], columns["brightness"],
+                               columns["wind_speed"], columns["wind_direction"],
+                               columns["vegetation"], spread_ratio)
+
+    will_spread = np.asarray(will_spread).tolist()
+    if output == "compact":
+        with span("encode"):
+            return result_format.compact_results(envs, will_spread, spread_prob, spread_ratio, geom,
+                                                 DIRECTION_FACTORS, environmental_data, decimals)
+    if decimals is None:
+        probs = spread_prob.tolist()
+        ratios = spread_ratio.tolist()
+        spread_km = geom["spread_km"].tolist()
+        arrow_lat = geom["arrow_lat"].tolist()
+        arrow_lng = geom["arrow_lng"].tolist()
+
+        with span("geojson"):
+            return [
+                build_result(env, will_spread[i], probs[i], ratios[i], spread_km[i],
+                             geom["point_lat"][i], geom["point_lng"][i], arrow_lat[i], arrow_lng[i])
+                for i, env in enumerate(envs)
+            ]
+
+    # Quantized: round whole arrays once, before they become Python floats
+    q = result_format.rounded
+    value_digits = result_format.VALUE_DECIMALS
+    probs = q(spread_prob, value_digits).tolist()
+    ratios = q(spread_ratio, value_digits).tolist()
+    spread_km = q(geom["spread_km"], value_digits).tolist()
+    point_probs = q(spread_prob[:, None] * DIRECTION_FACTORS, value_digits).tolist()
+    point_lat = q(geom["point_lat"], decimals)
+    point_lng = q(geom["point_lng"], decimals)
+    arrow_lat = q(geom["arrow_lat"], decimals).tolist()
+    arrow_lng = q(geom["arrow_lng"], decimals).tolist()
+    lat = q(columns["lat"], decimals).tolist()
+    lng = q(columns["lng"], decimals).tolist()
+    with span("geojson"):
+        return [
+            build_result(env, will_spread[i], probs[i], ratios[i], spread_km[i],
+                         point_lat[i], point_lng[i], arrow_lat[i], arrow_lng[i],
+                         lat[i], lng[i], point_probs[i])
+            for i, env in enumerate(envs)
+        ]
+
+def predict_fire_spread_batch(fires, timings=None, output="geojson", decimals=None):
+    """Predict fire spread for many fires at once.
+
+    Accepts a list of fire dicts (same keys as predict_fire_spread) or an
+    (N, 2|3) array of lat, lng[, brightness]. Both models run once over a
+    single (N, 23) feature matrix and the geometry is computed as arrays,
+    so per-fire cost is a small fraction of calling predict_fire_spread in
+    a loop. Results are returned in input order; with timings=True each one
+    carries the batch's "timings" block.
+    """
+    result_format.check_format(output, decimals)
+    fires = _as_fire_list(fires)
+    want = TIMINGS_IN_RESULT if timings is None else timings
+    with trace("predict_fire_spread_batch", size=len(fires), force=want) as t:
+        with span("environment"):
+            envs = get_environments(fires)
+        results = predict_environments(envs, output, decimals)
+    if want and t is not None:
+        block = t.as_dict()
+        for result in results:
+            result["timings"] = block
+    return results
+
+def grid_points(env, size, cell_km):
+    """(lat, lng) of the (size, size) cell centres around a fire"""
+    east, north = spread_grid.cell_offsets(size, cell_km)
+    lat = env["lat"] + north / spread_grid.KM_PER_DEG_LAT
+    lng = env["lng"] + east / (spread_grid.KM_PER_DEG_LAT * np.cos(np.radians(env["lat"])))
+    return lat, lng
+
+def grid_elevation(env, size, cell_km):
+    """(size, size) DEM elevation around a fire, the fire's own where not covered"""
+    lat, lng = grid_points(env, size, cell_km)
+    local = dem_elevation(lat.ravel(), lng.ravel()).reshape(size, size)
+    return np.where(np.isnan(local), env["elevation"], local)
+
+def grid_fuel(env, size, cell_km, month=None):
+    """(size, size) spread_sim fuel multiplier around a fire.
+
+    Each cell's climatology vegetation factor relative to the fire's own, so
+    the ignition cell keeps the head rate the polygon was calibrated with.
+    Cells the climatology does not cover take the fire's vegetation (1).
+    """
+    if fuel_grid is None:
+        return np.ones((size, size))
+    lat, lng = grid_points(env, size, cell_km)
+    pdsi, ndvi, known = fuel_grid.lookup(lat.ravel(), lng.ravel(), month or datetime.now().month)
+    _, vegetation = fuel_indices(pdsi, ndvi)
+    vegetation = np.where(known, vegetation, env["vegetation"]).reshape(size, size)
+    return vegetation_factor(vegetation) / vegetation_factor(env["vegetation"])
+
+def head_distance_km(env, spread_km):
+    """Downwind reach of the spread polygon (its head vertex)"""
+    return float(spread_km) * vegetation_factor(env["vegetation"])
+
+def score_grid(env, size=spread_grid.GRID_SIZE, cell_km=spread_grid.CELL_KM):
+    """(size, size) spread probabilities around one fire, scored in a single pass"""
+    east, north = spread_grid.cell_offsets(size, cell_km)
+    elevation = grid_elevation(env, size, cell_km)
+    n = size * size
+
+    with span("features"):
+        # Cell-local terrain; weather, fuel and intensity are the fire's
+        columns = {k: np.full(n, float(env[k])) for k in
+                   ("wind_direction", "wind_speed", "temp_min", "temperature",
+                    "humidity", "pdsi", "ndvi", "brightness", "shape_ratio")}
+        columns["elevation"] = elevation.ravel()
+        X = build_feature_matrix(columns)
+    with span("models"):
+        if engine is not None:
+            _, p_local, raw_ratio = engine.predict_distinct(X)
+        else:
+            p_local = classifier.predict_proba(X)[:, 1]
+            raw_ratio = regressor.predict(X)
+    with span("grid"):
+        # Head distance as in spread_geometry, from the ignition cell's ratio
+        centre = (size // 2) * size + size // 2
+        geom = spread_geometry([env["lat"]], [env["lng"]], [env["brightness"]],
+                               [env["wind_speed"]], [env["wind_direction"]],
+                               [env["vegetation"]], np.clip(raw_ratio[centre:centre + 1], 0.1, 10.0))
+        head_km = head_distance_km(env, geom["spread_km"][0])
+        wind_angle = np.radians((270 - env["wind_direction"]) % 360)
+        weight = spread_grid.reach(east, north, head_km, wind_angle, env["wind_speed"],
+                                   elevation - elevation.flat[centre], cell_km)
+        return p_local.reshape(size, size) * weight
+
+def predict_fire_spread_grid(fire_data, grid=True, timings=None):
+    """Polygon prediction plus a per-cell spread probability grid.
+
+    `grid` is True or {"size": 64, "cell_km": 1.0, "output": "raster" |
+    "contours" | "both", "levels": [0.25, 0.5, 0.75]}. The raster goes in
+    result["grid"] (see spread_grid.encode_raster); contours are added to
+    the GeoJSON as "spread_contour" features.
+    """
+    size, cell_km, output, levels = spread_grid.grid_options(grid)
+    want = TIMINGS_IN_RESULT if timings is None else timings
+    with trace("predict_fire_spread_grid", size=size * size, force=want) as t:
+        with span("environment"):
+            env = get_environment(fire_data)
+        result = predict_environments([env])[0]
+        prob = score_grid(env, size, cell_km)
+        with span("encode"):
+            if output in ("raster", "both"):
+                result["grid"] = spread_grid.encode_raster(prob, env["lat"], env["lng"], size, cell_km)
+            if output in ("contours", "both"):
+                result["geojson"]["features"].extend(spread_grid.contour_features(
+                    prob, env["lat"], env["lng"], size, cell_km, levels))
+    if want and t is not None:
+        result["timings"] = t.as_dict()
+    return result
+
+def simulate_fire_spread(fire_data, simulate=True, timings=None):
+    """Polygon prediction plus a Monte Carlo spread simulation.
+
+    `simulate` is True or an options object (see spread_sim.sim_options:
+    size, cell_km, steps, horizon_hours, members, burn_hours, seed). The
+    per-step burn probability layers go in result["simulation"], encoded
+    like the grid raster with shape [steps, size, size].
+    """
+    opts = spread_sim.sim_options(simulate)
+    size, cell_km = opts.pop("size"), opts.pop("cell_km")
+    want = TIMINGS_IN_RESULT if timings is None else timings
+    with trace("simulate_fire_spread", size=opts["members"], force=want) as t:
+        with span("environment"):
+            env = get_environment(fire_data)
+        result = predict_environments([env])[0]
+        with span("simulation"):
+            layers, meta = spread_sim.simulate(
+                grid_elevation(env, size, cell_km), result["spread_probability"],
+                head_distance_km(env, result["spread_distance_km"]),
+                np.radians((270 - env["wind_direction"]) % 360), env["wind_speed"],
+                fuel=grid_fuel(env, size, cell_km), size=size, cell_km=cell_km, **opts)
+        with span("encode"):
+            result["simulation"] = {
+                **meta,
+                **spread_grid.encode_raster(layers, env["lat"], env["lng"], size, cell_km),
+                "burned_area_km2": (layers.sum(axis=(1, 2)) * cell_km ** 2).round(3).tolist(),
+            }
+    if want and t is not None:
+        result["timings"] = t.as_dict()
+    return result
+
+def predict_incidents(detections, eps_km=None, window_hours=None, timings=None):
+    """Cluster FIRMS detections into incidents and predict once per incident.
+
+    `detections` are parseCSV-style dicts (see incidents.py). Results come
+    back in incident order, each with an "incident" summary (detection
+    count, brightness, extent, shape ratio, first/last seen).
+    """
+    import incidents
+    with trace("predict_incidents", size=len(detections)):
+        with span("clustering"):
+            found, _ = incidents.find_incidents(
+                detections,
+                incidents.EPS_KM if eps_km is None else eps_km,
+                incidents.WINDOW_HOURS if window_hours is None else window_hours)
+        note("incidents", "found", len(found))
+        return predict_fire_spread_batch(incidents.incident_fires(found), timings=timings)
+
+STREAM_CHUNK = 256
+
+def iter_fire_spread(fires, chunk_size=STREAM_CHUNK, output="geojson", decimals=None):
+    """Yield results in input order, a chunk at a time, as they are ready.
+
+    Each chunk is scored as a batch; the next chunk's weather/elevation
+    lookups run in the background meanwhile, so a slow API overlaps with
+    scoring and writing. `fires` may be any iterable (e.g. lines being read).
+    """
+    result_format.check_format(output, decimals)
+    fires = iter(fires)
+
+    def next_chunk():
+        chunk = list(itertools.islice(fires, chunk_size))
+        return chunk, (get_environments(chunk) if chunk else [])
+
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        pending = prefetch.submit(contextvars.copy_context().run, next_chunk)
+        while True:
+            chunk, envs = pending.result()
+            if not chunk:
+                return
+            pending = prefetch.submit(contextvars.copy_context().run, next_chunk)
+            with trace("predict_fire_spread_batch", size=len(chunk)):
+                results = predict_environments(envs, output, decimals)
+            yield from results
+
+def predict_fire_spread(fire_data, timings=None, output="geojson", decimals=None):
+    """Predict fire spread using both classifier and regressor models.
+
+    A fresh risk tile covering the fire answers without any lookups or
+    scoring (see risk_tiles.py; the result then has a "risk_tile" block).
+    With timings=True (or IGNIS_TIMING_RESULT=1) the result includes a
+    "timings" block: per-stage milliseconds and cache/fallback outcomes.
+    `output="compact"` and `decimals` pick a smaller encoding (see
+    result_format.py).
+    """
+    result_format.check_format(output, decimals)
+    want = TIMINGS_IN_RESULT if timings is None else timings
+    with trace("predict_fire_spread", force=want) as t:
+        tiled = tile_prediction(fire_data)
+        if tiled is not None:
+            env, values = tiled
+            result = format_results([env], [values["will_spread"]], np.array([values["spread_probability"]]),
+                                    np.array([values["spread_ratio"]]), output, decimals)[0]
+            result["risk_tile"] = {key: values[key] for key in
+                                   ("level", "cell_deg", "cell", "brightness_level", "built_at")}
+        else:
+            with span("environment"):
+                env = get_environment(fire_data)
+            result = predict_environments([env], output, decimals)[0]
+    if want and t is not None:
+        result["timings"] = t.as_dict()
+    return result
+
+def tile_prediction(fire_data):
+    """(env, tile values) for a fire answered by the risk tiles, else None.
+
+    Fires with a known shape (incidents) or "live": true always run live.
+    """
+    if (tile_store is None or fire_data.get("live") or fire_data.get("incident") is not None
+            or fire_data.get("shape_ratio", 1.0) != 1.0):
+        return None
+    brightness = fire_data.get("brightness", 350)
+    with span("risk_tile"):
+        values, status = tile_store.lookup(fire_data["lat"], fire_data["lng"], brightness)
+    note("risk_tile", status)
+    if values is None:
+        return None
+    env = {key: values[key] for key in ("elevation", "wind_direction", "wind_speed", "temperature",
+                                        "humidity", "drought", "vegetation")}
+    env.update(lat=fire_data["lat"], lng=fire_data["lng"], brightness=brightness,
+               temp_min=values["temperature"] - 10, shape_ratio=1.0, incident=None,
+               data_source="risk_tile")
+    return env, values
+
+def _read_fires(text):
+    """Fires from a JSON array or object, or NDJSON (one fire per line, read lazily)"""
+    if isinstance(text, str):
+        data = json.loads(text)
+        return data if isinstance(data, list) else [data]
+    first = ""
+    for line in text:
+        if line.strip():
+            first = line
+            break
+    if first.lstrip().startswith("["):
+        return json.loads(first + text.read())
+    lines = itertools.chain([first], text) if first else iter(())
+    return (json.loads(line) for line in lines if line.strip())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict wildfire spread for one fire or a batch")
+    parser.add_argument("fire", nargs="?", help="fire JSON object or array (default: stdin)")
+    parser.add_argument("--format", choices=result_format.FORMATS, default="geojson")
+    parser.add_argument("--decimals", type=int, help="round coordinates to this many places")
+    parser.add_argument("--ndjson", action="store_true",
+                        help="stream one result per line as each chunk finishes; "
+                             "input may be a JSON array or NDJSON")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK)
+    args = parser.parse_args(argv)
+
+    if args.ndjson:
+        fires = _read_fires(args.fire if args.fire is not None else sys.stdin)
+        result_format.write_ndjson(
+            iter_fire_spread(fires, args.chunk_size, args.format, args.decimals), sys.stdout)
+        return 0
+
+    fire_data = json.loads(args.fire if args.fire is not None else sys.stdin.read())
+    # A JSON array of fires is scored as one batch
+    if isinstance(fire_data, list):
+        result = predict_fire_spread_batch(fire_data, output=args.format, decimals=args.decimals)
+    elif "detections" in fire_data:
+        # Raw FIRMS detections: one prediction per clustered incident
+        result = predict_incidents(fire_data["detections"], fire_data.get("eps_km"),
+                                   fire_data.get("window_hours"))
+    elif fire_data.get("simulate"):
+        result = simulate_fire_spread(fire_data, fire_data["simulate"])
+    elif fire_data.get("grid"):
+        result = predict_fire_spread_grid(fire_data, fire_data["grid"])
+    else:
+        result = predict_fire_spread(fire_data, output=args.format, decimals=args.decimals)
+    print(result_format.dumps(result))
+    return 0
 
 if __name__ == "__main__":
-    fire_data = json.loads(sys.argv[1])
-    result = predict_fire_spread(fire_data)
-    print(json.dumps(result))
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        # Long-lived mode: serve JSON-lines requests (see predict_worker.py)
+        from predict_worker import main as worker_main
+        sys.exit(worker_main(sys.argv[2:], predictor=sys.modules[__name__]))
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""Long-lived prediction worker for predict_spread.py.
+
+Loads the classifier/regressor once and serves many predictions over a
+JSON-lines protocol, either on stdin/stdout or on a local TCP socket.
+
+Each request is one JSON object per line:
+
+    {"id": "42", "fire": {"lat": 34.1, "lng": -118.2, "brightness": 360}}
+
+Each response echoes the id:
+
+    {"id": "42", "ok": true, "result": {...}}
+    {"id": "42", "ok": false, "error": "timed out after 30.0s"}
+
+A fire with a "grid" key (true or options, see predict_spread.py's
+predict_fire_spread_grid) also gets a per-cell probability raster, and one
+with a "simulate" key the Monte Carlo burn layers (simulate_fire_spread).
+Adding "timings": true to a predict request returns the per-stage timing
+block in its result; "format": "compact" and "decimals": 5 select a smaller
+encoding (see result_format.py). The "incidents" op takes raw FIRMS
+"detections" (see incidents.py) and returns one prediction per clustered
+incident.
+
+Control requests use "op" instead of "fire": "ping", "stats" and "reload".
+With IGNIS_TIMING set, "stats" also reports the aggregated stage timings
+(see timing.py).
+
+Usage:
+    python predict_spread.py --worker [--concurrency 4] [--timeout 30]
+    python predict_worker.py --port 8765
+"""
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import result_format
+import timing
+
+
+def log(message):
+    """Worker diagnostics go to stderr so stdout stays pure JSON lines"""
+    print(f"[predict_worker] {message}", file=sys.stderr, flush=True)
+
+
+class PredictionWorker:
+    """Runs predictions with a bounded number in flight and per-request timeouts."""
+
+    def __init__(self, predictor, concurrency=4, timeout=30.0, reload_interval=5.0):
+        self.predictor = predictor
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.reload_interval = reload_interval
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                            thread_name_prefix="predict")
+        # One permit per running prediction; a reload takes all of them
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._model_mtimes = self._current_mtimes()
+        self._pending_mtimes = None
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "timeouts": 0,
+                      "reloads": 0, "started_at": time.time()}
+        self._stats_lock = threading.Lock()
+
+    # --- model reload -------------------------------------------------
+
+    def _current_mtimes(self):
+        mtimes = []
+        for path in self.predictor.model_paths():
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def reload_models(self):
+        """Load fresh models, then swap them in once in-flight requests drain.
+
+        Loading happens before taking any slots, so a slow or failing load
+        never blocks traffic; on failure the current models stay in service.
+        """
+        with self._reload_lock:
+            mtimes = self._current_mtimes()
+            try:
+                models = self.predictor.load_models()
+            except Exception as e:
+                log(f"reload failed, keeping current models: {e}")
+                return False
+
+            for _ in range(self.concurrency):
+                self._slots.acquire()
+            try:
+                self.predictor.set_models(*models)
+                self._model_mtimes = mtimes
+            finally:
+                for _ in range(self.concurrency):
+                    self._slots.release()
+
+        self._bump("reloads")
+        log("models reloaded")
+        return True
+
+    def _watch_models(self):
+        # A change is only applied once the mtimes have been stable for one
+        # full interval, so a model file that is still being written is skipped
+        # (missing optional files simply report None).
+        while not self._stop.wait(self.reload_interval):
+            mtimes = self._current_mtimes()
+            if mtimes == self._model_mtimes:
+                self._pending_mtimes = None
+            elif mtimes != self._pending_mtimes:
+                self._pending_mtimes = mtimes
+            else:
+                self._pending_mtimes = None
+                self.reload_models()
+
+    def start(self):
+        if self.reload_interval and self.reload_interval > 0:
+            threading.Thread(target=self._watch_models, name="model-watch",
+                             daemon=True).start()
+
+    def shutdown(self):
+        self._stop.set()
+        self._executor.shutdown(wait=True)
+
+    # --- request handling -------------------------------------------------
+
+    def _bump(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _run(self, answered, fn, *args):
+        # Waits here, on an executor thread, while `concurrency` predictions
+        # (or a reload) hold the slots; the reader thread never blocks
+        self._slots.acquire()
+        try:
+            if answered.is_set():
+                return None  # timed out while queued; nobody wants the result
+            return fn(*args)
+        finally:
+            self._slots.release()
+
+    def _predict(self, fire, timings=False, output="geojson", decimals=None):
+        if fire.get("simulate"):
+            return self.predictor.simulate_fire_spread(fire, fire["simulate"], timings=timings or None)
+        if fire.get("grid"):
+            return self.predictor.predict_fire_spread_grid(fire, fire["grid"], timings=timings or None)
+        return self.predictor.predict_fire_spread(fire, timings=timings or None,
+                                                  output=output, decimals=decimals)
+
+    def _predict_incidents(self, request):
+        return self.predictor.predict_incidents(
+            request["detections"], request.get("eps_km"), request.get("window_hours"),
+            timings=True if request.get("timings") else None)
+
+    def submit(self, line, respond):
+        """Handle one request line; `respond` is called exactly once with the reply."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            self._bump("errors")
+            respond({"id": None, "ok": False, "error": f"invalid request: {e}"})
+            return
+
+        req_id = request.get("id")
+        op = request.get("op", "predict")
+
+        if op == "ping":
+            respond({"id": req_id, "ok": True, "result": "pong"})
+            return
+        if op == "stats":
+            with self._stats_lock:
+                stats = dict(self.stats)
+            stats["uptime_s"] = time.time() - stats.pop("started_at")
+            if hasattr(self.predictor, "cache_stats"):
+                stats["caches"] = self.predictor.cache_stats()
+            if timing.ENABLED:
+                stats["timing"] = timing.summary()
+            respond({"id": req_id, "ok": True, "result": stats})
+            return
+        if op == "reload":
+            # Waits for in-flight predictions to drain, so not on the reader thread
+            threading.Thread(target=lambda: respond({"id": req_id, "ok": self.reload_models()}),
+                             name="model-reload", daemon=True).start()
+            return
+        if op == "incidents":
+            if not isinstance(request.get("detections"), list):
+                self._bump("errors")
+                respond({"id": req_id, "ok": False, "error": "incidents needs a detections list"})
+                return
+            job = (self._predict_incidents, request)
+        elif op == "predict":
+            fire = request.get("fire")
+            if not isinstance(fire, dict) or fire.get("lat") is None or fire.get("lng") is None:
+                self._bump("errors")
+                respond({"id": req_id, "ok": False,
+                         "error": "missing required fire location data (lat, lng)"})
+                return
+            job = (self._predict, fire, bool(request.get("timings")),
+                   request.get("format", "geojson"), request.get("decimals"))
+        else:
+            respond({"id": req_id, "ok": False, "error": f"unknown op: {op}"})
+            return
+
+        self._bump("requests")
+        timeout = request.get("timeout", self.timeout)
+
+        # Whichever of completion or timeout fires first sends the reply
+        answered = threading.Event()
+        answer_lock = threading.Lock()
+
+        def reply_once(payload, outcome):
+            with answer_lock:
+                if answered.is_set():
+                    return
+                answered.set()
+            self._bump(outcome)
+            respond(payload)
+
+        # The timeout counts from arrival, including time spent queued for a slot
+        timer = None
+        if timeout:
+            timer = threading.Timer(
+                float(timeout), reply_once,
+                args=({"id": req_id, "ok": False,
+                       "error": f"timed out after {float(timeout):.1f}s"}, "timeouts"))
+            timer.daemon = True
+            timer.start()
+
+        future = self._executor.submit(self._run, answered, *job)
+
+        def on_done(f):
+            if timer is not None:
+                timer.cancel()
+            try:
+                reply_once({"id": req_id, "ok": True, "result": f.result()}, "ok")
+            except Exception as e:
+                reply_once({"id": req_id, "ok": False, "error": str(e)}, "errors")
+
+        future.add_done_callback(on_done)
+
+
+def serve_stdio(worker):
+    """Serve requests from stdin, writing responses to the real stdout"""
+    out = sys.stdout
+    # Anything else printed to stdout (library chatter) must not corrupt the stream
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+
+    def respond(payload):
+        data = result_format.dumps(payload)
+        with write_lock:
+            out.write(data + "\n")
+            out.flush()
+
+    for line in sys.stdin:
+        line = line.strip()
+        if line:
+            worker.submit(line, respond)
+
+
+def serve_socket(worker, host, port):
+    """Serve the same JSON-lines protocol to any number of local TCP clients"""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            write_lock = threading.Lock()
+
+            def respond(payload):
+                data = (result_format.dumps(payload) + "\n").encode("utf-8")
+                with write_lock:
+                    try:
+                        self.wfile.write(data)
+                        self.wfile.flush()
+                    except OSError:
+                        pass  # client went away
+
+            for raw in self.rfile:
+                line = raw.decode("utf-8").strip()
+                if line:
+                    worker.submit(line, respond)
+
+    class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    with Server((host, port), Handler) as server:
+        log(f"listening on {host}:{port}")
+        server.serve_forever()
+
+
+def main(argv=None, predictor=None):
+    parser = argparse.ArgumentParser(description="Long-lived fire spread prediction worker")
+    parser.add_argument("--concurrency", type=int,
+                        default=int(os.environ.get("PREDICT_WORKER_CONCURRENCY", 4)),
+                        help="maximum predictions running at once")
+    parser.add_argument("--timeout", type=float,
+                        default=float(os.environ.get("PREDICT_WORKER_TIMEOUT", 30)),
+                        help="per-request timeout in seconds (0 disables)")
+    parser.add_argument("--reload-interval", type=float, default=5.0,
+                        help="seconds between model file checks (0 disables reload)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None,
+                        help="serve on a local TCP socket instead of stdin/stdout")
+    args = parser.parse_args(argv)
+
+    if predictor is None:
+        import predict_spread as predictor
+
+    worker = PredictionWorker(predictor, concurrency=args.concurrency,
+                              timeout=args.timeout, reload_interval=args.reload_interval)
+    worker.start()
+    log(f"ready (concurrency={worker.concurrency}, timeout={worker.timeout}s)")
+    try:
+        if args.port is not None:
+            serve_socket(worker, args.host, args.port)
+        else:
+            serve_stdio(worker)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,35 @@
 import tensorflow as tf
 import numpy as np
+import glob
 import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
 
+from features import CHANNELS, N_FEATURES, grid_features, spread_targets
+from feature_store import EMPTY, STORE_DIR, FeatureStore, write_chunk
+from sampling import SEED, StratifiedReservoir
+
 DATA_DIR = "data"
-TRAIN_FILES = [
-    os.path.join(DATA_DIR, f"next_day_wildfire_spread_train_{i:02d}.tfrecord")
-    for i in range(10)
-]
-TEST_FILES = [
-    os.path.join(DATA_DIR, f"next_day_wildfire_spread_test_{i:02d}.tfrecord")
-    for i in range(2)
-]
-
-FEATURES = [
-    'elevation', 'th', 'vs', 'tmmn', 'tmmx', 'sph', 'pdsi', 'NDVI',
-    'PrevFireMask', 'FireMask'
-]
+
+def _split_files(split, count):
+    """Every shard of a split in DATA_DIR (newly added ones included), else the published count"""
+    found = sorted(glob.glob(os.path.join(DATA_DIR, f"next_day_wildfire_spread_{split}_*.tfrecord")))
+    return found or [os.path.join(DATA_DIR, f"next_day_wildfire_spread_{split}_{i:02d}.tfrecord")
+                     for i in range(count)]
+
+TRAIN_FILES = _split_files("train", 10)
+TEST_FILES = _split_files("test", 2)
+
+FEATURES = CHANNELS
+# Why select_samples drops a record: current_area < 10, spread ratio > 10 or < 0.1
+SKIP_REASONS = ("small_fire", "ratio_high", "ratio_low")
+# How the training rows are chosen when there are more than max_samples:
+# "first" takes the leading shards' rows (the old behaviour), "proportional"
+# and "balanced" are stratified samples over every shard (see sampling.py)
+SAMPLING = os.environ.get("IGNIS_SAMPLING", "proportional")
+SAMPLE_SEED = int(os.environ.get("IGNIS_SAMPLE_SEED", SEED))
 
 def get_feature_array(example, key, default_len=4096):
     feature = example.features.feature.get(key)
@@ -27,118 +40,242 @@ def get_feature_array(example, key, default_len=4096):
         arr = np.pad(arr, (0, default_len - arr.size), 'constant')
     return arr
 
-def extract_features(file_paths, max_samples=20000):
-    print(f"Processing {len(file_paths)} files...")
+# Declared schema for batched parsing; every channel is a 64x64 float grid
+FEATURE_SPEC = {
+    key: tf.io.FixedLenFeature([4096], tf.float32, default_value=[0.0] * 4096)
+    for key in FEATURES
+}
 
-    X_data = []
-    y_class = []
-    y_regress = []
-    count = 0
-    skipped = 0
+def select_samples(batch):
+    """Features and targets for the usable records in a (B, 10, 4096) batch.
 
-    raw_dataset = tf.data.TFRecordDataset(file_paths)
+    Records with too little fire or an unreasonable spread ratio are dropped.
+    Returns (X, y_class, y_regress, keep, skips) where `keep` marks the kept
+    rows and `skips` counts the dropped ones per filter (SKIP_REASONS).
+    """
+    current_area, future_area = spread_targets(batch)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread_ratio = future_area / current_area
+    # Skip records with no fire or very small fires, and unreasonable spread ratios
+    small = current_area < 10.0
+    skips = {
+        "small_fire": int(small.sum()),
+        "ratio_high": int((~small & (spread_ratio > 10.0)).sum()),
+        "ratio_low": int((~small & (spread_ratio < 0.1)).sum()),
+    }
+    keep = ~small & (spread_ratio <= 10.0) & (spread_ratio >= 0.1)
+    X = grid_features(batch[keep])
+    spread_ratio = spread_ratio[keep]
+    spread_label = (spread_ratio > 1.2).astype(np.int64)
+    return X, spread_label, spread_ratio, keep, skips
 
-    for raw_record in tqdm(raw_dataset, desc="Processing records"):
-        if count >= max_samples:
-            break
+def _parse_record_legacy(raw_record, keys=FEATURES):
+    """Per-record parse that tolerates missing keys and short arrays"""
+    example = tf.train.Example()
+    example.ParseFromString(raw_record)
+    return np.stack([get_feature_array(example, key) for key in keys])
+
+def _parse_batch(raw_batch, keys=FEATURES):
+    """Parse a batch of serialized records into a (B, len(keys), 4096) array.
 
-        try:
-            example = tf.train.Example()
-            example.ParseFromString(raw_record.numpy())
-            elevation = get_feature_array(example, 'elevation')
-            wind_dir = get_feature_array(example, 'th')
-            wind_speed = get_feature_array(example, 'vs')
-            temp_min = get_feature_array(example, 'tmmn')
-            temp_max = get_feature_array(example, 'tmmx')
-            humidity = get_feature_array(example, 'sph')
-            drought = get_feature_array(example, 'pdsi')
-            vegetation = get_feature_array(example, 'NDVI')
-            prev_fire = get_feature_array(example, 'PrevFireMask')
-            fire_mask = get_feature_array(example, 'FireMask')
-
-            # Calculate fire areas
-            current_area = np.sum(prev_fire)
-            future_area = np.sum(fire_mask)
-            
-            # Skip records with no fire or very small fires
-            if current_area < 10.0:
-                skipped += 1
-                continue
-                
-            # Calculate spread ratio
-            spread_ratio = future_area / current_area
-            
-            # Skip unreasonable spread ratios
-            if spread_ratio > 10.0 or spread_ratio < 0.1:
-                skipped += 1
-                continue
-                
-            spread_label = 1 if spread_ratio > 1.2 else 0
-
-            # --- Feature Engineering ---
-            features = []
-            # 1. Environmental stats
-            for arr in [elevation, wind_dir, wind_speed, temp_min, temp_max, humidity, drought, vegetation]:
-                features.extend([np.mean(arr), np.max(arr)])
-
-            # 2. Fire mask stats
-            features.extend([np.sum(prev_fire), np.mean(prev_fire)])
-
-            # 3. Wind vector components (mean)
-            wind_dir_mean = np.mean(wind_dir)
-            wind_speed_mean = np.mean(wind_speed)
-            wind_east = wind_speed_mean * np.cos(np.radians(wind_dir_mean))  # E/W
-            wind_north = wind_speed_mean * np.sin(np.radians(wind_dir_mean)) # N/S
-            features.append(wind_east)
-            features.append(wind_north)
-
-            # 4. Wind-elevation and drought-vegetation interaction
-            features.append(np.mean(elevation) * wind_speed_mean)
-            features.append(np.mean(drought) * np.mean(vegetation))
-
-            # 5. Fire shape ratio (width/height)
+    The declared FEATURE_SPEC parses the whole batch in one call; a batch
+    containing a record with a short or malformed channel falls back to the
+    per-record parser, which pads exactly as the original loop did. Records
+    that cannot be parsed at all are left out; the second return value
+    counts them. `keys` selects the channels (all ten by default).
+    """
+    try:
+        parsed = tf.io.parse_example(raw_batch, {key: FEATURE_SPEC[key] for key in keys})
+        return np.stack([parsed[key].numpy() for key in keys], axis=1), 0
+    except tf.errors.InvalidArgumentError:
+        records, errors = [], 0
+        for raw in raw_batch.numpy():
             try:
-                fire_mask_2d = prev_fire.reshape(64, 64)
-                if np.sum(fire_mask_2d) > 0:
-                    y_indices, x_indices = np.where(fire_mask_2d > 0)
-                    fire_width = np.max(x_indices) - np.min(x_indices)
-                    fire_height = np.max(y_indices) - np.min(y_indices)
-                    shape_ratio = fire_width / (fire_height + 1e-6)
-                else:
-                    shape_ratio = 1.0
-            except Exception:
-                shape_ratio = 1.0
-            features.append(shape_ratio)
-            # --- End Feature Engineering ---
-
-            X_data.append(features)
-            y_class.append(spread_label)
-            y_regress.append(spread_ratio)
-            count += 1
-
-        except Exception as e:
-            print(f"Error processing record: {e}")
-            continue
-
-    print(f"Skipped {skipped} records with no fire or unreasonable spread ratios")
-    return np.array(X_data), np.array(y_class), np.array(y_regress)
+                records.append(_parse_record_legacy(raw, keys))
+            except Exception as e:
+                print(f"Error processing record: {e}")
+                errors += 1
+        if not records:
+            return np.empty((0, len(keys), 4096), dtype=np.float32), errors
+        return np.stack(records), errors
+
+def process_shard(file_path, chunk_dir, checksum, batch_size=256):
+    """Extract one whole shard into a store chunk; runs inside a worker process.
+
+    Batches are reduced to features as they are parsed, so only the shard's
+    feature rows are held in memory. Returns the shard's counters.
+    """
+    start = time.time()
+    X_parts, y_class_parts, y_regress_parts = [], [], []
+    records = skipped = errors = 0
+    skips = dict.fromkeys(SKIP_REASONS, 0)
+
+    dataset = tf.data.TFRecordDataset([file_path]).batch(batch_size)
+    for raw_batch in dataset:
+        batch, bad = _parse_batch(raw_batch)
+        errors += bad
+        X, y_class, y_regress, keep, batch_skips = select_samples(batch)
+        records += len(keep) + bad
+        skipped += int(len(keep) - keep.sum())
+        for reason, count in batch_skips.items():
+            skips[reason] += count
+        X_parts.append(X)
+        y_class_parts.append(y_class)
+        y_regress_parts.append(y_regress)
+
+    rows = write_chunk(
+        chunk_dir, file_path, checksum,
+        np.concatenate(X_parts) if X_parts else EMPTY["X"],
+        np.concatenate(y_class_parts) if y_class_parts else EMPTY["y_class"],
+        np.concatenate(y_regress_parts) if y_regress_parts else EMPTY["y_regress"])
+    return {
+        "file": file_path,
+        "rows": rows,
+        "records": records,
+        "skipped": skipped,
+        **skips,
+        "errors": errors,
+        "seconds": time.time() - start,
+    }
+
+def _shard_worker_init():
+    # Keep each worker's TensorFlow to one thread; the pool provides the parallelism
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+
+def extract_features(file_paths, max_samples=20000, store_dir=None, workers=None, batch_size=256,
+                     sampling=None, seed=None):
+    """Bring the feature store for `file_paths` up to date and open it.
+
+    Shards whose chunk is already in the store (same checksum and feature
+    schema) are reused; the rest are fanned out across a process pool, each
+    worker writing its chunk to disk. `max_samples` rows are then
+    consolidated and returned as memory-mapped (X, y_class, y_regress):
+
+    - sampling="proportional" or "balanced" (default IGNIS_SAMPLING):
+      every shard is extracted and the rows are a seeded stratified sample
+      over all of them (see sampling.py)
+    - sampling="first": the first `max_samples` rows in shard order; once
+      the leading shards hold that many, the rest are cancelled
+    """
+    sampling = sampling or SAMPLING
+    seed = SAMPLE_SEED if seed is None else seed
+    stop_early = sampling == "first"
+    store = FeatureStore(store_dir)
+    checksums = [store.checksum(path) for path in file_paths]
+    results = [store.cached(path, c) for path, c in zip(file_paths, checksums)]
+    reused = sum(r is not None for r in results)
+    pending = [i for i, r in enumerate(results) if r is None]
+    if stop_early and _rows_prefix(results) >= max_samples:
+        pending = []  # the reused leading shards already cover max_samples
+
+    workers = workers or int(os.environ.get("IGNIS_INGEST_WORKERS", 0)) or os.cpu_count() or 1
+    workers = max(1, min(workers, len(pending) or 1))
+    print(f"{reused} of {len(file_paths)} shards already extracted; "
+          f"processing up to {len(pending)} with {workers} worker(s)...")
+    start = time.time()
+
+    def finish(i, result):
+        results[i] = result
+        store.record(file_paths[i], checksums[i], result)
+
+    if workers <= 1:
+        for i in pending:
+            finish(i, process_shard(file_paths[i], store.chunk_dir, checksums[i], batch_size))
+            _report_shard(results[i])
+            if stop_early and _rows_prefix(results) >= max_samples:
+                break
+    elif pending:
+        ctx = multiprocessing.get_context("spawn")  # TensorFlow is not fork-safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_shard_worker_init) as pool:
+            futures = {pool.submit(process_shard, file_paths[i], store.chunk_dir,
+                                   checksums[i], batch_size): i
+                       for i in pending}
+            with tqdm(total=len(futures), desc="Shards") as progress:
+                for future in as_completed(futures):
+                    i = futures[future]
+                    if future.cancelled():
+                        continue
+                    finish(i, future.result())
+                    _report_shard(results[i], progress)
+                    progress.update(1)
+                    if stop_early and _rows_prefix(results) >= max_samples:
+                        for f in futures:
+                            f.cancel()
+
+    used = []
+    for result in results:
+        if result is None or (stop_early and sum(r["rows"] for r in used) >= max_samples):
+            break
+        used.append(result)
+    elapsed = time.time() - start
+    records = sum(r["records"] for r in used)
+    errors = sum(r["errors"] for r in used)
+    print(f"Skipped {sum(r['skipped'] for r in used)} records with no fire or unreasonable spread ratios")
+    if errors:
+        print(f"{errors} records could not be parsed")
+    print(f"{records} records from {len(used)} shards ready in {elapsed:.1f}s")
+
+    if stop_early:
+        store.materialize(file_paths[:len(used)], max_samples)
+    else:
+        report = store.materialize_sample(
+            file_paths, StratifiedReservoir(max_samples, N_FEATURES, seed, sampling))
+        _report_sample(report, file_paths, results)
+    return store.load()
+
+def _rows_prefix(results):
+    """Feature rows in the leading run of extracted shards"""
+    total = 0
+    for result in results:
+        if result is None:
+            break
+        total += result["rows"]
+    return total
+
+def _skip_detail(result):
+    # Chunks extracted before the per-filter counts were recorded lack them
+    if any(result.get(reason) is None for reason in SKIP_REASONS):
+        return ""
+    return (f" ({result['small_fire']} small fire, {result['ratio_high']} ratio > 10, "
+            f"{result['ratio_low']} ratio < 0.1)")
+
+def _report_shard(result, progress=None):
+    rate = result["records"] / max(result["seconds"], 1e-9)
+    line = (f"  {os.path.basename(result['file'])}: {result['records']} records, "
+            f"{result['rows']} kept, {result['skipped']} skipped{_skip_detail(result)}, "
+            f"{result['seconds']:.1f}s ({rate:.0f} records/s)")
+    if progress is not None:
+        progress.write(line)
+    else:
+        print(line)
+
+def _report_sample(report, file_paths, results):
+    """Per-shard acceptance: kept rows and how many of them made the sample"""
+    print(f"Sampled {report['rows']} rows ({report['allocation']}, seed {report['seed']}):")
+    for path, result in zip(file_paths, results):
+        name = os.path.basename(path)
+        sampled = report["shards"].get(name, 0)
+        share = sampled / result["rows"] if result["rows"] else 0.0
+        print(f"  {name}: {result['records']} records, {result['rows']} kept, "
+              f"{result['skipped']} skipped{_skip_detail(result)}, "
+              f"{sampled} sampled ({share:.0%} of kept)")
+    for stratum in report["strata"]:
+        lo, hi = stratum["ratio_range"]
+        print(f"  spread_label {stratum['spread_label']}, ratio ({lo or 0}, {hi or 'inf'}]: "
+              f"{stratum['sampled']} of {stratum['seen']}")
 
 if __name__ == "__main__":
     print("Extracting features from training data...")
-    X_train, y_train_class, y_train_regress = extract_features(TRAIN_FILES, max_samples=20000)
+    X_train, y_train_class, y_train_regress = extract_features(
+        TRAIN_FILES, max_samples=20000, store_dir=os.path.join(STORE_DIR, "train"))
 
     print("Extracting features from test data...")
-    X_test, y_test_class, y_test_regress = extract_features(TEST_FILES, max_samples=2000)
-
-    print("Saving processed data...")
-    np.save("processed_X_train.npy", X_train)
-    np.save("processed_y_train_class.npy", y_train_class)
-    np.save("processed_y_train_regress.npy", y_train_regress)
-    np.save("processed_X_test.npy", X_test)
-    np.save("processed_y_test_class.npy", y_test_class)
-    np.save("processed_y_test_regress.npy", y_test_regress)
+    X_test, y_test_class, y_test_regress = extract_features(
+        TEST_FILES, max_samples=2000, store_dir=os.path.join(STORE_DIR, "test"))
 
-    print(f"Processed and saved {len(X_train)} training samples and {len(X_test)} test samples")
+    print(f"Feature store ready in {STORE_DIR}/ with {len(X_train)} training samples and {len(X_test)} test samples")
     print(f"Training data shape: {X_train.shape}")
     print(f"Test data shape: {X_test.shape}")
     print(f"Positive examples in training: {sum(y_train_class)} ({sum(y_train_class)/len(y_train_class)*100:.2f}%)")
@@ -0,0 +1,103 @@
+"""Output encodings for prediction results.
+
+    geojson   the full result: a FeatureCollection with the origin, the
+              spread polygon, the direction arrow and one Feature per
+              polygon vertex (what the frontend renders; the default)
+    compact   the same numbers as arrays, [lng, lat] pairs for the origin
+              and arrow, and "polygon" / "point_probability" with one entry
+              per vertex, about a third of the size
+
+Either can be quantized with `decimals`: coordinates are rounded to that
+many places (5 is ~1 m) and probabilities, ratios and distances to
+VALUE_DECIMALS. Rounding happens on the arrays before they become Python
+floats, so it costs nothing per fire.
+
+dumps() uses orjson when it is installed and falls back to json with
+compact separators. write_ndjson() writes one result per line as an
+iterator produces them, for streaming batch output.
+"""
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FORMATS = ("geojson", "compact")
+VALUE_DECIMALS = 6
+
+
+def check_format(output, decimals):
+    if output not in FORMATS:
+        raise ValueError(f"output format must be one of {', '.join(FORMATS)}")
+    if decimals is not None and not 0 <= int(decimals) <= 15:
+        raise ValueError("decimals must be between 0 and 15")
+
+
+def rounded(values, decimals):
+    """Array rounded to `decimals` places (unchanged when None)"""
+    values = np.asarray(values, dtype=np.float64)
+    return values if decimals is None else np.round(values, decimals)
+
+
+def compact_results(envs, will_spread, spread_prob, spread_ratio, geom, direction_factors,
+                    env_data, decimals=None):
+    """Columnar results for N fires from predict_environments' arrays"""
+    value_decimals = None if decimals is None else VALUE_DECIMALS
+    origin = np.column_stack([rounded([e["lng"] for e in envs], decimals),
+                              rounded([e["lat"] for e in envs], decimals)]).tolist()
+    polygon_lng = rounded(geom["point_lng"], decimals).tolist()
+    polygon_lat = rounded(geom["point_lat"], decimals).tolist()
+    arrow = np.column_stack([rounded(geom["arrow_lng"], decimals),
+                             rounded(geom["arrow_lat"], decimals)]).tolist()
+    point_prob = rounded(np.asarray(spread_prob)[:, None] * direction_factors, value_decimals).tolist()
+    probs = rounded(spread_prob, value_decimals).tolist()
+    ratios = rounded(spread_ratio, value_decimals).tolist()
+    spread_km = rounded(geom["spread_km"], value_decimals).tolist()
+
+    results = []
+    for i, env in enumerate(envs):
+        result = {
+            "format": "compact",
+            "will_spread": will_spread[i],
+            "spread_probability": probs[i],
+            "spread_ratio": ratios[i],
+            "spread_direction": env["wind_direction"],
+            "spread_distance_km": spread_km[i],
+            "environmental_data": env_data(env),
+            "origin": origin[i],
+            "polygon": {"lng": polygon_lng[i], "lat": polygon_lat[i]},
+            "point_probability": point_prob[i],
+            "arrow": arrow[i],
+        }
+        if env.get("incident") is not None:
+            result["incident"] = env["incident"]
+        results.append(result)
+    return results
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Compact JSON text; orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), default=_default)
+
+
+def write_ndjson(results, out):
+    """Write each result as one line as soon as the iterator yields it"""
+    count = 0
+    for result in results:
+        out.write(dumps(result) + "\n")
+        out.flush()
+        count += 1
+    return count
@@ -0,0 +1,426 @@
+"""Precomputed spread-risk tiles for instant point lookups.
+
+For one weather snapshot, a prediction is a function of location and
+brightness. A batch job therefore scores a lat/lng pyramid over the FIRMS
+query box in routes/fireData.js (-125, 24, -66, 49) once per weather
+cycle, and predict_spread.py answers point queries from it.
+
+    levels      LEVELS cell sizes in degrees (1, 0.25, 0.0625 ~ 7 km), each
+                split into TILE_DEG x TILE_DEG tiles named after their
+                south-west corner, e.g. 2/N34W120
+    cells       one float16 row per cell, row 0 at the tile's north edge:
+                spread probability, will-spread flag and spread ratio at each
+                of BRIGHTNESS_LEVELS, then the ENV_CHANNELS inputs (weather
+                interpolated from a WEATHER_DEG grid fetched once per build,
+                DEM elevation, climatology fuel indices). Cells without
+                weather are NaN.
+    index.json  layout, and per tile its file, build time and the model
+                version it was scored with
+
+A lookup is arithmetic on the cell's position plus one read from a
+memory-mapped tile: the finest level whose tile is present and fresh
+answers, coarser levels back it up. A tile is stale after MAX_AGE seconds
+or when another model version is current; predict_fire_spread then runs
+live inference. A fire is looked up at the nearest brightness level and
+served with the cell's inputs, so tile answers are approximate in both.
+
+A build writes new tile files next to the old ones and swaps index.json
+in with os.replace, so readers never see a partial tile. The files it
+replaced are deleted by the next build: readers only re-read the index
+every INDEX_CHECK_S, and until then they may still open a replaced file.
+A tile that disappears anyway (builds closer together than that) makes
+the reader reload the index and report "missing", and the fire runs live.
+
+Usage:
+    python risk_tiles.py build [--out spread_tiles] [--levels 0,1] [--workers 4]
+    python risk_tiles.py build --every 3600        # refresh every weather cycle
+    python risk_tiles.py lookup 34.1,-118.2 39.5,-105.0 --brightness 360
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+from dem_tiles import CONUS_BBOX, tile_name
+
+TILE_DIR = os.environ.get("IGNIS_RISK_TILES",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), "spread_tiles"))
+MAX_AGE = float(os.environ.get("IGNIS_TILE_MAX_AGE", 3 * 3600))
+TILE_DEG = 5
+LEVELS = (1.0, 0.25, 0.0625)
+BRIGHTNESS_LEVELS = (300.0, 325.0, 350.0, 375.0, 400.0, 450.0, 500.0)
+WEATHER_DEG = 0.5
+ENV_CHANNELS = ("elevation", "wind_direction", "wind_speed", "temperature", "humidity",
+                "drought", "vegetation")
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+# How often a reader checks whether a build replaced index.json
+INDEX_CHECK_S = 5.0
+
+
+def tile_bounds(bbox=CONUS_BBOX):
+    """(west, south, columns, rows) of the tile grid covering `bbox`"""
+    west, south = int(math.floor(bbox[0])), int(math.floor(bbox[1]))
+    return (west, south, int(math.ceil((bbox[2] - west) / TILE_DEG)),
+            int(math.ceil((bbox[3] - south) / TILE_DEG)))
+
+
+def tile_key(level, tile_south, tile_west):
+    return f"{level}/{tile_name(tile_south, tile_west)}"
+
+
+def channel_layout(n_levels=len(BRIGHTNESS_LEVELS)):
+    """Slices of the probability, will-spread and ratio blocks, and the first env channel"""
+    return (slice(0, n_levels), slice(n_levels, 2 * n_levels), slice(2 * n_levels, 3 * n_levels),
+            3 * n_levels)
+
+
+class RiskTiles:
+    """Read-only view over a tile directory written by build_tiles."""
+
+    def __init__(self, directory, max_age=MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        self._open = {}
+        self._checked = 0.0
+        self._mtime = None
+        self._load_index()
+
+    def _load_index(self):
+        import model_registry
+
+        path = os.path.join(self.directory, INDEX_FILE)
+        mtime = os.stat(path).st_mtime_ns
+        with open(path) as f:
+            index = json.load(f)
+        if index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported risk tile version: {index.get('version')}")
+        self.index = index
+        self.levels = tuple(index["levels"])
+        self.brightness = np.asarray(index["brightness"], dtype=np.float64)
+        self.west, self.south, self.columns, self.rows = index["grid"]
+        self.tiles = index["tiles"]
+        self.model_version = model_registry.current_version()
+        self._open = {}
+        self._mtime = mtime
+
+    def _refresh(self):
+        import model_registry
+
+        now = time.monotonic()
+        if now - self._checked < INDEX_CHECK_S:
+            return
+        self._checked = now
+        self.model_version = model_registry.current_version()
+        try:
+            if os.stat(os.path.join(self.directory, INDEX_FILE)).st_mtime_ns != self._mtime:
+                self._load_index()
+        except (OSError, ValueError):
+            pass  # keep serving the last good index
+
+    def _tile(self, entry):
+        arr = self._open.get(entry["file"])
+        if arr is None:
+            arr = np.load(os.path.join(self.directory, entry["file"]), mmap_mode="r")
+            self._open[entry["file"]] = arr
+        return arr
+
+    def fresh(self, entry, now=None):
+        now = time.time() if now is None else now
+        return (now - entry["built_at"] <= self.max_age and
+                entry.get("model_version") == self.model_version)
+
+    def lookup(self, lat, lng, brightness=350.0, now=None):
+        """(values, status) for one point; values is None unless status is "hit".
+
+        status is "hit", "outside" (not in the tile grid), "stale" (only
+        expired tiles cover the point) or "missing" (no tile or no data).
+        """
+        self._refresh()
+        col = math.floor((lng - self.west) / TILE_DEG)
+        row = math.floor((lat - self.south) / TILE_DEG)
+        if not (0 <= col < self.columns and 0 <= row < self.rows):
+            return None, "outside"
+        tile_west, tile_south = self.west + col * TILE_DEG, self.south + row * TILE_DEG
+        b = int(np.argmin(np.abs(self.brightness - brightness)))
+        prob, flag, ratio, env = channel_layout(len(self.brightness))
+        status = "missing"
+        for level in reversed(range(len(self.levels))):
+            entry = self.tiles.get(tile_key(level, tile_south, tile_west))
+            if entry is None:
+                continue
+            if not self.fresh(entry, now):
+                status = "stale"
+                continue
+            cell = self.levels[level]
+            per_side = int(round(TILE_DEG / cell))
+            r = min(int((tile_south + TILE_DEG - lat) / cell), per_side - 1)
+            c = min(int((lng - tile_west) / cell), per_side - 1)
+            try:
+                values = np.asarray(self._tile(entry)[r, c], dtype=np.float64)
+            except OSError:
+                # Deleted by a build whose index we have not read yet
+                self._checked = 0.0
+                self._refresh()
+                return None, "missing"
+            if np.isnan(values[prob.start + b]):
+                continue
+            result = dict(zip(ENV_CHANNELS, values[env:].tolist()))
+            result.update({
+                "spread_probability": float(values[prob.start + b]),
+                "will_spread": bool(values[flag.start + b] > 0.5),
+                "spread_ratio": float(values[ratio.start + b]),
+                "level": level,
+                "cell_deg": cell,
+                "cell": [tile_south + TILE_DEG - (r + 0.5) * cell, tile_west + (c + 0.5) * cell],
+                "brightness_level": float(self.brightness[b]),
+                "built_at": entry["built_at"],
+            })
+            return result, "hit"
+        return None, status
+
+
+def open_tiles(directory):
+    """RiskTiles for `directory`, or None if no tiles have been built there"""
+    if directory and os.path.exists(os.path.join(directory, INDEX_FILE)):
+        return RiskTiles(directory)
+    return None
+
+
+# --- building -------------------------------------------------------------
+
+def fetch_weather_grid(bbox, step=WEATHER_DEG):
+    """Open-Meteo weather and elevation on a regular grid; NaN where a lookup failed"""
+    from env_fetch import get_client
+
+    west, south, east, north = bbox
+    lats = np.arange(north, south - step / 2, -step)
+    lngs = np.arange(west, east + step / 2, step)
+    grid_lat, grid_lng = (a.ravel() for a in np.meshgrid(lats, lngs, indexing="ij"))
+    weathers, elevations = get_client().weather_and_elevation_many(
+        (grid_lat.tolist(), grid_lng.tolist()), (grid_lat.tolist(), grid_lng.tolist()))
+
+    def column(key):
+        return np.array([np.nan if w is None else w[key] for w in weathers]).reshape(len(lats), len(lngs))
+
+    speed, direction = column("wind_speed"), np.radians(column("wind_direction"))
+    return {
+        "origin": [float(north), float(west)], "step": step,
+        "temperature": column("temp_max"), "humidity": column("humidity"), "wind_speed": speed,
+        # Directions are interpolated as vectors so 350 and 10 degrees average to 0
+        "wind_u": np.sin(direction), "wind_v": np.cos(direction),
+        "elevation": np.array([np.nan if e is None else e for e in elevations],
+                              dtype=np.float64).reshape(len(lats), len(lngs)),
+    }
+
+
+def _bilinear(grid, origin, step, lat, lng):
+    """Bilinear samples of a north-up grid; NaN if any corner is NaN or outside"""
+    y = (origin[0] - lat) / step
+    x = (lng - origin[1]) / step
+    rows, cols = grid.shape
+    y0 = np.clip(np.floor(y), 0, rows - 2).astype(np.intp)
+    x0 = np.clip(np.floor(x), 0, cols - 2).astype(np.intp)
+    fy, fx = y - y0, x - x0
+    top = grid[y0, x0] * (1 - fx) + grid[y0, x0 + 1] * fx
+    bottom = grid[y0 + 1, x0] * (1 - fx) + grid[y0 + 1, x0 + 1] * fx
+    out = top * (1 - fy) + bottom * fy
+    return np.where((fy >= 0) & (fy <= 1) & (fx >= 0) & (fx <= 1), out, np.nan)
+
+
+def score_tile(level, tile_south, tile_west, cell, weather, month, brightness=BRIGHTNESS_LEVELS):
+    """(rows, cols, channels) float16 grid for one tile; runs inside a worker process"""
+    import predict_spread as ps
+
+    per_side = int(round(TILE_DEG / cell))
+    offsets = (np.arange(per_side) + 0.5) * cell
+    lat, lng = (a.ravel() for a in np.meshgrid(tile_south + TILE_DEG - offsets,
+                                               tile_west + offsets, indexing="ij"))
+    sample = {key: _bilinear(weather[key], weather["origin"], weather["step"], lat, lng)
+              for key in ("temperature", "humidity", "wind_speed", "wind_u", "wind_v", "elevation")}
+    env = {
+        "wind_direction": np.degrees(np.arctan2(sample["wind_u"], sample["wind_v"])) % 360,
+        "wind_speed": sample["wind_speed"],
+        "temperature": sample["temperature"],
+        "humidity": sample["humidity"],
+    }
+    # Same fallbacks as a live prediction: DEM, then Open-Meteo, then the default
+    elevation = ps.dem_elevation(lat, lng)
+    elevation = np.where(np.isnan(elevation), sample["elevation"], elevation)
+    env["elevation"] = np.where(np.isnan(elevation), ps.DEFAULT_ELEVATION, elevation)
+    env.update(ps.get_fuel_many(lat, lng, month))
+
+    n_levels = len(brightness)
+    prob, flag, ratio, first_env = channel_layout(n_levels)
+    out = np.full((len(lat), first_env + len(ENV_CHANNELS)), np.nan)
+    out[:, first_env:] = np.column_stack([env[key] for key in ENV_CHANNELS])
+    valid = np.flatnonzero(np.isfinite(out[:, first_env:]).all(axis=1))
+    if len(valid):
+        # Every brightness level of every cell in one scoring pass
+        # The models read fuel as pdsi/ndvi; the tiles keep the reported scales
+        columns = {key: np.tile(env[key][valid], n_levels) for key in ENV_CHANNELS + ("pdsi", "ndvi")}
+        columns["temp_min"] = columns["temperature"] - 10  # as build_environment estimates it
+        columns["brightness"] = np.repeat(np.asarray(brightness, dtype=np.float64), len(valid))
+        columns["shape_ratio"] = np.ones(len(valid) * n_levels)
+        will_spread, spread_prob, spread_ratio = ps.score_features(ps.build_feature_matrix(columns))
+        out[valid, prob] = spread_prob.reshape(n_levels, -1).T
+        out[valid, flag] = will_spread.reshape(n_levels, -1).T
+        out[valid, ratio] = spread_ratio.reshape(n_levels, -1).T
+    return out.reshape(per_side, per_side, -1).astype(np.float16), len(valid)
+
+
+_weather = None
+
+
+def _build_one(out_dir, level, tile_south, tile_west, cell, month, cycle):
+    grid, valid = score_tile(level, tile_south, tile_west, cell, _weather, month)
+    if valid == 0:
+        return level, tile_south, tile_west, None, 0
+    name = f"{level}/{tile_name(tile_south, tile_west)}-{cycle}.npy"
+    path = os.path.join(out_dir, name)
+    tmp = f"{path}.tmp{os.getpid()}.npy"
+    np.save(tmp, grid)
+    os.replace(tmp, path)
+    return level, tile_south, tile_west, name, valid
+
+
+def _tile_worker_init(weather):
+    # The weather grid is shipped once per worker, and the models loaded once
+    global _weather
+    _weather = weather
+    import predict_spread  # noqa: F401
+
+
+def _read_index(out_dir):
+    try:
+        with open(os.path.join(out_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"tiles": {}}
+
+
+def build_tiles(out_dir=TILE_DIR, levels=None, workers=None, bbox=CONUS_BBOX, month=None):
+    """Score the tiles of `levels` (indices into LEVELS; default all) and publish them"""
+    import model_registry
+
+    west, south, columns, rows = tile_bounds(bbox)
+    layout = {"version": FORMAT_VERSION, "grid": [west, south, columns, rows],
+              "levels": list(LEVELS), "brightness": list(BRIGHTNESS_LEVELS),
+              "channels": (["probability"] * len(BRIGHTNESS_LEVELS) + ["will_spread"] * len(BRIGHTNESS_LEVELS)
+                           + ["spread_ratio"] * len(BRIGHTNESS_LEVELS) + list(ENV_CHANNELS)),
+              "dtype": "float16"}
+    levels = range(len(LEVELS)) if levels is None else levels
+    for level in levels:
+        os.makedirs(os.path.join(out_dir, str(level)), exist_ok=True)
+    month = month or datetime.now().month
+    cycle = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    built_at = time.time()
+    model_version = model_registry.current_version()
+
+    start = time.time()
+    weather = fetch_weather_grid((west, south, west + columns * TILE_DEG, south + rows * TILE_DEG))
+    known = np.isfinite(weather["temperature"]).mean()
+    print(f"Weather grid: {weather['temperature'].size} points, {known:.0%} fetched "
+          f"({time.time() - start:.1f}s)", file=sys.stderr)
+
+    tasks = [(out_dir, level, south + r * TILE_DEG, west + c * TILE_DEG, LEVELS[level], month, cycle)
+             for level in levels for r in range(rows) for c in range(columns)]
+    workers = workers or int(os.environ.get("IGNIS_TILE_WORKERS", 0)) or os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+    results = []
+    if workers <= 1:
+        _tile_worker_init(weather)
+        results = [_build_one(*task) for task in tasks]
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_tile_worker_init, initargs=(weather,)) as pool:
+            results = [f.result() for f in as_completed([pool.submit(_build_one, *task) for task in tasks])]
+
+    index = _read_index(out_dir)
+    # Files the index being replaced points at; readers may open them until
+    # they next check the index, so they are only deleted by the next build
+    previous = {entry["file"] for entry in index.get("tiles", {}).values()}
+    if any(index.get(k) != v for k, v in layout.items()):
+        index = {**layout, "tiles": {}}  # different layout; every tile is rebuilt
+    for level, tile_south, tile_west, name, valid in results:
+        key = tile_key(level, tile_south, tile_west)
+        if name is None:
+            index["tiles"].pop(key, None)  # no weather there; lookups fall back to live
+        else:
+            index["tiles"][key] = {"file": name, "built_at": built_at, "cycle": cycle,
+                                   "model_version": model_version, "cells": valid}
+    tmp = os.path.join(out_dir, f"{INDEX_FILE}.tmp{os.getpid()}")
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, os.path.join(out_dir, INDEX_FILE))
+
+    # Tiles the previous build replaced; readers that still map one keep its pages
+    keep = previous | {entry["file"] for entry in index["tiles"].values()}
+    for level in range(len(LEVELS)):
+        directory = os.path.join(out_dir, str(level))
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if f"{level}/{name}" not in keep and ".tmp" not in name:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass  # e.g. still mapped on Windows; the next build retries
+
+    written = sum(name is not None for *_, name, _ in results)
+    print(f"Wrote {written} of {len(tasks)} tiles ({sum(r[4] for r in results)} cells, "
+          f"{len(BRIGHTNESS_LEVELS)} brightness levels) in {time.time() - start:.1f}s "
+          f"with {workers} worker(s)", file=sys.stderr)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precomputed spread-risk tiles")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="score the tile pyramid for the current weather")
+    build.add_argument("--out", default=TILE_DIR)
+    build.add_argument("--levels", help=f"comma-separated level indices (default all: {LEVELS} degrees)")
+    build.add_argument("--workers", type=int, default=None)
+    build.add_argument("--every", type=float, default=0,
+                       help="rebuild every this many seconds (one weather cycle)")
+
+    lookup = sub.add_parser("lookup", help="look up lat,lng points")
+    lookup.add_argument("points", nargs="+", help="lat,lng pairs")
+    lookup.add_argument("--brightness", type=float, default=350.0)
+    lookup.add_argument("--dir", default=TILE_DIR)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        levels = None if not args.levels else [int(v) for v in args.levels.split(",")]
+        while True:
+            started = time.time()
+            build_tiles(args.out, levels, args.workers)
+            if not args.every:
+                break
+            time.sleep(max(0.0, args.every - (time.time() - started)))
+    else:
+        tiles = RiskTiles(args.dir)
+        for point in args.points:
+            lat, lng = (float(v) for v in point.split(","))
+            start = time.perf_counter()
+            values, status = tiles.lookup(lat, lng, args.brightness)
+            elapsed = time.perf_counter() - start
+            if values is None:
+                print(f"{lat:.5f},{lng:.5f}: {status}")
+            else:
+                print(f"{lat:.5f},{lng:.5f}: p={values['spread_probability']:.3f} "
+                      f"ratio={values['spread_ratio']:.2f} dir={values['wind_direction']:.0f} "
+                      f"(level {values['level']}, {elapsed * 1e6:.0f} us)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
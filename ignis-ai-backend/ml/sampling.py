@@ -0,0 +1,149 @@
+"""Seeded, stratified reservoir sampling of extracted feature rows.
+
+Taking the first `max_samples` rows over-represents the leading shards and
+whatever label balance they happen to have. Instead every kept row of
+every shard is streamed through a StratifiedReservoir:
+
+    strata      spread_label x spread-ratio bucket (RATIO_EDGES)
+    keys        each row gets a uniform key from a generator seeded with
+                (seed, shard name), and each stratum keeps the rows with the
+                smallest keys, i.e. a uniform sample of the stratum. Keys do
+                not depend on the order shards arrive in or on how many
+                workers extracted them, so a seed always gives the same
+                sample.
+    memory      at most `capacity` rows per stratum, whatever the corpus size
+    allocation  at the end the strata's final sizes are known exactly and
+                the `capacity` rows are split between them:
+                  proportional  as in the corpus (an unbiased sample)
+                  balanced      equal shares, strata with fewer rows give
+                                their leftover to the rest
+"""
+import zlib
+
+import numpy as np
+
+# spread_ratio buckets are (lo, hi] between these edges; 1.2 is the
+# spread_label threshold (label 1 is ratio > 1.2, see select_samples)
+RATIO_EDGES = (0.5, 0.8, 1.0, 1.2, 2.0, 4.0)
+ALLOCATIONS = ("proportional", "balanced")
+SEED = 42
+
+
+def ratio_bucket(spread_ratio):
+    return np.searchsorted(RATIO_EDGES, spread_ratio, side="left")
+
+
+def bucket_range(bucket):
+    """(lo, hi] of a ratio bucket; None for an open end"""
+    edges = (None,) + RATIO_EDGES + (None,)
+    return [edges[bucket], edges[bucket + 1]]
+
+
+def allocate(sizes, total, mode="proportional"):
+    """Rows to take from each stratum: sum <= total, never more than a stratum has"""
+    sizes = np.asarray(sizes, dtype=np.int64)
+    if sizes.sum() <= total:
+        return sizes.copy()
+    if mode == "proportional":
+        quota = sizes * total / sizes.sum()
+        take = np.floor(quota).astype(np.int64)
+        # Largest remainders get the rows lost to rounding; ties go to the lower stratum
+        extra = total - take.sum()
+        order = np.lexsort((np.arange(len(sizes)), -(quota - take)))
+        take[order[:extra]] += 1
+        return np.minimum(take, sizes)
+    if mode == "balanced":
+        take = np.zeros_like(sizes)
+        left = total
+        open_ = sizes > 0
+        while left > 0 and open_.any():
+            share = max(left // int(open_.sum()), 1)
+            grant = np.where(open_, np.minimum(sizes - take, share), 0)
+            if grant.sum() > left:
+                # Fewer rows left than open strata: one each, lowest strata first
+                grant = np.where(open_ & (np.cumsum(open_) <= left), 1, 0)
+            take += grant
+            left -= int(grant.sum())
+            open_ = take < sizes
+        return take
+    raise ValueError(f"allocation must be one of {', '.join(ALLOCATIONS)}")
+
+
+def shard_keys(seed, shard, n):
+    """Uniform sampling keys for the n rows of a shard, fixed by (seed, shard name)"""
+    return np.random.default_rng([seed, zlib.crc32(shard.encode("utf-8"))]).random(n)
+
+
+class StratifiedReservoir:
+    """Bottom-k reservoirs of feature rows per (spread_label, ratio bucket)."""
+
+    def __init__(self, capacity, n_features, seed=SEED, allocation="proportional"):
+        if allocation not in ALLOCATIONS:
+            raise ValueError(f"allocation must be one of {', '.join(ALLOCATIONS)}")
+        self.capacity = int(capacity)
+        self.n_features = n_features
+        self.seed = int(seed)
+        self.allocation = allocation
+        self.n_strata = 2 * (len(RATIO_EDGES) + 1)
+        self.seen = np.zeros(self.n_strata, dtype=np.int64)
+        self._kept = [None] * self.n_strata  # per stratum: keys, X, y_class, y_regress, shard, row
+        self.shards = []
+
+    def config(self):
+        return {"method": "stratified", "allocation": self.allocation, "seed": self.seed,
+                "ratio_edges": list(RATIO_EDGES)}
+
+    def strata(self, y_class, y_regress):
+        return np.asarray(y_class, dtype=np.int64) * (len(RATIO_EDGES) + 1) + ratio_bucket(y_regress)
+
+    def add(self, shard, X, y_class, y_regress):
+        """Offer one shard's rows (arrays may be memory-mapped; read in one pass)"""
+        index = len(self.shards)
+        self.shards.append(shard)
+        n = len(y_class)
+        if n == 0:
+            return
+        keys = shard_keys(self.seed, shard, n)
+        strata = self.strata(y_class, y_regress)
+        self.seen += np.bincount(strata, minlength=self.n_strata)
+        for s in np.unique(strata):
+            rows = np.flatnonzero(strata == s)
+            kept = self._kept[s]
+            if kept is not None and len(kept[0]) >= self.capacity:
+                # Full: only rows with smaller keys than the current worst can enter
+                rows = rows[keys[rows] < kept[0].max()]
+                if len(rows) == 0:
+                    continue
+            offered = (keys[rows], np.asarray(X[rows], dtype=np.float64),
+                       np.asarray(y_class[rows]), np.asarray(y_regress[rows]),
+                       np.full(len(rows), index, dtype=np.int32), rows.astype(np.int64))
+            merged = offered if kept is None else tuple(np.concatenate(p) for p in zip(kept, offered))
+            if len(merged[0]) > self.capacity:
+                best = np.argpartition(merged[0], self.capacity - 1)[:self.capacity]
+                merged = tuple(a[best] for a in merged)
+            self._kept[s] = merged
+
+    def sample(self, total=None):
+        """(X, y_class, y_regress, report) with up to `total` rows, ordered by key"""
+        total = self.capacity if total is None else min(total, self.capacity)
+        take = allocate(self.seen, total, self.allocation)
+        parts = []
+        for s, kept in enumerate(self._kept):
+            if kept is None or take[s] == 0:
+                continue
+            first = np.argsort(kept[0], kind="stable")[:take[s]]
+            parts.append(tuple(a[first] for a in kept))
+        if parts:
+            keys, X, y_class, y_regress, shard, _ = (np.concatenate(p) for p in zip(*parts))
+        else:
+            keys, X = np.empty(0), np.empty((0, self.n_features))
+            y_class, y_regress, shard = np.empty(0, np.int64), np.empty(0, np.float32), np.empty(0, np.int32)
+        order = np.argsort(keys, kind="stable")
+        per_shard = np.bincount(shard, minlength=len(self.shards))
+        report = dict(self.config(), rows=int(len(keys)),
+                      strata=[{"spread_label": s // (len(RATIO_EDGES) + 1),
+                               "ratio_range": bucket_range(s % (len(RATIO_EDGES) + 1)),
+                               "seen": int(self.seen[s]), "sampled": int(take[s])}
+                              for s in range(self.n_strata) if self.seen[s]],
+                      shards={name: int(c) for name, c in zip(self.shards, per_shard)})
+        return X[order], y_class[order], y_regress[order], report
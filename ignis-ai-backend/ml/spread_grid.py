@@ -0,0 +1,233 @@
+"""Raster spread prediction on a square grid around an ignition point.
+
+The training patches (process_data_dual.py) are 64 x 64 cells of 1 km, so
+the default window matches them: 64 km across, centred on the fire. Each
+cell's probability is
+
+    p(cell) = p_local(cell) * reach(cell)
+
+p_local comes from the models scored on the cell's own environment: DEM
+elevation where dem_tiles.py covers it, the fire's weather, fuel and
+intensity otherwise. Cells with the same split pattern are scored once
+(SpreadEngine.predict_distinct), so a grid costs a few hundred model rows,
+not 4096.
+
+reach is how likely the fire is to get that far. The head distance is the
+same as the polygon's (spread ratio, wind, vegetation) and the shape is a
+wind ellipse with the ignition at its rear focus, using Rothermel's (1991)
+length-to-breadth ratio. Distances are shortened uphill and stretched
+downhill by Noble's slope rule (spread doubles per ~10 degrees of slope).
+
+Output is a compact raster (uint8 probabilities, base64, row 0 = north)
+and/or contour polygons traced along cell edges.
+"""
+import base64
+
+import numpy as np
+
+from features import GRID_SIZE
+
+KM_PER_DEG_LAT = 111.32
+CELL_KM = 1.0
+MAX_GRID_SIZE = 256
+CONTOUR_LEVELS = (0.25, 0.5, 0.75)
+OUTPUTS = ("raster", "contours", "both")
+
+
+def grid_options(options):
+    """Validated (size, cell_km, output, levels) from a request's "grid" value"""
+    if options is True or options is None:
+        options = {}
+    if not isinstance(options, dict):
+        raise ValueError('"grid" must be true or an object')
+    size = int(options.get("size", GRID_SIZE))
+    cell_km = float(options.get("cell_km", CELL_KM))
+    output = options.get("output", "raster")
+    levels = tuple(float(v) for v in options.get("levels", CONTOUR_LEVELS))
+    if not 2 <= size <= MAX_GRID_SIZE:
+        raise ValueError(f"grid size must be between 2 and {MAX_GRID_SIZE}")
+    if not 0 < cell_km <= 10:
+        raise ValueError("grid cell_km must be in (0, 10]")
+    if output not in OUTPUTS:
+        raise ValueError(f"grid output must be one of {', '.join(OUTPUTS)}")
+    if not levels or not all(0 < v < 1 for v in levels):
+        raise ValueError("grid levels must be probabilities in (0, 1)")
+    return size, cell_km, output, levels
+
+
+def cell_offsets(size, cell_km):
+    """East/north offsets in km of every cell centre, shape (size, size); row 0 is north"""
+    centres = (np.arange(size) + 0.5 - size / 2) * cell_km
+    east, north = np.meshgrid(centres, -centres)
+    return east, north
+
+
+def grid_bounds(lat, lng, size, cell_km):
+    """(west, south, east, north) in degrees and the (dlat, dlng) cell size"""
+    dlat = cell_km / KM_PER_DEG_LAT
+    dlng = cell_km / (KM_PER_DEG_LAT * np.cos(np.radians(lat)))
+    half = size / 2
+    return (lng - half * dlng, lat - half * dlat, lng + half * dlng, lat + half * dlat), (dlat, dlng)
+
+
+def length_to_breadth(wind_speed_kmh):
+    """Rothermel (1991) ellipse ratio, 1 + 0.25 U, with U the midflame wind in mph
+
+    Midflame wind is taken as 40% of the 10 m wind the weather API reports.
+    """
+    return min(1 + 0.25 * 0.4 * wind_speed_kmh / 1.609, 8.0)
+
+
+def reach(east, north, head_km, wind_angle, wind_speed, rise_m, cell_km):
+    """Probability-like weight (1 at the ignition, 0.5 on the ellipse) per cell"""
+    lb = length_to_breadth(wind_speed)
+    e = np.sqrt(1 - 1 / lb ** 2)
+    theta = np.arctan2(north, east) - wind_angle
+    # Polar ellipse about its rear focus: head_km downwind, backing spread upwind
+    radius = max(head_km, 0.5 * cell_km) * (1 - e) / (1 - e * np.cos(theta))
+
+    # Distance to the nearest part of the cell, so the ignition cells get ~1
+    dist = np.hypot(east, north)
+    near = np.maximum(dist - cell_km / np.sqrt(2), 0.0)
+    slope_deg = np.degrees(np.arctan2(rise_m, np.maximum(dist, cell_km) * 1000))
+    near = near / np.exp(0.069 * np.clip(slope_deg, -30, 30))
+    return 1 / (1 + (near / radius) ** 4)
+
+
+def encode_raster(prob, lat, lng, size, cell_km):
+    """Compact dict for a (size, size) grid or a (layers, size, size) stack"""
+    bounds, _ = grid_bounds(lat, lng, size, cell_km)
+    last = prob if prob.ndim == 2 else prob[-1]
+    return {
+        "bbox": [round(b, 6) for b in bounds],
+        "shape": list(prob.shape),
+        "cell_km": cell_km,
+        "origin": "north-west",
+        "dtype": "uint8",
+        "scale": 1 / 255,
+        "data": base64.b64encode(np.round(prob * 255).astype(np.uint8).tobytes()).decode("ascii"),
+        "max_probability": float(last.max()),
+        "area_km2_over_50pct": float((last >= 0.5).sum() * cell_km ** 2),
+    }
+
+
+def decode_raster(raster):
+    """Float probabilities back from encode_raster's dict, in its shape"""
+    data = np.frombuffer(base64.b64decode(raster["data"]), dtype=np.uint8)
+    return data.reshape(raster["shape"]) * raster["scale"]
+
+
+# --- contours ----------------------------------------------------------------
+
+# Unit steps (drow, dcol) for the four edge directions, in left-turn order
+_STEPS = ((0, 1), (-1, 0), (0, -1), (1, 0))
+
+
+def _boundary_edges(mask):
+    """Directed cell edges on the mask boundary, filled side on the left.
+
+    Vertices are (row, col) grid corners; rows grow southwards, so in map
+    terms outer rings run counter-clockwise and holes clockwise.
+    """
+    padded = np.pad(mask, 1)
+    inner = padded[1:-1, 1:-1]
+    edges = []
+    for (dr, dc), (start, step) in (
+            ((1, 0), ((1, 0), (0, 1))),    # open below: bottom edge, west to east
+            ((0, 1), ((1, 1), (-1, 0))),   # open right: east edge, south to north
+            ((-1, 0), ((0, 1), (0, -1))),  # open above: top edge, east to west
+            ((0, -1), ((0, 0), (1, 0)))):  # open left: west edge, north to south
+        neighbour = padded[1 + dr:padded.shape[0] - 1 + dr, 1 + dc:padded.shape[1] - 1 + dc]
+        rows, cols = np.nonzero(inner & ~neighbour)
+        for r, c in zip((rows + start[0]).tolist(), (cols + start[1]).tolist()):
+            edges.append(((r, c), step))
+    return edges
+
+
+def trace_rings(mask):
+    """Closed rings of (row, col) corners around the True cells"""
+    outgoing = {}
+    for vertex, step in _boundary_edges(mask):
+        outgoing.setdefault(vertex, []).append(step)
+    rings = []
+    while outgoing:
+        start = next(iter(outgoing))
+        ring, vertex, step = [start], start, None
+        while True:
+            steps = outgoing[vertex]
+            if step is not None and len(steps) > 1:
+                # Saddle: turn left so diagonal neighbours stay separate rings
+                order = _STEPS.index(step)
+                steps.sort(key=lambda s: (_STEPS.index(s) - order - 1) % 4)
+            step = steps.pop(0)
+            if not steps:
+                del outgoing[vertex]
+            vertex = (vertex[0] + step[0], vertex[1] + step[1])
+            if vertex == start:
+                break
+            ring.append(vertex)
+        rings.append(_drop_collinear(ring))
+    return rings
+
+
+def _drop_collinear(ring):
+    pts = np.asarray(ring)
+    prev, nxt = np.roll(pts, 1, axis=0), np.roll(pts, -1, axis=0)
+    turn = (pts - prev)[:, 0] * (nxt - pts)[:, 1] - (pts - prev)[:, 1] * (nxt - pts)[:, 0]
+    return pts[turn != 0]
+
+
+def _signed_area(ring):
+    # x = col, y = -row
+    x, y = ring[:, 1], -ring[:, 0]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def _contains(ring, point):
+    x, y = ring[:, 1], -ring[:, 0]
+    px, py = point[1], -point[0]
+    x2, y2 = np.roll(x, -1), np.roll(y, -1)
+    crosses = (y > py) != (y2 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        at = x + (py - y) * (x2 - x) / (y2 - y)
+    return bool(np.count_nonzero(crosses & (px < at)) % 2)
+
+
+def mask_polygons(mask):
+    """Polygons (outer ring, *holes) of (row, col) corners covering the mask"""
+    outers, holes = [], []
+    for ring in trace_rings(mask):
+        (outers if _signed_area(ring) > 0 else holes).append(ring)
+    polygons = [[ring] for ring in outers]
+    areas = [_signed_area(ring) for ring in outers]
+    for hole in holes:
+        # A point just inside the filled side of the hole's first edge
+        a, b = hole[0], hole[1]
+        d = np.sign(b - a)
+        probe = (a + b) / 2 + 0.25 * np.array([-d[1], d[0]])
+        owners = [i for i, ring in enumerate(outers) if _contains(ring, probe)]
+        if owners:
+            polygons[min(owners, key=lambda i: areas[i])].append(hole)
+    return polygons
+
+
+def contour_features(prob, lat, lng, size, cell_km, levels):
+    """GeoJSON MultiPolygon features for the cells at or above each level"""
+    (west, _, _, north), (dlat, dlng) = grid_bounds(lat, lng, size, cell_km)
+    features = []
+    for level in sorted(levels):
+        coords = []
+        for polygon in mask_polygons(prob >= level):
+            rings = []
+            for ring in polygon:
+                ring = np.vstack([ring, ring[:1]])
+                rings.append(np.column_stack([west + ring[:, 1] * dlng,
+                                              north - ring[:, 0] * dlat]).round(6).tolist())
+            coords.append(rings)
+        if coords:
+            features.append({
+                "type": "Feature",
+                "properties": {"type": "spread_contour", "level": level},
+                "geometry": {"type": "MultiPolygon", "coordinates": coords},
+            })
+    return features
@@ -0,0 +1,220 @@
+"""Monte Carlo fire-spread simulation on the grid around an ignition.
+
+A stochastic cellular automaton over the same window as spread_grid.py.
+Every cell is unburned (0), burning (1..burn_steps, its age in steps) or
+burned out. Each step, a burning cell ignites each of its 8 neighbours
+with a probability set by
+
+    wind       the Rothermel wind ellipse from spread_grid (head = 1)
+    slope      Noble's rule on the DEM rise between the two cells
+    fuel       a per-cell multiplier: predict_spread passes each cell's
+               climatology vegetation factor relative to the ignition
+               cell's, 1 where the climatology has no value
+    distance   diagonal neighbours are sqrt(2) cells away
+
+The head probability is calibrated so that a straight front advances at
+the model's head distance (spread_km, as in the polygon) over the
+horizon. Whether a member spreads at all is drawn from the classifier's
+spread probability, so the final layer is on the same scale as the grid
+mode.
+
+An ensemble is a (members, size, size) state stepped in one pass per
+step, touching only the rows and columns around the burning cells. Members
+are simulated in fixed blocks of BLOCK_MEMBERS with their own seeds, so
+results depend on the seed only, not on how many worker processes ran the
+blocks.
+"""
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from features import GRID_SIZE
+from spread_grid import CELL_KM, MAX_GRID_SIZE, length_to_breadth
+
+STEPS = 24
+HORIZON_HOURS = 24.0
+MEMBERS = 100
+MAX_MEMBERS = 2000
+MAX_STEPS = 500
+BLOCK_MEMBERS = 25
+WORKERS = int(os.environ.get("IGNIS_SIM_WORKERS", os.cpu_count() or 1))
+
+# (drow, dcol) from a receiving cell to the burning neighbour that can ignite it
+NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+# Largest per-step head advance (cells); a CA front cannot move faster than one cell
+MAX_HEAD_CELLS = 0.95
+
+
+def sim_options(options):
+    """Validated settings from a request's "simulate" value (true or an object)"""
+    if options is True or options is None:
+        options = {}
+    if not isinstance(options, dict):
+        raise ValueError('"simulate" must be true or an object')
+    opts = {
+        "size": int(options.get("size", GRID_SIZE)),
+        "cell_km": float(options.get("cell_km", CELL_KM)),
+        "steps": int(options.get("steps", STEPS)),
+        "horizon_hours": float(options.get("horizon_hours", HORIZON_HOURS)),
+        "members": int(options.get("members", MEMBERS)),
+        "burn_hours": options.get("burn_hours"),
+        "seed": options.get("seed"),
+    }
+    if not 2 <= opts["size"] <= MAX_GRID_SIZE:
+        raise ValueError(f"simulation size must be between 2 and {MAX_GRID_SIZE}")
+    if not 0 < opts["cell_km"] <= 10:
+        raise ValueError("simulation cell_km must be in (0, 10]")
+    if not 1 <= opts["steps"] <= MAX_STEPS:
+        raise ValueError(f"simulation steps must be between 1 and {MAX_STEPS}")
+    if not 1 <= opts["members"] <= MAX_MEMBERS:
+        raise ValueError(f"simulation members must be between 1 and {MAX_MEMBERS}")
+    if opts["horizon_hours"] <= 0:
+        raise ValueError("simulation horizon_hours must be positive")
+    return opts
+
+
+def direction_factors(wind_angle, wind_speed):
+    """Ellipse spread factor (head = 1) toward each receiving cell, per neighbour"""
+    lb = length_to_breadth(wind_speed)
+    e = math.sqrt(1 - 1 / lb ** 2)
+    factors = []
+    for dr, dc in NEIGHBOURS:
+        # Spread runs from the neighbour to the receiver: east = -dc, north = +dr
+        theta = math.atan2(dr, -dc) - wind_angle
+        factors.append((1 - e) / (1 - e * math.cos(theta)) / math.hypot(dr, dc))
+    return np.array(factors)
+
+
+def head_probability(head_cells, factors):
+    """Per-step ignition probability p for the head direction.
+
+    A cell ahead of a straight front faces one head-on neighbour and two
+    diagonal ones, so it ignites with 1 - (1 - p)(1 - p f)^2 per step; p
+    is solved so that equals the wanted advance in cells per step.
+    """
+    diagonal = np.sort(factors)[-2]  # best diagonal, i.e. 45 degrees off the head
+    target = min(head_cells, MAX_HEAD_CELLS)
+    lo, hi = 0.0, 1.0
+    for _ in range(40):
+        p = (lo + hi) / 2
+        q = 1 - (1 - p) * (1 - min(1.0, p * diagonal)) ** 2
+        lo, hi = (p, hi) if q < target else (lo, p)
+    return (lo + hi) / 2
+
+
+def transition_logs(p_head, factors, elevation, fuel, cell_km):
+    """log(1 - p) per neighbour and receiving cell, padded by one cell of zeros.
+
+    Shape (8, size + 2, size + 2); the zero border never ignites.
+    """
+    size = elevation.shape[0]
+    padded_elev = np.pad(elevation, 1, mode="edge")
+    logs = np.zeros((len(NEIGHBOURS), size + 2, size + 2), dtype=np.float32)
+    for k, (dr, dc) in enumerate(NEIGHBOURS):
+        source = padded_elev[1 + dr:size + 1 + dr, 1 + dc:size + 1 + dc]
+        run_m = math.hypot(dr, dc) * cell_km * 1000
+        slope_deg = np.degrees(np.arctan2(elevation - source, run_m))
+        p = p_head * factors[k] * np.exp(0.069 * np.clip(slope_deg, -30, 30)) * fuel
+        logs[k, 1:-1, 1:-1] = np.log1p(-np.clip(p, 0.0, 0.999))
+    return logs
+
+
+def ignition_cells(size):
+    """The cell(s) around the grid centre, where the fire point sits"""
+    mid = sorted({(size - 1) // 2, size // 2})
+    return np.ix_(mid, mid)
+
+
+def simulate_block(seed, members, logs, spread_prob, steps, burn_steps):
+    """Run `members` members; returns (steps, size, size) counts of burned members"""
+    rng = np.random.default_rng(seed)
+    size = logs.shape[1] - 2
+    spreads = rng.random(members) < spread_prob
+
+    # Ages on the padded grid: 0 unburned, 1..burn_steps burning, more = burned out
+    age = np.zeros((members, size + 2, size + 2), dtype=np.int16)
+    rows, cols = ignition_cells(size)
+    age[:, rows + 1, cols + 1] = 1
+    burned = np.zeros((size, size), dtype=np.int32)
+    burned[rows, cols] = members
+    layers = np.empty((steps, size, size), dtype=np.int32)
+
+    for t in range(steps):
+        burning = (age >= 1) & (age <= burn_steps)
+        active = burning[spreads]
+        if not active.any():
+            layers[t:] = burned
+            break
+        # Only receivers next to a burning cell can change this step
+        r = np.nonzero(active.any(axis=(0, 2)))[0]
+        c = np.nonzero(active.any(axis=(0, 1)))[0]
+        r0, r1 = max(r[0] - 1, 1), min(r[-1] + 2, size + 1)
+        c0, c1 = max(c[0] - 1, 1), min(c[-1] + 2, size + 1)
+
+        log_keep = np.zeros((members, r1 - r0, c1 - c0), dtype=np.float32)
+        for k, (dr, dc) in enumerate(NEIGHBOURS):
+            log_keep += burning[:, r0 + dr:r1 + dr, c0 + dc:c1 + dc] * logs[k, r0:r1, c0:c1]
+        window = age[:, r0:r1, c0:c1]
+        ignite = (window == 0) & (rng.random(log_keep.shape, dtype=np.float32) < -np.expm1(log_keep))
+        ignite &= spreads[:, None, None]
+
+        window[window > 0] += 1
+        window[ignite] = 1
+        burned[r0 - 1:r1 - 1, c0 - 1:c1 - 1] += ignite.sum(axis=0)
+        layers[t] = burned
+    return layers
+
+
+_pool = None
+_pool_workers = 0
+
+
+def _executor(workers):
+    """Process pool kept for the life of the process (workers start once)"""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # spawn: the serving process runs HTTP threads, which fork does not copy safely
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _pool_workers = workers
+    return _pool
+
+
+def run_ensemble(logs, spread_prob, steps, members, burn_steps, seed=None, workers=WORKERS):
+    """Burn probability per step and cell, shape (steps, size, size)"""
+    blocks = [min(BLOCK_MEMBERS, members - start) for start in range(0, members, BLOCK_MEMBERS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    args = [(s, n, logs, spread_prob, steps, burn_steps) for s, n in zip(seeds, blocks)]
+    if workers > 1 and len(blocks) > 1:
+        pool = _executor(min(workers, len(blocks)))
+        results = list(pool.map(simulate_block, *zip(*args)))
+    else:
+        results = [simulate_block(*a) for a in args]
+    return np.sum(results, axis=0) / members
+
+
+def simulate(elevation, spread_prob, head_km, wind_angle, wind_speed, fuel=1.0,
+             size=GRID_SIZE, cell_km=CELL_KM, steps=STEPS, horizon_hours=HORIZON_HOURS,
+             members=MEMBERS, burn_hours=None, seed=None, workers=WORKERS):
+    """Per-step burn probability layers plus the parameters the run used"""
+    # Resolve a random seed now so the run can be reproduced from the output
+    seed = int(np.random.SeedSequence(seed).entropy)
+    factors = direction_factors(wind_angle, wind_speed)
+    head_cells = head_km / cell_km / steps
+    p_head = head_probability(head_cells, factors)
+    fuel = np.broadcast_to(np.asarray(fuel, dtype=np.float64), elevation.shape)
+    logs = transition_logs(p_head, factors, elevation, fuel, cell_km)
+    step_hours = horizon_hours / steps
+    # Without a burn-out time cells keep burning for the whole horizon
+    burn_steps = steps + 1 if burn_hours is None else max(1, round(float(burn_hours) / step_hours))
+    layers = run_ensemble(logs, spread_prob, steps, members, burn_steps, seed, workers)
+    return layers, {
+        "steps": steps, "step_hours": step_hours, "members": members, "seed": seed,
+        "burn_steps": burn_steps, "head_probability": p_head,
+        "head_cells_per_step": head_cells,
+        "head_speed_capped": head_cells > MAX_HEAD_CELLS,
+    }
@@ -0,0 +1,258 @@
+"""Parallel hyperparameter sweep for the spread classifier and regressor.
+
+Every config is cross-validated on the training split of the feature store.
+The split is memory-mapped, so pool workers share the same pages
+read-only instead of each receiving a pickled copy. Fold indices are
+computed once per (data, task, folds) and cached next to the results.
+Each finished config is appended to sweeps/results.jsonl under a key of
+its parameters plus the data fingerprint, so rerunning a sweep only
+evaluates new configs.
+
+Serving cost is measured the way predict_spread.py pays it: a model from
+the last fold is compiled (tree_compiler.py) and timed scoring one row and
+a 256-row batch.
+
+Usage:
+    python sweep.py                              # default grid, both tasks
+    python sweep.py --task classifier --workers 4
+    python sweep.py --grid my_grid.json          # [{"task": ..., "backend": ..., "params": {...}}, ...]
+    python sweep.py --report                     # ranked table of cached results only
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from feature_store import STORE_DIR, FeatureStore, load_split
+from trainers import EXACT_PARAMS, HIST_PARAMS, classifier_metrics, make_model, regressor_metrics
+
+SWEEP_DIR = os.environ.get("IGNIS_SWEEP_DIR", "sweeps")
+TASKS = ("classifier", "regressor")
+
+
+def default_grid():
+    grid = []
+    for task in TASKS:
+        for n_estimators, max_depth, learning_rate in itertools.product(
+                (100, 200, 400), (3, 5, 7), (0.05, 0.1)):
+            grid.append({"task": task, "backend": "exact", "params": {
+                "n_estimators": n_estimators, "max_depth": max_depth,
+                "learning_rate": learning_rate}})
+        for max_depth, learning_rate in itertools.product((4, 6, 8), (0.05, 0.1)):
+            grid.append({"task": task, "backend": "hist", "params": {
+                "max_depth": max_depth, "learning_rate": learning_rate}})
+    return grid
+
+
+def data_fingerprint(store_root):
+    """Identifies the materialized training split the sweep runs on"""
+    manifest = FeatureStore(os.path.join(store_root, "train")).manifest
+    blob = json.dumps(manifest.get("materialized"), sort_keys=True).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def config_key(config, fingerprint, n_folds):
+    blob = json.dumps([config, fingerprint, n_folds], sort_keys=True).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def cached_folds(path, y, task, n_folds):
+    """Test-index arrays for each fold, computed once and reused from disk"""
+    if os.path.exists(path):
+        with np.load(path) as saved:
+            return [saved[f"fold{i}"] for i in range(n_folds)]
+    from sklearn.model_selection import KFold, StratifiedKFold
+    splitter = (StratifiedKFold if task == "classifier" else KFold)(
+        n_splits=n_folds, shuffle=True, random_state=42)
+    folds = [test for _, test in splitter.split(np.zeros(len(y)), y)]
+    tmp = f"{path}.tmp{os.getpid()}.npz"
+    np.savez(tmp, **{f"fold{i}": f for i, f in enumerate(folds)})
+    os.replace(tmp, path)
+    return folds
+
+
+# --- worker side -------------------------------------------------------------
+
+_data = {}
+
+
+def _init_worker(store_root, fold_paths):
+    # Memory-mapped: every worker reads the same page-cache pages
+    X, y_class, y_regress = load_split("train", root=store_root)
+    _data.update(X=X, y={"classifier": y_class, "regressor": y_regress})
+    _data["folds"] = {}
+    for task, path in fold_paths.items():
+        with np.load(path) as saved:
+            _data["folds"][task] = [saved[k] for k in sorted(saved.files, key=lambda k: int(k[4:]))]
+
+
+def _serving_latency(model, X):
+    from tree_compiler import compile_ensemble
+    compiled = compile_ensemble(model)
+    row = np.asarray(X[:1], dtype=np.float64)
+    batch = np.asarray(X[:256], dtype=np.float64)
+    compiled.raw_predict(row)  # warm up
+    timings = []
+    for _ in range(50):
+        start = time.perf_counter()
+        compiled.raw_predict(row)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    compiled.raw_predict(batch)
+    batch_time = time.perf_counter() - start
+    return {"predict_1_ms": float(np.median(timings)) * 1000,
+            "predict_256_ms": batch_time * 1000,
+            "n_trees": compiled.n_trees, "depth": compiled.depth}
+
+
+def evaluate(config):
+    """Cross-validate one config; runs in a pool worker"""
+    task = config["task"]
+    X, y, folds = _data["X"], _data["y"][task], _data["folds"][task]
+    base = dict(EXACT_PARAMS if config["backend"] == "exact" else HIST_PARAMS)
+    base.update(config["params"])
+    metrics_fn = classifier_metrics if task == "classifier" else regressor_metrics
+
+    scores, fit_times, predict_times = [], [], []
+    all_rows = np.arange(len(y))
+    for test in folds:
+        train = np.setdiff1d(all_rows, test, assume_unique=True)
+        model = make_model(task, config["backend"]).set_params(**base)
+        start = time.perf_counter()
+        model.fit(X[train], y[train])
+        fit_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        scores.append(metrics_fn(model, X[test], y[test]))
+        predict_times.append((time.perf_counter() - start) / len(test))
+
+    result = {name: float(np.mean([s[name] for s in scores])) for name in scores[0]}
+    result.update(fit_s=float(np.mean(fit_times)),
+                  sklearn_predict_row_us=float(np.mean(predict_times)) * 1e6,
+                  stages=int(getattr(model, "n_iter_", None) or model.n_estimators_))
+    result.update(_serving_latency(model, X))
+    return result
+
+
+# --- driver ------------------------------------------------------------------
+
+def load_results(path):
+    results = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    results[entry["key"]] = entry
+    return results
+
+
+def run(configs, store_root, out_dir, n_folds, workers):
+    os.makedirs(out_dir, exist_ok=True)
+    fingerprint = data_fingerprint(store_root)
+    results_path = os.path.join(out_dir, "results.jsonl")
+    done = load_results(results_path)
+
+    todo = [c for c in configs if config_key(c, fingerprint, n_folds) not in done]
+    print(f"{len(configs) - len(todo)} of {len(configs)} configs already evaluated on data {fingerprint}")
+
+    if todo:
+        X, y_class, y_regress = load_split("train", root=store_root)
+        targets = {"classifier": y_class, "regressor": y_regress}
+        fold_paths = {}
+        for task in sorted({c["task"] for c in todo}):
+            fold_paths[task] = os.path.join(out_dir, f"folds-{fingerprint}-{task}-{n_folds}.npz")
+            cached_folds(fold_paths[task], targets[task], task, n_folds)
+        print(f"Evaluating {len(todo)} configs on {len(X)} samples, {n_folds} folds, {workers} worker(s)...")
+
+        # spawn: forking after OpenMP (hist trainer) has started can deadlock
+        ctx = multiprocessing.get_context("spawn")
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(store_root, fold_paths)) as pool, \
+                open(results_path, "a") as out:
+            futures = {pool.submit(evaluate, c): c for c in todo}
+            for n, future in enumerate(as_completed(futures), 1):
+                config = futures[future]
+                try:
+                    metrics = future.result()
+                except Exception as e:
+                    print(f"  [{n}/{len(todo)}] {describe(config)} failed: {e}", file=sys.stderr)
+                    continue
+                entry = {"key": config_key(config, fingerprint, n_folds), "data": fingerprint,
+                         "folds": n_folds, "config": config, "metrics": metrics}
+                out.write(json.dumps(entry) + "\n")
+                out.flush()
+                done[entry["key"]] = entry
+                print(f"  [{n}/{len(todo)}] {describe(config)}  fit {metrics['fit_s']:.2f}s")
+        print(f"Sweep finished in {time.time() - start:.1f}s")
+
+    keys = {config_key(c, fingerprint, n_folds) for c in configs}
+    return [e for k, e in done.items() if k in keys]
+
+
+def describe(config):
+    params = ",".join(f"{k}={v}" for k, v in sorted(config["params"].items()))
+    return f"{config['task']}/{config['backend']}({params})"
+
+
+def print_table(entries):
+    """Ranked table per task: quality first, serving cost alongside"""
+    for task in TASKS:
+        rows = [e for e in entries if e["config"]["task"] == task]
+        if not rows:
+            continue
+        if task == "classifier":
+            rows.sort(key=lambda e: -e["metrics"]["test_roc_auc"])
+            quality = [("AUC", "test_roc_auc", "{:.4f}"), ("acc", "test_accuracy", "{:.4f}")]
+        else:
+            rows.sort(key=lambda e: e["metrics"]["test_rmse"])
+            quality = [("RMSE", "test_rmse", "{:.4f}"), ("R2", "test_r2", "{:.4f}")]
+        cost = [("fit s", "fit_s", "{:.2f}"), ("1-row ms", "predict_1_ms", "{:.3f}"),
+                ("256-row ms", "predict_256_ms", "{:.2f}"), ("trees", "n_trees", "{}"),
+                ("depth", "depth", "{}")]
+        columns = quality + cost
+        print(f"\n{task} ({len(rows)} configs, best first)")
+        print(f"{'#':>3}  {'config':60s}" + "".join(f"{name:>11s}" for name, _, _ in columns))
+        for rank, e in enumerate(rows, 1):
+            cells = "".join(f"{fmt.format(e['metrics'][key]):>11s}" for _, key, fmt in columns)
+            print(f"{rank:>3}  {describe(e['config'])[:60]:60s}{cells}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep over the feature store")
+    parser.add_argument("--grid", help="JSON list of {task, backend, params} configs")
+    parser.add_argument("--task", choices=TASKS + ("both",), default="both")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--out", default=SWEEP_DIR)
+    parser.add_argument("--report", action="store_true", help="only print cached results")
+    args = parser.parse_args(argv)
+
+    if args.grid:
+        with open(args.grid) as f:
+            configs = json.load(f)
+    else:
+        configs = default_grid()
+    if args.task != "both":
+        configs = [c for c in configs if c["task"] == args.task]
+
+    if args.report:
+        fingerprint = data_fingerprint(args.store)
+        done = load_results(os.path.join(args.out, "results.jsonl"))
+        entries = [e for e in done.values() if e["data"] == fingerprint and e["folds"] == args.folds]
+    else:
+        entries = run(configs, args.store, args.out, args.folds, max(1, args.workers))
+    print_table(entries)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
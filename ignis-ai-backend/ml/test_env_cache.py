@@ -0,0 +1,58 @@
+"""predict_spread.py: every weather/elevation lookup is counted once in the cache stats.
+
+    python -m pytest -q test_env_cache.py
+"""
+import unittest
+from unittest import mock
+
+import env_fetch
+from benchmarks import StubOpenMeteo
+
+
+class LookupCountTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubOpenMeteo()
+        cls.stub.__enter__()
+        # The shared client binds the stub's URL; don't leak it to later test modules
+        cls.client = mock.patch.object(env_fetch, "_client", None)
+        cls.client.start()
+        import predict_spread
+        cls.ps = predict_spread
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.stop()
+        cls.stub.__exit__(None, None, None)
+
+    def counts(self):
+        return {name: (s["hits"] + s["disk_hits"], s["misses"])
+                for name, s in self.ps.cache_stats().items()}
+
+    def assert_counted(self, before, weather, elevation):
+        after = self.counts()
+        self.assertEqual(tuple(a - b for a, b in zip(after["weather"], before["weather"])), weather)
+        self.assertEqual(tuple(a - b for a, b in zip(after["elevation"], before["elevation"])), elevation)
+
+    def test_partial_misses_count_once(self):
+        ps = self.ps
+        lat, lng = 12.345, -170.5  # outside any DEM tiles
+        before = self.counts()
+        ps.get_weather_and_elevation(lat, lng)
+        self.assert_counted(before, (0, 1), (0, 1))
+
+        # Weather expired / evicted, elevation still cached
+        ps.weather_cache.clear()
+        before = self.counts()
+        weather, elevation = ps.get_weather_and_elevation(lat, lng)
+        self.assertIsNotNone(weather)
+        self.assert_counted(before, (0, 1), (1, 0))
+
+        ps.elevation_cache.clear()
+        before = self.counts()
+        ps.get_weather_and_elevation(lat, lng)
+        self.assert_counted(before, (1, 0), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
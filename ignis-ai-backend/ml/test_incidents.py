@@ -0,0 +1,68 @@
+"""incidents.py: neighbouring VIIRS pixels of one fire link up anywhere in the query box.
+
+    python -m pytest -q test_incidents.py
+"""
+import unittest
+
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+import incidents
+
+PIXEL_KM = 0.375
+
+
+def pixel_block(lat, lng, rows, cols):
+    """Centres of a rows x cols block of VIIRS I-band pixels starting at (lat, lng)"""
+    r, c = np.mgrid[0:rows, 0:cols]
+    lats = lat + r.ravel() * PIXEL_KM / incidents.KM_PER_DEG_LAT
+    lngs = lng + c.ravel() * PIXEL_KM / (incidents.KM_PER_DEG_LAT * np.cos(np.radians(lats)))
+    return lats, lngs
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
+
+
+def labels_of(lat, lng):
+    detections = incidents.Detections(lat, lng, np.full(len(lat), 330.0))
+    return incidents.cluster(detections, window_hours=None)
+
+
+class ClusterTest(unittest.TestCase):
+    def test_adjacent_and_diagonal_pixels_link(self):
+        for lat, lng in ((37.0, -120.0), (48.5, -123.9), (32.1, -104.5)):
+            block_lat, block_lng = pixel_block(lat, lng, 3, 3)
+            # A separate fire 2 km east of the block
+            lats = np.append(block_lat, lat)
+            lngs = np.append(block_lng, lng + 2.0 / (incidents.KM_PER_DEG_LAT * np.cos(np.radians(lat))))
+            labels = labels_of(lats, lngs)
+            self.assertEqual(labels.tolist(), [0] * 9 + [1], (lat, lng))
+
+    def test_diagonal_pair(self):
+        step = PIXEL_KM / np.sqrt(2)
+        lat = np.array([37.0, 37.0 + step / incidents.KM_PER_DEG_LAT])
+        lng = np.array([-120.0, -120.0 + step / (incidents.KM_PER_DEG_LAT * np.cos(np.radians(37.0)))])
+        self.assertEqual(labels_of(lat, lng).tolist(), [0, 0])
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        centres = np.column_stack([rng.uniform(32, 48, 60), rng.uniform(-124, -104, 60)])
+        picks = rng.integers(0, len(centres), 2000)
+        lat = centres[picks, 0] + rng.normal(scale=0.01, size=len(picks))
+        lng = centres[picks, 1] + rng.normal(scale=0.01, size=len(picks))
+
+        linked = haversine_km(lat[:, None], lng[:, None], lat[None, :], lng[None, :]) <= incidents.EPS_KM
+        _, expected = connected_components(linked, directed=False)
+        labels = labels_of(lat, lng)
+        # Same partition, whatever the numbering
+        pairs = set(zip(labels.tolist(), expected.tolist()))
+        self.assertEqual(len(pairs), len(set(labels.tolist())))
+        self.assertEqual(len(pairs), len(set(expected.tolist())))
+
+
+if __name__ == "__main__":
+    unittest.main()
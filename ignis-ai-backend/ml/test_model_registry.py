@@ -0,0 +1,67 @@
+"""model_registry.py / model_artifact.py: both models export and publish bit-for-bit.
+
+    python -m pytest -q test_model_registry.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.ensemble import (GradientBoostingClassifier, GradientBoostingRegressor,
+                              HistGradientBoostingClassifier)
+
+import model_registry
+from features import N_FEATURES
+from model_artifact import is_current, load_artifact
+from tree_compiler import SpreadEngine, check_parity
+
+
+def training_data(n_rows=600, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, N_FEATURES)) * rng.uniform(1, 1000, size=N_FEATURES)
+    score = X[:, 0] / 1000 + X[:, 3] / 500 - X[:, 7] / 800 + rng.normal(scale=0.5, size=n_rows)
+    return X, (score > 0).astype(int), np.exp(score / 4)
+
+
+class PublishTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.X, self.y_class, self.y_ratio = training_data()
+
+    def publish(self, task, model):
+        model.fit(self.X, self.y_class if task == "classifier" else self.y_ratio)
+        return model_registry.publish(task, model, {"mode": "full", "trainer": type(model).__name__},
+                                      trained_on=[], parity_rows=self.X[:512], root=self.root)
+
+    def served_engine(self):
+        paths = [model_registry.model_path(task, root=self.root) for task in ("classifier", "regressor")]
+        for path in paths:
+            self.assertTrue(is_current(path, path))
+        return SpreadEngine(*(load_artifact(path) for path in paths))
+
+    def check_published(self, classifier):
+        regressor = GradientBoostingRegressor(n_estimators=30, max_depth=4, random_state=0)
+        self.assertEqual(self.publish("classifier", classifier), "v0001")
+        self.assertEqual(self.publish("regressor", regressor), "v0002")
+        self.assertEqual(model_registry.current_version(self.root), "v0002")
+        models = model_registry.read_version(root=self.root)["models"]
+        self.assertEqual(sorted(models), ["classifier", "regressor"])
+
+        engine = self.served_engine()
+        check_parity(engine, classifier, regressor, self.X)
+        _, prob, _ = engine.predict(self.X)
+        np.testing.assert_array_equal(prob, classifier.predict_proba(self.X)[:, 1])
+        for name in os.listdir(os.path.join(self.root, "v0002")):
+            self.assertFalse(name.endswith(".tmp"))
+
+    def test_gradient_boosting(self):
+        self.check_published(GradientBoostingClassifier(n_estimators=30, max_depth=4, random_state=0))
+
+    def test_hist_gradient_boosting(self):
+        self.check_published(HistGradientBoostingClassifier(max_iter=30, max_depth=4, random_state=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""predict_worker.py: the reader keeps answering while every slot is busy.
+
+    python -m pytest -q test_predict_worker.py
+"""
+import json
+import threading
+import time
+import unittest
+
+from predict_worker import PredictionWorker
+
+
+class SlowPredictor:
+    """Stands in for predict_spread: every prediction hangs for `delay` seconds"""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def model_paths(self):
+        return []
+
+    def load_models(self):
+        return None, None, None
+
+    def set_models(self, *models):
+        pass
+
+    def predict_fire_spread(self, fire, timings=None, output="geojson", decimals=None):
+        time.sleep(self.delay)
+        return {"lat": fire["lat"]}
+
+
+class BusySlotsTest(unittest.TestCase):
+    def setUp(self):
+        self.worker = PredictionWorker(SlowPredictor(1.5), concurrency=1, timeout=0.3,
+                                       reload_interval=0)
+        self.replies = {}
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+
+    def tearDown(self):
+        self.worker.shutdown()
+
+    def respond(self, payload):
+        with self.lock:
+            self.replies[payload["id"]] = (time.monotonic() - self.start, payload)
+
+    def send(self, request):
+        started = time.monotonic()
+        self.worker.submit(json.dumps(request), self.respond)
+        return time.monotonic() - started
+
+    def wait_for(self, ids, limit=3.0):
+        deadline = time.monotonic() + limit
+        while time.monotonic() < deadline:
+            with self.lock:
+                if all(i in self.replies for i in ids):
+                    return
+            time.sleep(0.01)
+        self.fail(f"no reply for {[i for i in ids if i not in self.replies]}")
+
+    def test_control_ops_answer_while_slots_are_busy(self):
+        fire = {"lat": 34.1, "lng": -118.2}
+        self.assertLess(self.send({"id": "1", "fire": fire}), 0.1)
+        self.assertLess(self.send({"id": "2", "fire": fire}), 0.1)
+        self.assertLess(self.send({"id": "ping", "op": "ping"}), 0.1)
+        self.assertLess(self.send({"id": "reload", "op": "reload"}), 0.1)
+        self.wait_for(["ping"], limit=0.5)
+        self.assertLess(self.replies["ping"][0], 0.2)
+
+        # The queued request times out from its arrival, not from getting a slot
+        self.wait_for(["1", "2"], limit=1.0)
+        for req_id in ("1", "2"):
+            elapsed, payload = self.replies[req_id]
+            self.assertFalse(payload["ok"])
+            self.assertIn("timed out", payload["error"])
+            self.assertLess(elapsed, 0.6)
+
+        self.wait_for(["reload"])
+        self.assertTrue(self.replies["reload"][1]["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""risk_tiles.py: a reader on an old index survives the builds that replace it.
+
+    python -m pytest -q test_risk_tiles.py
+"""
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import risk_tiles
+from benchmarks import StubOpenMeteo
+
+# Four level-0 tiles; one point in each of three of them
+BBOX = (-120.0, 30.0, -110.0, 40.0)
+FIRST, SECOND, THIRD = (34.1, -118.2), (36.5, -112.0), (31.0, -112.0)
+
+
+class ReplacedTilesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubOpenMeteo()
+        cls.stub.__enter__()
+        import predict_spread  # noqa: F401  (load the models before timing anything)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.__exit__(None, None, None)
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # Readers must not notice the new index on their own during the test
+        patcher = mock.patch.object(risk_tiles, "INDEX_CHECK_S", 3600.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def build(self):
+        time.sleep(1.1)  # tile files are named after the build's second
+        risk_tiles.build_tiles(self.dir, levels=[0], workers=1, bbox=BBOX)
+
+    def test_reader_keeps_answering_across_builds(self):
+        risk_tiles.build_tiles(self.dir, levels=[0], workers=1, bbox=BBOX)
+        reader = risk_tiles.RiskTiles(self.dir)
+        self.assertEqual(reader.lookup(*FIRST)[1], "hit")
+
+        # The files the reader's index names outlive the build that replaced them
+        self.build()
+        self.assertEqual(reader.lookup(*SECOND)[1], "hit")
+
+        # The build after that deletes them; a tile the reader had not opened
+        # yet is reported missing (the fire runs live) and the index reloaded
+        self.build()
+        self.assertEqual(reader.lookup(*THIRD), (None, "missing"))
+        self.assertEqual(reader.tiles, risk_tiles.RiskTiles(self.dir).tiles)
+        self.assertEqual(reader.lookup(*THIRD)[1], "hit")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+"""Per-stage timing and outcome tracking for predict_spread.py.
+
+A trace covers one prediction call. Code inside it marks stages with
+span("name") and records what happened with note("key", "value"), e.g.
+note("data_source", "estimated") or note("elevation", "default"). The
+current trace lives in a context variable, so nested helpers do not need it
+passed in. Work handed to a thread pool keeps it via
+contextvars.copy_context() (see env_fetch.py).
+
+Configuration (IGNIS_TIMING):
+    0 / unset   nothing is recorded (spans cost one attribute check)
+    1           one JSON line per trace on stderr, plus the process summary
+    summary     process summary only, for long-running workers
+
+The process summary (summary()) keeps per-span counts, a fixed-bucket
+histogram and p50/p95 over recent samples. The prediction worker reports it
+under the "stats" op.
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+MODE = os.environ.get("IGNIS_TIMING", "0")
+ENABLED = MODE in ("1", "summary")
+EMIT = MODE == "1"
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+RECENT_SAMPLES = 1024
+
+_current = contextvars.ContextVar("ignis_trace", default=None)
+
+
+class Trace:
+    """Span durations (ms, summed per name) and outcome counts for one call."""
+
+    def __init__(self, name, size=1):
+        self.name = name
+        self.size = size
+        self.spans = {}
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.total_ms = None
+
+    def add_span(self, name, ms):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + ms
+
+    def note(self, key, value, count=1):
+        with self._lock:
+            self.outcomes[key][str(value)] += count
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "trace": self.name,
+                "size": self.size,
+                "total_ms": round(self.total_ms, 3) if self.total_ms is not None else None,
+                "spans": {k: round(v, 3) for k, v in self.spans.items()},
+                "outcomes": {k: dict(v) for k, v in self.outcomes.items()},
+            }
+
+
+class _Summary:
+    """Process-wide aggregate of every recorded span and outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._spans = {}
+            self._outcomes = defaultdict(lambda: defaultdict(int))
+            self._started = time.time()
+
+    def add_span(self, name, ms):
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                entry = self._spans[name] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "buckets": [0] * (len(BUCKETS_MS) + 1),
+                    "recent": deque(maxlen=RECENT_SAMPLES)}
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["buckets"][_bucket(ms)] += 1
+            entry["recent"].append(ms)
+
+    def note(self, key, value, count=1):
+        with self._lock:
+            self._outcomes[key][str(value)] += count
+
+    def snapshot(self):
+        with self._lock:
+            spans = {}
+            for name, e in self._spans.items():
+                recent = sorted(e["recent"])
+                labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+                spans[name] = {
+                    "count": e["count"],
+                    "mean_ms": e["total_ms"] / e["count"],
+                    "p50_ms": _percentile(recent, 0.50),
+                    "p95_ms": _percentile(recent, 0.95),
+                    "max_ms": e["max_ms"],
+                    "histogram": {label: n for label, n in zip(labels, e["buckets"]) if n},
+                }
+            return {"since": self._started, "spans": spans,
+                    "outcomes": {k: dict(v) for k, v in self._outcomes.items()}}
+
+
+def _bucket(ms):
+    for i, bound in enumerate(BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(BUCKETS_MS)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+_summary = _Summary()
+
+
+def summary():
+    """Aggregated spans (count, mean, p50/p95, max, histogram) and outcome counts"""
+    return _summary.snapshot()
+
+
+def reset_summary():
+    _summary.reset()
+
+
+def emit(record):
+    """Write one structured timing record to stderr"""
+    sys.stderr.write(json.dumps({"event": "timing", **record}) + "\n")
+    sys.stderr.flush()
+
+
+@contextmanager
+def trace(name, size=1, force=False):
+    """Open a trace for one call; yields the Trace, or None when timing is off.
+
+    `force` records the trace even when IGNIS_TIMING is off (used when the
+    caller asked for a timings block in the result).
+    """
+    if not (ENABLED or force) or _current.get() is not None:
+        # Disabled, or nested inside an outer trace that already covers this call
+        yield _current.get()
+        return
+    t = Trace(name, size)
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+        t.total_ms = (time.perf_counter() - t._start) * 1000
+        if ENABLED:
+            _summary.add_span(f"{name}.total", t.total_ms)
+            for span_name, ms in t.spans.items():
+                _summary.add_span(f"{name}.{span_name}", ms)
+            for key, values in t.outcomes.items():
+                for value, count in values.items():
+                    _summary.note(key, value, count)
+            if EMIT:
+                emit(t.as_dict())
+
+
+@contextmanager
+def span(name):
+    """Time a stage of the current trace (or a standalone stage when timing is on)"""
+    t = _current.get()
+    if t is None and not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        if t is not None:
+            t.add_span(name, ms)
+        else:
+            # Outside any trace (e.g. model load at import): report it on its own
+            _summary.add_span(name, ms)
+            if EMIT:
+                emit({"trace": name, "size": 1, "total_ms": round(ms, 3), "spans": {}, "outcomes": {}})
+
+
+def note(key, value, count=1):
+    """Record an outcome (cache hit, fallback, ...) on the current trace"""
+    if not count:
+        return
+    t = _current.get()
+    if t is not None:
+        t.note(key, value, count)
+    elif ENABLED:
+        _summary.note(key, value, count)
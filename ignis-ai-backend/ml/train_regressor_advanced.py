@@ -1,68 +1,92 @@
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+import argparse
 import joblib
-import time
+from features import FEATURE_NAMES
+from feature_store import load_split
+import model_registry
+from trainers import (TRAINER, WARM_STAGES, exact_baseline, feature_importances, fit, make_model,
+                      materialized_chunks, n_stages, new_training_rows, regressor_metrics,
+                      report, warm_start)
+
+TASK = "regressor"
+
+parser = argparse.ArgumentParser(description="Train the spread regressor and publish it as a new model version")
+parser.add_argument("--incremental", action="store_true",
+                    help="add boosting stages to the current regressor, fitted on feature-store chunks it has not seen")
+parser.add_argument("--stages", type=int, default=WARM_STAGES, help="stages to add with --incremental")
+args = parser.parse_args()
+BASE_VERSION = model_registry.current_version()
+MODEL_PATH = model_registry.model_path(TASK, BASE_VERSION)
 
 print("Loading data...")
-X_train = np.load("processed_X_train.npy")
-y_train = np.load("processed_y_train_regress.npy")
-X_test = np.load("processed_X_test.npy")
-y_test = np.load("processed_y_test_regress.npy")
+# Memory-mapped from the feature store written by process_data_dual.py
+if args.incremental:
+    previous = model_registry.read_version(BASE_VERSION).get("models", {}).get(TASK, {})
+    X_train, _, y_train, new_chunks = new_training_rows(previous.get("trained_on", []))
+    if len(X_train) == 0:
+        print(f"No feature-store chunks the current {TASK} has not seen; nothing to do")
+        raise SystemExit(0)
+    print(f"{len(new_chunks)} new chunk(s) since {BASE_VERSION or 'the bundled models'}")
+    trained_on = previous.get("trained_on", []) + new_chunks
+else:
+    X_train, _, y_train = load_split("train")
+    trained_on = materialized_chunks("train")
+X_test, _, y_test = load_split("test")
 
 print(f"Training samples: {X_train.shape[0]}, Test samples: {X_test.shape[0]}")
 print(f"Features: {X_train.shape[1]}")
 print(f"Spread ratio stats (train): min={np.min(y_train):.2f}, max={np.max(y_train):.2f}, mean={np.mean(y_train):.2f}")
 
-# Train Gradient Boosting Regressor (better than Random Forest for this task)
-print("Training Gradient Boosting Regressor...")
-start_time = time.time()
-model = GradientBoostingRegressor(
-    n_estimators=200,
-    max_depth=5,
-    learning_rate=0.1,
-    min_samples_split=5,
-    min_samples_leaf=2,
-    random_state=42
-)
-model.fit(X_train, y_train)
-training_time = time.time() - start_time
+if args.incremental:
+    model = joblib.load(MODEL_PATH)
+    print(f"Adding {args.stages} stages to {type(model).__name__} ({n_stages(model)} stages)...")
+    # Deltas against the model being extended
+    baseline = {"source": BASE_VERSION, **previous} if "training_time_s" in previous else None
+    model, training_time, peak_mb = warm_start(model, X_train, y_train, args.stages)
+else:
+    # Gradient Boosting (better than Random Forest for this task); IGNIS_TRAINER picks the backend
+    model = make_model("regressor")
+    print(f"Training {type(model).__name__}...")
+    baseline = exact_baseline("regressor", MODEL_PATH, X_train, y_train, X_test, y_test,
+                              regressor_metrics) if TRAINER != "exact" else None
+    model, training_time, peak_mb = fit(model, X_train, y_train)
 print(f"Training completed in {training_time:.2f} seconds")
 
 # Evaluate
 print("Evaluating model...")
-y_pred = model.predict(X_test)
-mse = mean_squared_error(y_test, y_pred)
-rmse = np.sqrt(mse)
-mae = mean_absolute_error(y_test, y_pred)
-r2 = r2_score(y_test, y_pred)
-print(f"Test MSE: {mse:.4f}")
+metrics = regressor_metrics(model, X_test, y_test)
+rmse, mae, r2 = metrics["test_rmse"], metrics["test_mae"], metrics["test_r2"]
+print(f"Test MSE: {rmse ** 2:.4f}")
 print(f"Test RMSE: {rmse:.4f}")
 print(f"Test MAE: {mae:.4f}")
 print(f"Test R² Score: {r2:.4f}")
 
 # Feature importance
-feature_names = [
-    "elevation_mean", "elevation_max", 
-    "wind_dir_mean", "wind_dir_max",
-    "wind_speed_mean", "wind_speed_max",
-    "temp_min_mean", "temp_min_max",
-    "temp_max_mean", "temp_max_max",
-    "humidity_mean", "humidity_max",
-    "drought_mean", "drought_max",
-    "vegetation_mean", "vegetation_max",
-    "fire_sum", "fire_mean",
-    "wind_east", "wind_north",
-    "wind_elevation", "drought_vegetation",
-    "fire_shape_ratio"
-]
+feature_names = FEATURE_NAMES
 
 print("\nFeature Importance:")
-importances = model.feature_importances_
+importances = feature_importances(model)
 indices = np.argsort(importances)[::-1]
 for i in range(len(feature_names)):
     print(f"{i+1}. {feature_names[indices[i]]}: {importances[indices[i]]:.4f}")
 
-# Save model
-joblib.dump(model, "wildfire_spread_regressor_advanced.joblib")
-print("Model saved as wildfire_spread_regressor_advanced.joblib")
+report("exact" if args.incremental else TRAINER, training_time, peak_mb, n_stages(model), metrics, baseline)
+
+# Publish as a new model version; predict_spread.py serves it once CURRENT points at it
+version = model_registry.publish(
+    TASK, model,
+    parity_rows=X_test[:512],
+    trained_on=trained_on,
+    metadata={
+        "mode": "incremental" if args.incremental else "full",
+        "trainer": type(model).__name__,
+        "params": model.get_params(),
+        "boosting_stages": n_stages(model),
+        "train_samples": int(X_train.shape[0]),
+        "test_samples": int(X_test.shape[0]),
+        "training_time_s": training_time,
+        "peak_memory_mb": peak_mb,
+        **metrics,
+    },
+)
+print(f"Model saved as {model_registry.model_path(TASK, version)} (+ .bin/.json artifact), now current")
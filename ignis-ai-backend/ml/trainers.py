@@ -0,0 +1,223 @@
+"""Trainer backends for train_classifier_advanced.py / train_regressor_advanced.py.
+
+    IGNIS_TRAINER=exact   GradientBoosting, 200 exact-split trees on one core (default)
+    IGNIS_TRAINER=hist    HistGradientBoosting: binned features, all cores,
+                          stops once a held-out 10% stops improving
+
+Run with --incremental, the scripts instead warm-start the current model
+(see model_registry.py): IGNIS_WARM_STAGES (default 50) boosting stages
+are added, fitted only on feature-store chunks the model has not seen, so
+the cost follows the new data. Only the exact backend can be extended this
+way, since HistGradientBoosting re-bins its input on every fit and would
+mis-score its existing trees on the new bins. Each increment also adds
+trees to score, so a periodic full refit keeps inference cheap.
+
+IGNIS_TRAINER_COMPARE=1 also fits the exact trainer on the same data so the
+report shows like-for-like deltas. Otherwise deltas are taken against the
+metrics recorded in the current model's artifact manifest, if it came from
+the exact trainer.
+
+Both backends compile to the same artifact format (tree_compiler.py), so
+predict_spread.py serves either. Hist trees are capped at max_depth 6 to
+stay within the compiler's complete-tree layout.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from model_artifact import read_manifest
+
+TRAINER = os.environ.get("IGNIS_TRAINER", "exact")
+COMPARE = os.environ.get("IGNIS_TRAINER_COMPARE", "0") == "1"
+WARM_STAGES = int(os.environ.get("IGNIS_WARM_STAGES", 50))
+
+EXACT_PARAMS = dict(
+    n_estimators=200,
+    max_depth=5,
+    learning_rate=0.1,
+    min_samples_split=5,
+    min_samples_leaf=2,
+    random_state=42
+)
+HIST_PARAMS = dict(
+    max_iter=1000,
+    max_depth=6,
+    max_leaf_nodes=31,
+    learning_rate=0.1,
+    min_samples_leaf=20,
+    early_stopping=True,
+    validation_fraction=0.1,
+    n_iter_no_change=20,
+    random_state=42
+)
+
+
+def make_model(task, backend=TRAINER):
+    """Unfitted model for task "classifier" or "regressor" """
+    if backend == "exact":
+        from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor
+        cls = GradientBoostingClassifier if task == "classifier" else GradientBoostingRegressor
+        return cls(**EXACT_PARAMS)
+    if backend == "hist":
+        from sklearn.ensemble import HistGradientBoostingClassifier, HistGradientBoostingRegressor
+        cls = HistGradientBoostingClassifier if task == "classifier" else HistGradientBoostingRegressor
+        return cls(**HIST_PARAMS)
+    raise ValueError(f"unknown trainer backend {backend!r}; use exact or hist")
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakMemory:
+    """Samples resident memory in the background; .peak_mb is the growth over the start"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_mb = 0.0
+
+    def __enter__(self):
+        self._start = self._peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._peak = max(self._peak, _rss_bytes())
+        self.peak_mb = (self._peak - self._start) / 2 ** 20
+
+
+def fit(model, X, y):
+    """Fit and return (model, wall seconds, peak memory growth in MB)"""
+    with PeakMemory() as memory:
+        start = time.time()
+        model.fit(X, y)
+        seconds = time.time() - start
+    return model, seconds, memory.peak_mb
+
+
+def warm_start(model, X, y, stages=WARM_STAGES):
+    """Add `stages` boosting stages fitted on (X, y) to a fitted exact model.
+
+    Returns (model, wall seconds, peak memory growth in MB) like fit().
+    """
+    if not hasattr(model, "estimators_"):
+        raise ValueError(f"{type(model).__name__} cannot be warm-started on new data; "
+                         "incremental retraining needs the exact trainer (IGNIS_TRAINER=exact)")
+    if hasattr(model, "classes_") and not np.array_equal(np.unique(y), model.classes_):
+        raise ValueError(f"the new rows have classes {np.unique(y).tolist()}, "
+                         f"the model {model.classes_.tolist()}; add more shards")
+    model.set_params(warm_start=True, n_estimators=model.n_estimators_ + stages)
+    try:
+        return fit(model, X, y)
+    finally:
+        model.set_params(warm_start=False)
+
+
+def new_training_rows(trained_on, split="train", root=None):
+    """Feature-store rows from chunks not in `trained_on`.
+
+    Returns (X, y_class, y_regress, chunks) where `chunks` lists the new
+    [shard, sha256] pairs; a re-extracted shard counts as new.
+    """
+    from feature_store import EMPTY, STORE_DIR, FeatureStore
+
+    store = FeatureStore(os.path.join(root or STORE_DIR, split))
+    seen = {tuple(c) for c in trained_on}
+    chunks = [[name, entry["sha256"]] for name, entry in sorted(store.manifest["chunks"].items())
+              if (name, entry["sha256"]) not in seen and entry["rows"] > 0]
+    parts = [store.open_chunk(name) for name, _ in chunks]
+    X, y_class, y_regress = (np.concatenate([p[i] for p in parts]) if parts else EMPTY[name]
+                             for i, name in enumerate(("X", "y_class", "y_regress")))
+    return X, y_class, y_regress, chunks
+
+
+def materialized_chunks(split="train", root=None):
+    """[shard, sha256] chunks behind the split's consolidated arrays (what a full fit sees)"""
+    from feature_store import STORE_DIR, FeatureStore
+
+    store = FeatureStore(os.path.join(root or STORE_DIR, split))
+    return (store.manifest.get("materialized") or {}).get("chunks", [])
+
+
+def n_stages(model):
+    return getattr(model, "n_iter_", None) or getattr(model, "n_estimators_", None)
+
+
+def feature_importances(model):
+    """Normalized split-gain importances for either backend"""
+    if hasattr(model, "feature_importances_"):
+        return model.feature_importances_
+    gains = np.zeros(model.n_features_in_)
+    for predictors in model._predictors:
+        for predictor in predictors:
+            nodes = predictor.nodes[predictor.nodes["is_leaf"] == 0]
+            np.add.at(gains, nodes["feature_idx"], nodes["gain"])
+    total = gains.sum()
+    return gains / total if total > 0 else gains
+
+
+def classifier_metrics(model, X_test, y_test):
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    return {
+        "test_accuracy": accuracy_score(y_test, model.predict(X_test)),
+        "test_roc_auc": roc_auc_score(y_test, model.predict_proba(X_test)[:, 1]),
+    }
+
+
+def regressor_metrics(model, X_test, y_test):
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    y_pred = model.predict(X_test)
+    return {
+        "test_rmse": float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        "test_mae": mean_absolute_error(y_test, y_pred),
+        "test_r2": r2_score(y_test, y_pred),
+    }
+
+
+def exact_baseline(task, model_path, X_train, y_train, X_test, y_test, metrics_fn):
+    """Reference run of the exact trainer: fitted here if COMPARE, else from the manifest"""
+    if COMPARE:
+        print("Fitting the exact trainer for comparison...")
+        model, seconds, peak_mb = fit(make_model(task, "exact"), X_train, y_train)
+        return {"source": "fitted now", "training_time_s": seconds, "peak_memory_mb": peak_mb,
+                **metrics_fn(model, X_test, y_test)}
+    try:
+        training = read_manifest(model_path).get("training", {})
+    except (OSError, ValueError):
+        return None
+    if training.get("trainer", "").startswith("Hist"):
+        return None
+    return {"source": "current artifact", **training}
+
+
+def report(backend, seconds, peak_mb, stages, metrics, baseline):
+    """Print wall time, peak memory and metric deltas against the exact trainer"""
+    print(f"\nTrainer: {backend} ({stages} boosting stages)")
+    print(f"Wall time: {seconds:.2f}s, peak memory: +{peak_mb:.0f} MB")
+    if not baseline:
+        if backend != "exact":
+            print("No exact-trainer baseline to compare against (set IGNIS_TRAINER_COMPARE=1)")
+        return
+    print(f"Compared with the exact trainer ({baseline['source']}):")
+    rows = [("training_time_s", seconds)] + list(metrics.items())
+    if "peak_memory_mb" in baseline:
+        rows.insert(1, ("peak_memory_mb", peak_mb))
+    for name, value in rows:
+        if name in baseline:
+            ref = float(baseline[name])
+            print(f"  {name:16s} {ref:10.4f} -> {float(value):10.4f}  ({float(value) - ref:+.4f})")
@@ -0,0 +1,460 @@
+"""Compile the trained GradientBoosting models into flat NumPy arrays.
+
+sklearn evaluates each of the 200 trees through its generic per-call
+machinery, and predict_spread.py used to run the classifier twice (predict
+and predict_proba). Here every tree of both models is flattened into
+contiguous arrays and a batch of rows walks all trees at once, one depth
+level per step. A single pass returns the class, the spread probability
+and the spread ratio.
+
+Layout: each tree is padded to a complete binary tree of the ensemble's
+maximum depth D. Internal slot i keeps a feature index and threshold and
+its children are slots 2i+1 / 2i+2, so no child pointers are needed; the
+2**D leaf slots hold the leaf values. A leaf that sits higher in the
+original tree becomes a chain of "always go left" slots (threshold +inf)
+ending in its value.
+
+The arithmetic mirrors sklearn exactly: rows are cast to float32 before
+the `x <= threshold` comparisons and stage outputs are accumulated in the
+same order, and probabilities use the same expit, so results are
+bit-for-bit identical (see check_parity).
+
+The joint walk costs a fixed amount of NumPy work per tree level. It wins
+on small batches; from around 100 rows sklearn's compiled per-tree loops
+are faster, which predict_spread.py uses when it has the sklearn models in
+memory anyway.
+
+HistGradientBoosting models compile to the same layout. Their trees compare
+the float64 input and their leaves already carry the learning rate, so they
+are recorded with input_dtype="float64" and learning_rate=1. Missing values
+are not routed: inputs are assumed finite, as predict_spread.py guarantees.
+"""
+import numpy as np
+# sklearn's predict_proba is scipy's expit (libm exp, vectorized); using the
+# same ufunc is what keeps probabilities bit-identical
+from scipy.special import expit
+
+# Rows scored per traversal block; keeps the (trees x rows) work buffers cache-sized
+BLOCK_ROWS = 256
+# Complete trees double per level; deeper hist trees must be trained with a max_depth
+MAX_DEPTH = 12
+
+
+class CompiledEnsemble:
+    """One boosted ensemble as (n_trees, 2**D - 1) split arrays and (n_trees, 2**D) leaves."""
+
+    def __init__(self, feature, threshold, leaf_value, learning_rate, init_raw,
+                 n_features, kind, classes=None, input_dtype="float32", decision="ge"):
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.leaf_value = np.ascontiguousarray(leaf_value, dtype=np.float64)
+        self.learning_rate = float(learning_rate)
+        self.init_raw = float(init_raw)
+        self.n_features = int(n_features)
+        self.kind = kind
+        self.classes = None if classes is None else np.asarray(classes)
+        # Precision the trees compare inputs in, and whether a raw score of
+        # exactly 0 is the positive class ("ge", GradientBoosting) or not ("gt", hist)
+        self.input_dtype = input_dtype
+        self.decision = decision
+
+    @property
+    def n_trees(self):
+        return self.feature.shape[0]
+
+    @property
+    def depth(self):
+        return int(np.log2(self.leaf_value.shape[1]))
+
+    def with_depth(self, depth):
+        """Return an equivalent ensemble padded to a deeper complete tree"""
+        extra = depth - self.depth
+        if extra < 0:
+            raise ValueError("cannot reduce the depth of a compiled ensemble")
+        if extra == 0:
+            return self
+        n_internal = 2 ** depth - 1
+        feature = np.zeros((self.n_trees, n_internal), dtype=np.int32)
+        threshold = np.full((self.n_trees, n_internal), np.inf)
+        # Existing slots keep their heap position; the old leaf level becomes
+        # "always left" chains down to the new leaf level
+        feature[:, :self.feature.shape[1]] = self.feature
+        threshold[:, :self.threshold.shape[1]] = self.threshold
+        leaf_value = np.repeat(self.leaf_value, 2 ** extra, axis=1)
+        return CompiledEnsemble(feature, threshold, leaf_value, self.learning_rate,
+                                self.init_raw, self.n_features, self.kind, self.classes,
+                                self.input_dtype, self.decision)
+
+    def raw_predict(self, X):
+        """Raw (pre-link) scores, identical to sklearn's _raw_predict"""
+        return _TreeTable([self]).evaluate(_as_rows(X, self.n_features))[0]
+
+    def predict_class(self, raw):
+        positive = raw > 0 if self.decision == "gt" else raw >= 0
+        return self.classes[positive.astype(int)]
+
+    def predict(self, X):
+        raw = self.raw_predict(X)
+        if self.kind == "classifier":
+            return self.predict_class(raw)
+        return raw
+
+    def predict_proba(self, X):
+        p = expit(self.raw_predict(X))
+        return np.column_stack([1 - p, p])
+
+
+def compile_ensemble(model):
+    """Flatten a fitted binary (Hist)GradientBoostingClassifier or regressor"""
+    if hasattr(model, "_predictors"):
+        return _compile_hist(model)
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None:
+        raise TypeError(f"{type(model).__name__} is not a fitted gradient boosting model")
+    if estimators.shape[1] != 1:
+        raise ValueError("only binary classification and regression models are supported")
+
+    trees = [est.tree_ for est in estimators[:, 0]]
+    depth = max(1, max(t.max_depth for t in trees))
+    n_internal = 2 ** depth - 1
+
+    feature = np.zeros((len(trees), n_internal), dtype=np.int32)
+    threshold = np.full((len(trees), n_internal), np.inf)
+    leaf_value = np.zeros((len(trees), 2 ** depth), dtype=np.float64)
+
+    for i, tree in enumerate(trees):
+        values = tree.value[:, 0, 0]
+        # (original node, heap slot, level)
+        stack = [(0, 0, 0)]
+        while stack:
+            node, slot, level = stack.pop()
+            if tree.children_left[node] == -1:
+                # Follow the always-left chain down to the leaf level
+                while level < depth:
+                    slot, level = 2 * slot + 1, level + 1
+                leaf_value[i, slot - n_internal] = values[node]
+                continue
+            feature[i, slot] = tree.feature[node]
+            threshold[i, slot] = tree.threshold[node]
+            stack.append((tree.children_left[node], 2 * slot + 1, level + 1))
+            stack.append((tree.children_right[node], 2 * slot + 2, level + 1))
+
+    # The init estimator is a constant prior; take its raw score from sklearn
+    # itself so the starting point matches to the last bit
+    probe = np.zeros((1, model.n_features_in_), dtype=np.float32)
+    init_raw = model._raw_predict_init(probe)[0, 0]
+
+    is_classifier = hasattr(model, "classes_")
+    return CompiledEnsemble(
+        feature, threshold, leaf_value,
+        learning_rate=model.learning_rate,
+        init_raw=init_raw,
+        n_features=model.n_features_in_,
+        kind="classifier" if is_classifier else "regressor",
+        classes=model.classes_ if is_classifier else None,
+    )
+
+
+def _compile_hist(model):
+    """Flatten a fitted HistGradientBoostingClassifier/Regressor"""
+    if model.n_trees_per_iteration_ != 1:
+        raise ValueError("only binary classification and regression models are supported")
+    nodes_per_tree = [predictors[0].nodes for predictors in model._predictors]
+    if any(nodes["is_categorical"].any() for nodes in nodes_per_tree):
+        raise ValueError("categorical splits are not supported")
+    depth = max(1, max(int(nodes["depth"].max()) for nodes in nodes_per_tree))
+    if depth > MAX_DEPTH:
+        raise ValueError(f"trees are {depth} levels deep; train with max_depth <= {MAX_DEPTH}")
+    n_internal = 2 ** depth - 1
+
+    feature = np.zeros((len(nodes_per_tree), n_internal), dtype=np.int32)
+    threshold = np.full((len(nodes_per_tree), n_internal), np.inf)
+    leaf_value = np.zeros((len(nodes_per_tree), 2 ** depth), dtype=np.float64)
+
+    for i, nodes in enumerate(nodes_per_tree):
+        stack = [(0, 0, 0)]
+        while stack:
+            node, slot, level = stack.pop()
+            if nodes["is_leaf"][node]:
+                while level < depth:
+                    slot, level = 2 * slot + 1, level + 1
+                leaf_value[i, slot - n_internal] = nodes["value"][node]
+                continue
+            feature[i, slot] = nodes["feature_idx"][node]
+            threshold[i, slot] = nodes["num_threshold"][node]
+            stack.append((int(nodes["left"][node]), 2 * slot + 1, level + 1))
+            stack.append((int(nodes["right"][node]), 2 * slot + 2, level + 1))
+
+    is_classifier = hasattr(model, "classes_")
+    return CompiledEnsemble(
+        feature, threshold, leaf_value,
+        learning_rate=1.0,  # shrinkage is already applied to hist leaf values
+        init_raw=model._baseline_prediction.ravel()[0],
+        n_features=model.n_features_in_,
+        kind="classifier" if is_classifier else "regressor",
+        classes=model.classes_ if is_classifier else None,
+        input_dtype="float64",
+        decision="gt",
+    )
+
+
+def _as_rows(X, n_features):
+    X = np.asarray(X)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if X.shape[1] != n_features:
+        raise ValueError(f"expected {n_features} features, got {X.shape[1]}")
+    return X
+
+
+def _float32_floor(threshold):
+    """Largest float32 <= each float64 threshold.
+
+    For a float32 x, `x <= t` and `x <= floor32(t)` always agree, so the
+    walk can compare in float32 without changing a single decision.
+    """
+    t32 = threshold.astype(np.float32)
+    over = t32.astype(np.float64) > threshold
+    t32[over] = np.nextafter(t32[over], np.float32(-np.inf))
+    return t32
+
+
+class _TreeTable:
+    """Trees of several ensembles stacked into one flat table for a joint walk"""
+
+    def __init__(self, ensembles, arrays=None):
+        depth = max(e.depth for e in ensembles)
+        ensembles = [e.with_depth(depth) for e in ensembles]
+        self.ensembles = ensembles
+        self.depth = depth
+        self.n_trees = sum(e.n_trees for e in ensembles)
+        self.n_features = ensembles[0].n_features
+        n_internal = 2 ** depth - 1
+        # Index arrays are intp: numpy gathers with native indices are several
+        # times faster than with int32 ones that need converting first
+        trees = np.arange(self.n_trees, dtype=np.intp)[:, None]
+        self.internal_base = trees * n_internal
+        self.leaf_base = trees * 2 ** depth - n_internal
+        self.wide = any(e.input_dtype == "float64" for e in ensembles)
+        if arrays is not None:
+            # Prebuilt (feature, threshold, staged_value), e.g. views into shared memory
+            self.feature, self.threshold, self.staged_value = arrays
+            return
+        feature = [e.feature for e in ensembles]
+        threshold = np.concatenate([e.threshold for e in ensembles]).ravel()
+        # GradientBoosting trees compare float32 inputs against float64
+        # thresholds; hist trees compare the float64 input. With only the
+        # former, everything runs in float32. Otherwise each row is widened
+        # to [float32-rounded copy, original] and float64 trees read the
+        # second half.
+        if self.wide:
+            feature = [f + self.n_features if e.input_dtype == "float64" else f
+                       for e, f in zip(ensembles, feature)]
+            self.threshold = threshold
+        else:
+            self.threshold = _float32_floor(threshold)
+        self.feature = np.concatenate(feature).ravel().astype(np.intp)
+        # Leaves pre-multiplied by each tree's learning rate: the same single
+        # product sklearn forms per stage, so the rounding is unchanged
+        self.staged_value = np.concatenate([e.learning_rate * e.leaf_value for e in ensembles]).ravel()
+
+    def _rows(self, X):
+        rows = np.ascontiguousarray(X, dtype=np.float32)
+        if self.wide:
+            rows = np.hstack([rows.astype(np.float64), np.asarray(X, dtype=np.float64)])
+        return rows
+
+    def split_codes(self, X):
+        """Per feature, how many of the table's thresholds each value exceeds.
+
+        Two rows with equal codes take the same branch at every split of
+        every tree, so they score identically.
+        """
+        if not hasattr(self, "_splits"):
+            self._splits = [np.unique(self.threshold[(self.feature == f) & np.isfinite(self.threshold)])
+                            for f in range(self.n_features * (2 if self.wide else 1))]
+        rows = self._rows(X)
+        codes = np.empty(rows.shape, dtype=np.intp)
+        for f, splits in enumerate(self._splits):
+            codes[:, f] = np.searchsorted(splits, rows[:, f], side="left")
+        return codes
+
+    def evaluate(self, X):
+        """Raw scores for every ensemble, one array per ensemble"""
+        rows = self._rows(X)
+        n_rows, n_features = rows.shape
+        raws = [np.empty(n_rows, dtype=np.float64) for _ in self.ensembles]
+
+        # Work buffers are allocated once per call and reused for every block
+        # and level; fresh multi-MB temporaries per step cost more than the math
+        shape = (self.n_trees, min(n_rows, BLOCK_ROWS))
+        slot = np.empty(shape, dtype=np.intp)
+        idx = np.empty(shape, dtype=np.intp)
+        gather = np.empty(shape, dtype=np.intp)
+        x = np.empty(shape, dtype=rows.dtype)
+        threshold = np.empty(shape, dtype=self.threshold.dtype)
+        went_right = np.empty(shape, dtype=bool)
+
+        for start in range(0, n_rows, BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            n = block.shape[0]
+            if n < shape[1]:
+                slot, idx, gather, x, threshold, went_right = (
+                    buf[:, :n] for buf in (slot, idx, gather, x, threshold, went_right))
+            flat = block.ravel()
+            row_base = (np.arange(n, dtype=np.intp) * n_features)[None, :]
+
+            # (trees, rows) heap slots, all starting at the root
+            slot.fill(0)
+            for _ in range(self.depth):
+                np.add(slot, self.internal_base, out=idx)
+                np.take(self.feature, idx, out=gather)
+                gather += row_base
+                np.take(flat, gather, out=x)
+                np.take(self.threshold, idx, out=threshold)
+                np.greater(x, threshold, out=went_right)
+                slot *= 2
+                slot += 1
+                slot += went_right
+            staged = self.staged_value[slot + self.leaf_base]
+
+            col = 0
+            for e, raw in zip(self.ensembles, raws):
+                # Stage outputs are added one by one, in order, like sklearn's
+                # predict_stages; cumsum along an axis is a plain sequential sum
+                terms = np.vstack([np.full((1, n), e.init_raw), staged[col:col + e.n_trees]])
+                raw[start:start + n] = np.cumsum(terms, axis=0)[-1]
+                col += e.n_trees
+        return raws
+
+
+class SpreadEngine:
+    """Classifier and regressor evaluated together in a single traversal."""
+
+    def __init__(self, classifier, regressor, _table_arrays=None):
+        if classifier.kind != "classifier" or regressor.kind != "regressor":
+            raise ValueError("SpreadEngine needs a compiled classifier and regressor")
+        if classifier.n_features != regressor.n_features:
+            raise ValueError("classifier and regressor disagree on the number of features")
+        self.classifier = classifier
+        self.regressor = regressor
+        self._table = _TreeTable([classifier, regressor], _table_arrays)
+
+    @classmethod
+    def from_models(cls, classifier, regressor):
+        return cls(compile_ensemble(classifier), compile_ensemble(regressor))
+
+    def shared_state(self):
+        """(arrays, meta): every array the engine scores with, by name, and its scalars.
+
+        from_shared_state() rebuilds an equivalent engine around the same
+        arrays without copying them, so worker processes can all score from
+        one copy in shared memory (see predict_pool.py).
+        """
+        table = self._table
+        arrays = {"table.feature": table.feature, "table.threshold": table.threshold,
+                  "table.staged_value": table.staged_value}
+        meta = {}
+        for name, e in zip(("classifier", "regressor"), table.ensembles):
+            arrays[f"{name}.feature"] = e.feature
+            arrays[f"{name}.threshold"] = e.threshold
+            arrays[f"{name}.leaf_value"] = e.leaf_value
+            meta[name] = {"learning_rate": e.learning_rate, "init_raw": e.init_raw,
+                          "n_features": e.n_features, "kind": e.kind,
+                          "classes": None if e.classes is None else e.classes.tolist(),
+                          "input_dtype": e.input_dtype, "decision": e.decision}
+        return arrays, meta
+
+    @classmethod
+    def from_shared_state(cls, arrays, meta):
+        ensembles = [CompiledEnsemble(arrays[f"{name}.feature"], arrays[f"{name}.threshold"],
+                                      arrays[f"{name}.leaf_value"], **meta[name])
+                     for name in ("classifier", "regressor")]
+        return cls(*ensembles, _table_arrays=(arrays["table.feature"], arrays["table.threshold"],
+                                              arrays["table.staged_value"]))
+
+    @property
+    def n_features(self):
+        return self.classifier.n_features
+
+    def predict(self, X):
+        """Return (class, spread probability, raw spread ratio) for each row"""
+        raw_class, raw_ratio = self._table.evaluate(_as_rows(X, self.n_features))
+        return self.classifier.predict_class(raw_class), expit(raw_class), raw_ratio
+
+    def predict_distinct(self, X):
+        """Same as predict, but rows that take identical paths are scored once.
+
+        Worth it for large batches of near-duplicate rows, such as the cells
+        of a spread grid that differ only in a few features.
+        """
+        X = _as_rows(X, self.n_features)
+        _, first, inverse = np.unique(self._table.split_codes(X), axis=0,
+                                      return_index=True, return_inverse=True)
+        predicted, prob, ratio = self.predict(X[first])
+        inverse = inverse.ravel()
+        return predicted[inverse], prob[inverse], ratio[inverse]
+
+
+def probe_rows(engine, n_rows=256, seed=0):
+    """Rows that land exactly on, just below and just above learned thresholds"""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_rows, engine.n_features), dtype=np.float64)
+    for f in range(engine.n_features):
+        cuts = np.concatenate([
+            e.threshold[(e.feature == f) & np.isfinite(e.threshold)]
+            for e in (engine.classifier, engine.regressor)
+        ])
+        if cuts.size == 0:
+            X[:, f] = rng.normal(size=n_rows)
+            continue
+        picks = rng.choice(cuts, size=n_rows)
+        nudge = rng.choice([-1.0, 0.0, 1.0], size=n_rows) * (np.abs(picks) * 1e-6 + 1e-6)
+        X[:, f] = picks + nudge
+    return X
+
+
+def check_parity(engine, classifier, regressor, X=None):
+    """Compare the engine with sklearn; raises AssertionError on any bit difference"""
+    if X is None:
+        X = probe_rows(engine)
+    predicted, prob, ratio = engine.predict(X)
+    expected_class = classifier.predict(X)
+    expected_prob = classifier.predict_proba(X)[:, 1]
+    expected_ratio = regressor.predict(X)
+
+    mismatches = {
+        "class": int(np.sum(predicted != expected_class)),
+        "probability": int(np.sum(prob != expected_prob)),
+        "ratio": int(np.sum(ratio != expected_ratio)),
+    }
+    if any(mismatches.values()):
+        raise AssertionError(f"compiled engine differs from sklearn on {len(X)} rows: {mismatches}")
+    return len(X)
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+    import joblib
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    clf = joblib.load(os.path.join(script_dir, "wildfire_spread_classifier_advanced.joblib"))
+    reg = joblib.load(os.path.join(script_dir, "wildfire_spread_regressor_advanced.joblib"))
+    engine = SpreadEngine.from_models(clf, reg)
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    X = probe_rows(engine, n_rows=rows)
+    print(f"Parity OK on {check_parity(engine, clf, reg, X)} rows")
+
+    start = time.perf_counter()
+    clf.predict(X)
+    clf.predict_proba(X)
+    reg.predict(X)
+    sk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.predict(X)
+    engine_time = time.perf_counter() - start
+    print(f"sklearn: {sk_time * 1000:.2f} ms, compiled: {engine_time * 1000:.2f} ms for {rows} rows")
@@ -64,57 +64,132 @@
 const express = require('express');
 const router  = express.Router();
 const { spawn } = require('child_process');
+const readline = require('readline');
 const path = require('path');
 
 // allow override via env, otherwise use python3 → python
 const PYTHON = process.env.PYTHON_COMMAND || 'python3';
 
-router.post('/', (req, res) => {
-  const fireData = req.body;
-  if (!fireData || fireData.lat == null || fireData.lng == null) {
-    return res
-      .status(400)
-      .json({ error: 'Missing required fire location data (lat, lng)' });
-  }
+// resolve the script path
+const scriptPath = path.join(__dirname, '../ml/predict_spread.py');
+const mlDir = path.join(__dirname, '../ml');
 
-  // resolve the script path
-  const scriptPath = path.join(__dirname, '../ml/predict_spread.py');
+// set PREDICT_WORKER=0 to fall back to one python process per request
+const USE_WORKER = process.env.PREDICT_WORKER !== '0';
+const WORKER_TIMEOUT_MS = parseInt(process.env.PREDICT_WORKER_TIMEOUT_MS || '30000', 10);
 
-  // spawn python in the ml folder
-  const child = spawn(PYTHON, [ scriptPath, JSON.stringify(fireData) ], {
-    cwd: path.join(__dirname, '../ml')
-  });
+// --- long-lived worker: models load once, requests go over JSON lines ---
+let worker = null;
+let nextId = 1;
+const pending = new Map();
 
-  let stdout = '';
-  let stderr = '';
+function startWorker() {
+  const child = spawn(PYTHON, [ scriptPath, '--worker',
+    '--timeout', String(WORKER_TIMEOUT_MS / 1000) ], { cwd: mlDir });
 
-  child.stdout.on('data', chunk => {
-    stdout += chunk.toString();
+  readline.createInterface({ input: child.stdout }).on('line', line => {
+    let msg;
+    try {
+      msg = JSON.parse(line);
+    } catch (parseErr) {
+      console.error('❌ Worker sent invalid JSON:', line);
+      return;
+    }
+    const entry = pending.get(msg.id);
+    if (!entry) return;
+    pending.delete(msg.id);
+    clearTimeout(entry.timer);
+    if (msg.ok) entry.resolve(msg.result);
+    else entry.reject(new Error(msg.error));
   });
+
   child.stderr.on('data', chunk => {
-    stderr += chunk.toString();
+    console.error(chunk.toString().trimEnd());
   });
 
-  child.on('close', code => {
-    if (code !== 0) {
-      console.error('❌ Python script error:', stderr);
-      return res.status(500).json({
-        error: 'Fire spread prediction failed',
-        details: stderr.trim()
-      });
-    }
-
-    try {
-      const result = JSON.parse(stdout);
-      res.json(result);
-    } catch (parseErr) {
-      console.error('❌ JSON parse error:', parseErr);
-      res.status(500).json({
-        error: 'Failed to parse prediction output',
-        details: parseErr.message
-      });
+  const fail = reason => {
+    if (worker === child) worker = null;
+    for (const [id, entry] of pending) {
+      clearTimeout(entry.timer);
+      entry.reject(new Error(reason));
+      pending.delete(id);
     }
+  };
+  child.on('error', err => fail(`Prediction worker failed: ${err.message}`));
+  child.stdin.on('error', err => fail(`Prediction worker stdin closed: ${err.message}`));
+  child.on('exit', code => fail(`Prediction worker exited with code ${code}`));
+
+  return child;
+}
+
+function predictWithWorker(fireData) {
+  if (!worker) worker = startWorker();
+  const id = String(nextId++);
+
+  return new Promise((resolve, reject) => {
+    // backstop in case the worker never answers (it enforces its own timeout too)
+    const timer = setTimeout(() => {
+      pending.delete(id);
+      reject(new Error('Prediction worker timed out'));
+    }, WORKER_TIMEOUT_MS + 5000);
+    pending.set(id, { resolve, reject, timer });
+    worker.stdin.write(JSON.stringify({ id, fire: fireData }) + '\n');
+  });
+}
+
+// --- one-shot mode: spawn python per request ---
+function predictWithSpawn(fireData) {
+  return new Promise((resolve, reject) => {
+    // spawn python in the ml folder
+    const child = spawn(PYTHON, [ scriptPath, JSON.stringify(fireData) ], {
+      cwd: mlDir
+    });
+
+    let stdout = '';
+    let stderr = '';
+
+    child.stdout.on('data', chunk => {
+      stdout += chunk.toString();
+    });
+    child.stderr.on('data', chunk => {
+      stderr += chunk.toString();
+    });
+
+    child.on('close', code => {
+      if (code !== 0) {
+        console.error('❌ Python script error:', stderr);
+        return reject(new Error(stderr.trim()));
+      }
+
+      try {
+        resolve(JSON.parse(stdout));
+      } catch (parseErr) {
+        console.error('❌ JSON parse error:', parseErr);
+        reject(new Error(`Failed to parse prediction output: ${parseErr.message}`));
+      }
+    });
   });
+}
+
+router.post('/', async (req, res) => {
+  const fireData = req.body;
+  if (!fireData || fireData.lat == null || fireData.lng == null) {
+    return res
+      .status(400)
+      .json({ error: 'Missing required fire location data (lat, lng)' });
+  }
+
+  try {
+    const result = USE_WORKER
+      ? await predictWithWorker(fireData)
+      : await predictWithSpawn(fireData);
+    res.json(result);
+  } catch (err) {
+    res.status(500).json({
+      error: 'Fire spread prediction failed',
+      details: err.message
+    });
+  }
 });
 
 module.exports = router;